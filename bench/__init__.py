@@ -0,0 +1,15 @@
+"""Benchmarks of the tag pipeline, run offline against synthetic tags files
+and buffers and a stand-in for nvim. From the root of the repository:
+
+    python -m bench                      # the default grid
+    python -m bench --quick              # a small grid, for a quick check
+    python -m bench -o before.json       # save the results ...
+    python -m bench --compare before.json  # ... and compare against them
+
+See `python -m bench --help' for choosing the stages and corpora.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'rplugin', 'python3'))
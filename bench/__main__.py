@@ -0,0 +1,270 @@
+"""Run the benchmarks and print the results as JSON."""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench import ROOT, corpus, stages
+from neotags.buftokens import STRIP_LANGS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STAGES = ('read_tags', 'find_tags', 'strip_c', 'tokenize', 'buffer_tokens',
+          'parse_tags', 'parse_tags_index', 'parse_tags_bin', 'highlight',
+          'update')
+# A stage is reported as slower or faster by --compare when its median
+# changed by more than this.
+THRESHOLD = 0.1
+
+
+def sizes(arg):
+    return [int(size) for size in arg.split(',')]
+
+
+def names(arg):
+    return arg.split(',')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m bench', description=__doc__)
+    parser.add_argument('--quick', action='store_true',
+                        help='small corpora and few repeats')
+    parser.add_argument('--stages', type=names, default=STAGES,
+                        help='comma separated, of: %s' % ', '.join(STAGES))
+    parser.add_argument('--tags', type=sizes,
+                        help='lines of the tags files (10000,100000,1000000)')
+    parser.add_argument('--compressions', type=names,
+                        default=list(corpus.COMPRESSIONS),
+                        help='of the tags files (gzip,lzma,none)')
+    parser.add_argument('--filetypes', type=names,
+                        default=['c', 'python', 'javascript'],
+                        help='of the buffers (c,python,javascript)')
+    parser.add_argument('--lines', type=sizes,
+                        help='lines of the buffers (1000,10000,100000); the '
+                        'stages that take a tags file use the second size')
+    parser.add_argument('--repeat', type=int,
+                        help='times each stage is run (5)')
+    parser.add_argument('--binary', default=os.path.expanduser(
+        '~/.vim_tags/bin/neotags'), help='the C binary for parse_tags_bin')
+    parser.add_argument('--workdir', default=os.path.join(
+        tempfile.gettempdir(), 'neotags-bench'),
+                        help='where the corpora are kept between runs')
+    parser.add_argument('-o', '--output', help='write the results here')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare with the results of an earlier run')
+
+    args = parser.parse_args(argv)
+    if args.tags is None:
+        args.tags = [10000, 100000] if args.quick else [10000, 100000, 1000000]
+    if args.lines is None:
+        args.lines = [1000, 10000] if args.quick else [1000, 10000, 100000]
+    if args.repeat is None:
+        args.repeat = 3 if args.quick else 5
+    for stage in args.stages:
+        if stage not in STAGES:
+            parser.error('unknown stage %s' % stage)
+    return args
+
+
+def child_maxrss():
+    """Peak resident size of the largest child process yet, in KiB."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def measure(run, repeat):
+    """Time `run' `repeat' times, then run it once more to find the peak
+    of the memory Python allocated for it.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+
+    del result
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'times_ms': {
+            'min': min(times) * 1000,
+            'median': statistics.median(times) * 1000,
+            'mean': statistics.mean(times) * 1000,
+        },
+        'peak_kib': peak // 1024,
+    }
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+class Runner:
+    def __init__(self, args):
+        self.args = args
+        self.results = []
+        self.corpora = os.path.join(args.workdir, 'corpora')
+
+    def record(self, stage, run, **params):
+        if stage not in self.args.stages:
+            return
+        result = {'stage': stage, 'params': params}
+        result.update(measure(run, self.args.repeat))
+        if stage == 'parse_tags_bin':
+            result['child_maxrss_kib'] = child_maxrss()
+        self.results.append(result)
+        print('%-16s %-60s %10.2f ms %8d KiB' % (
+            stage, ' '.join('%s=%s' % kv for kv in sorted(params.items())),
+            result['times_ms']['median'], result['peak_kib']),
+            file=sys.stderr)
+        return result
+
+    def run(self):
+        args = self.args
+        buffers = {(ft, count): corpus.buffer_lines(ft, count)
+                   for ft in args.filetypes for count in args.lines}
+
+        for (ft, count), lines in buffers.items():
+            text = '\n'.join(lines)
+            if ft in STRIP_LANGS:
+                self.record('strip_c', stages.strip_c_stage(text),
+                            ft=ft, lines=count)
+            self.record('tokenize', stages.tokenize_stage(text, ft),
+                        ft=ft, lines=count)
+            self.record('buffer_tokens', stages.buffer_tokens_stage(lines, ft),
+                        ft=ft, lines=count)
+
+        lines = args.lines[min(1, len(args.lines) - 1)]
+        binary = args.binary if os.path.exists(args.binary) else None
+        if binary is None and 'parse_tags_bin' in args.stages:
+            print('No binary at %s, skipping parse_tags_bin' % args.binary,
+                  file=sys.stderr)
+
+        for count in args.tags:
+            data = None
+            for compression in args.compressions:
+                path = corpus.tags_file(self.corpora, count, compression)
+                self.record('read_tags', stages.read_tags(path),
+                            tags=count, compression=compression)
+                if data is None:
+                    data = stages.read_tags(path)()
+                    for ft in args.filetypes:
+                        self.record('find_tags',
+                                    stages.find_tags_stage(data, ft),
+                                    tags=count, ft=ft)
+                for ft in args.filetypes:
+                    self.sessions(path, buffers[ft, lines], binary,
+                                  tags=count, compression=compression, ft=ft,
+                                  lines=lines)
+
+    def sessions(self, path, buffer, binary, **params):
+        workdir = self.args.workdir
+        wanted = set(self.args.stages)
+        ft = params['ft']
+
+        if 'parse_tags' in wanted:
+            session = stages.Session(workdir, path, ft, buffer, cache=False)
+            self.record('parse_tags', session.parse_tags(), **params)
+
+        if {'highlight', 'update'} & wanted:
+            session = stages.Session(workdir, path, ft, buffer)
+            result = self.record('highlight', session.highlight(), **params)
+            if result is not None:
+                result['commands'] = len(session.nvim.commands)
+                result['command_bytes'] = sum(map(len, session.nvim.commands))
+            self.record('update', session.update(), **params)
+
+        if 'parse_tags_index' in wanted and params['compression'] != 'none':
+            session = stages.Session(workdir, path, ft, buffer, index=True,
+                                     cache=False)
+            self.record('parse_tags_index', session.parse_tags(), **params)
+
+        if 'parse_tags_bin' in wanted and binary is not None:
+            session = stages.Session(workdir, path, ft, buffer, binary=binary,
+                                     cache=False)
+            self.record('parse_tags_bin', session.parse_tags(), **params)
+
+
+def key(result):
+    return (result['stage'], tuple(sorted(result['params'].items())))
+
+
+def compare(old, new):
+    """Print how the medians of `new' compare to those of `old'."""
+    before = {key(result): result for result in old['results']}
+    print('%-16s %-60s %10s %10s %7s' % ('stage', 'params', 'before',
+                                          'after', 'change'), file=sys.stderr)
+    for result in new['results']:
+        previous = before.get(key(result))
+        if previous is None:
+            continue
+        then = previous['times_ms']['median']
+        now = result['times_ms']['median']
+        change = now / then - 1 if then else 0
+        mark = ''
+        if change > THRESHOLD:
+            mark = '  slower'
+        elif change < -THRESHOLD:
+            mark = '  faster'
+        print('%-16s %-60s %8.2fms %8.2fms %+6.0f%%%s' % (
+            result['stage'],
+            ' '.join('%s=%s' % kv for kv in sorted(result['params'].items())),
+            then, now, change * 100, mark), file=sys.stderr)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    runner = Runner(args)
+    runner.run()
+
+    output = {
+        'meta': {
+            'revision': revision(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': args.repeat,
+        },
+        'results': runner.results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(output, fp, indent=1)
+    else:
+        json.dump(output, sys.stdout, indent=1)
+        print()
+
+    if args.compare:
+        with open(args.compare) as fp:
+            compare(json.load(fp), output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Synthetic tags files and buffers. Everything is generated from a fixed
+seed, so that the same arguments always give the same corpus, and written
+to a cache directory to be reused by later runs.
+"""
+import gzip
+import lzma
+import os
+import random
+
+# ctags language -> the filetype of its buffers, their extension and the
+# kinds ctags gives its tags.
+LANGUAGES = {
+    'C': ('c', 'c', 'fpstuvdegm'),
+    'C++': ('cpp', 'cpp', 'cfpstuvdegmn'),
+    'Python': ('python', 'py', 'cfmvi'),
+    'JavaScript': ('javascript', 'js', 'cfmpCov'),
+}
+FILETYPES = {ft: lang for lang, (ft, _, _) in LANGUAGES.items()}
+COMPRESSIONS = {'gzip': ('.gz', gzip.open), 'lzma': ('.xz', lzma.open),
+                'none': ('', open)}
+
+SYLLABLES = ('get', 'set', 'buf', 'list', 'node', 'tag', 'file', 'str', 'map',
+             'init', 'free', 'read', 'write', 'item', 'key', 'val', 'ctx',
+             'len', 'pos', 'cur', 'next', 'prev', 'head', 'tail', 'hash')
+# How many names the identifiers of the buffers are picked from.
+VOCABULARY = 5000
+
+
+def names(count, seed=0):
+    """`count' distinct identifiers, sorted."""
+    rng = random.Random(seed)
+    return sorted('%s_%s%x' % (rng.choice(SYLLABLES), rng.choice(SYLLABLES), i)
+                  for i in range(count))
+
+
+def tags_lines(count, seed=0):
+    """About `count' sorted lines of a tags file as written by ctags with
+    --fields=+l, in a mix of languages and kinds. A name gets one to three
+    tags, so that the file reads like one with overloads and declarations.
+    """
+    rng = random.Random(seed)
+    yield b'!_TAG_FILE_FORMAT\t2\t/extended format/\n'
+    yield b'!_TAG_FILE_SORTED\t1\t/0=unsorted, 1=sorted, 2=foldcase/\n'
+
+    langs = list(LANGUAGES)
+    for name in names(count * 2 // 3 or 1, seed):
+        lines = []
+        for _ in range(rng.choice((1, 1, 1, 2, 3))):
+            lang = rng.choice(langs)
+            _, ext, kinds = LANGUAGES[lang]
+            line = '%s\tsrc/mod%d.%s\t/^%s$/;"\t%s\tline:%d\tlanguage:%s\n' % (
+                name, rng.randrange(500), ext, name, rng.choice(kinds),
+                rng.randrange(1, 5000), lang)
+            lines.append(line.encode())
+        yield from sorted(lines)
+
+
+def tags_file(directory, count, compression, seed=0):
+    """Write a tags file of about `count' lines to `directory', unless it
+    is there already, and return its path.
+    """
+    suffix, opener = COMPRESSIONS[compression]
+    path = os.path.join(directory, 'tags-%d-%d.tags%s' % (count, seed, suffix))
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        with opener(path + '.new', 'wb') as fp:
+            for line in tags_lines(count, seed):
+                fp.write(line)
+        os.replace(path + '.new', path)
+    return path
+
+
+def _c(rng, words):
+    yield '/* %s */' % ' '.join(rng.choice(words) for _ in range(6))
+    yield 'static int %s(struct %s *%s)' % tuple(rng.choice(words)
+                                               for _ in range(3))
+    yield '{'
+    for _ in range(rng.randrange(2, 8)):
+        yield '    %s = %s(%s->%s, "%s"); // %s' % tuple(
+            rng.choice(words) for _ in range(6))
+    yield '    return 0;'
+    yield '}'
+    yield ''
+
+
+def _python(rng, words):
+    yield 'class %s(%s):' % (rng.choice(words), rng.choice(words))
+    yield '    """%s"""' % ' '.join(rng.choice(words) for _ in range(6))
+    yield '    def %s(self, %s):' % (rng.choice(words), rng.choice(words))
+    for _ in range(rng.randrange(2, 8)):
+        yield '        %s = %s.%s(%s)  # %s' % tuple(
+            rng.choice(words) for _ in range(5))
+    yield ''
+
+
+def _javascript(rng, words):
+    yield 'function %s(%s, %s) {' % tuple(rng.choice(words) for _ in range(3))
+    for _ in range(rng.randrange(2, 8)):
+        yield "    const %s = %s.%s('%s'); // %s" % tuple(
+            rng.choice(words) for _ in range(5))
+    yield '}'
+    yield ''
+
+
+GENERATORS = {'c': _c, 'cpp': _c, 'python': _python,
+              'javascript': _javascript}
+
+
+def buffer_lines(ft, count, seed=0):
+    """`count' lines of made up source code of filetype `ft'. About every
+    fourth identifier is the name of a tag in the tags files of the same seed
+    (of at least VOCABULARY * 3 / 2 lines, as names() gives the same first
+    names for any count), the others don't name any tag.
+    """
+    rng = random.Random(seed + count)
+    known = names(VOCABULARY, seed)
+    words = [rng.choice(known) for _ in range(1000)]
+    words += ['local_%x' % i for i in range(3000)]
+
+    generate = GENERATORS[ft]
+    lines = []
+    while len(lines) < count:
+        lines.extend(generate(rng, words))
+    return lines[:count]
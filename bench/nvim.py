@@ -0,0 +1,161 @@
+"""A stand-in for the pynvim Nvim object, answering just what the plugin
+asks of it. The settings start out as the defaults of plugin/neotags.vim and
+plugin/neotags/*.vim, read from the vimscript itself.
+"""
+import glob
+import os
+import re
+import tempfile
+
+from pynvim.api import NvimError
+
+from bench import ROOT
+
+_LET = re.compile(r"^\s*let g:(neotags#[\w#]+)\s*=\s*(.*)$")
+_INITVAR = re.compile(r"^\s*call InitVar\('(\w+)',\s*(.*)\)\s*$")
+_STRING = re.compile(r"'((?:[^']|'')*)'")
+
+
+def vim_value(expr):
+    """The value of a vimscript literal made of single quoted strings,
+    numbers, lists and dicts, or None if it is anything else.
+    """
+    parts = []
+    pos = 0
+    for m in _STRING.finditer(expr):
+        parts.append(expr[pos:m.start()])
+        parts.append(repr(m.group(1).replace("''", "'")))
+        pos = m.end()
+    parts.append(expr[pos:])
+    code = ''.join(parts)
+    if re.search(r'[A-Za-z_]', _STRING.sub('', code.replace('"', "'"))):
+        return None
+    try:
+        return eval(code, {'__builtins__': {}})
+    except SyntaxError:
+        return None
+
+
+def vim_defaults():
+    """The g:neotags* variables the plugin's vimscript sets, as far as they
+    are literals.
+    """
+    values = {}
+    for path in [os.path.join(ROOT, 'plugin', 'neotags.vim')] + sorted(
+            glob.glob(os.path.join(ROOT, 'plugin', 'neotags', '*.vim'))):
+        with open(path) as fp:
+            # Join the continuation lines.
+            text = re.sub(r'\n\s*\\', ' ', fp.read())
+        for line in text.split('\n'):
+            m = _LET.match(line)
+            if m:
+                name = m.group(1)
+            else:
+                m = _INITVAR.match(line)
+                if not m:
+                    continue
+                name = 'neotags_' + m.group(1)
+            value = vim_value(m.group(2))
+            if value is not None:
+                values[name] = value
+    return values
+
+
+class Buffer(list):
+    def __init__(self, number, name, lines):
+        super().__init__(lines)
+        self.number = number
+        self.name = name
+
+
+class Current:
+    buffer = None
+
+
+class Api:
+    def __init__(self, nvim):
+        self.nvim = nvim
+
+    def eval(self, expr):
+        return self.nvim.eval(expr)
+
+    def call_atomic(self, calls, async_=False):
+        results = []
+        for name, args in calls:
+            if name == 'nvim_command':
+                self.nvim.command(args[0])
+                results.append(None)
+            elif name == 'nvim_buf_attach':
+                results.append(True)
+            elif name == 'nvim_buf_get_lines':
+                results.append(list(self.nvim.current.buffer))
+            elif name == 'nvim_buf_get_changedtick':
+                results.append(1)
+            else:
+                self.nvim.calls.append((name, args))
+                results.append(None)
+        return [results, None]
+
+    def create_namespace(self, name):
+        return 1
+
+    def buf_detach(self, buf, async_=False):
+        pass
+
+    def buf_clear_namespace(self, *args, async_=False):
+        pass
+
+
+class Nvim:
+    """Runs every async_call() right away, and keeps the commands and other
+    calls it is sent in `commands' and `calls'.
+    """
+
+    def __init__(self, variables, ft, buf):
+        self.vars = variables
+        self.ft = ft
+        self.current = Current()
+        self.current.buffer = buf
+        self.api = Api(self)
+        self.commands = []
+        self.calls = []
+        self.errors = []
+
+    def eval(self, expr):
+        buf = self.current.buffer
+        m = re.match(r"filter\(copy\(g:\), \{k, v -> stridx\(k, '(.*)'\) "
+                     r"== 0\}\)$", expr)
+        if m:
+            return {k: v for k, v in self.vars.items()
+                    if k.startswith(m.group(1))}
+        m = re.match(r"execute\('syn list (\w+)'\)$", expr)
+        if m:
+            return '%s xxx links to Type' % m.group(1)
+        simple = {
+            '&ft': self.ft,
+            '&tags': '',
+            "expand('%:p:p')": buf.name,
+            "[&ft, &previewwindow, expand('%:p:p')]": [self.ft, 0, buf.name],
+            "[&ft, bufnr('%')]": [self.ft, buf.number],
+            "[line('w0'), line('w$')]": [1, min(len(buf), 60)],
+        }
+        if expr in simple:
+            return simple[expr]
+        raise NvimError('bench.nvim cannot evaluate %s' % expr)
+
+    def call(self, name, *args):
+        if name == 'tempname':
+            return tempfile.mktemp()
+        raise NvimError('bench.nvim cannot call %s' % name)
+
+    def command(self, command, async_=False):
+        self.commands.append(command)
+
+    def async_call(self, fn, *args):
+        fn(*args)
+
+    def out_write(self, message):
+        pass
+
+    def err_write(self, message):
+        self.errors.append(message)
@@ -0,0 +1,142 @@
+"""The stages of the tag pipeline, each wrapped up as a function without
+arguments to be timed by bench.measure().
+"""
+import gzip
+import lzma
+import os
+import shutil
+
+from bench import corpus
+from bench.nvim import Buffer, Nvim, vim_defaults
+
+from neotags.buftokens import BufferTokens, STRIP_LANGS
+from neotags.neotags import HighlightGroup, Neotags
+from neotags.tagindex import TagIndex
+from neotags.utils import find_tags, strip_c, tokenize
+
+
+class NullDiagnostics:
+    """Stands in for the `dia' the functions of neotags.utils log to."""
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+DIA = NullDiagnostics()
+
+
+def opener(path):
+    ext = os.path.splitext(path)[1]
+    return {'.gz': gzip.open, '.xz': lzma.open}.get(ext, open)(path, 'rb')
+
+
+def read_tags(path):
+    """Read a whole tags file, as the plugin does without an index."""
+    def run():
+        with opener(path) as fp:
+            return fp.read()
+    return run
+
+
+def find_tags_stage(data, ft):
+    lang = corpus.FILETYPES[ft]
+    order = vim_defaults().get('neotags#%s#order' % ft, 'f')
+
+    def run():
+        return find_tags(DIA, data, lang, order, [], None)
+    return run
+
+
+def strip_c_stage(text):
+    return lambda: strip_c(text, DIA)
+
+
+def tokenize_stage(text, ft):
+    if ft in STRIP_LANGS:
+        data = strip_c(text, DIA)
+    else:
+        data = text.encode('ascii', errors='replace')
+    return lambda: tokenize(data, DIA)
+
+
+def buffer_tokens_stage(lines, ft):
+    return lambda: BufferTokens(lines, 1, ft in STRIP_LANGS)
+
+
+class Session:
+    """A Neotags highlighting one buffer from one tags file, on a stand-in
+    nvim. The tags file is linked to where the plugin looks for the tags of
+    the buffer's directory, which is made up under `workdir'. `settings'
+    overrides the g:neotags_* variables the session starts with.
+    """
+
+    def __init__(self, workdir, tags, ft, lines, binary=None, index=False,
+                 cache=True, settings=None):
+        compression = {'.gz': 'gzip', '.xz': 'lzma'}.get(
+            os.path.splitext(tags)[1], 'none')
+        project = os.path.join(workdir, 'project')
+        tagdir = os.path.join(workdir, 'session')
+        shutil.rmtree(tagdir, ignore_errors=True)
+        os.makedirs(project, exist_ok=True)
+        os.makedirs(tagdir)
+
+        variables = vim_defaults()
+        variables.update({
+            'neotags_directory': tagdir,
+            'neotags_settings_file': os.path.join(tagdir, 'neotags.json'),
+            'neotags_run_ctags': 0,
+            'neotags_ctags_args': [],
+            'neotags_norecurse_dirs': [],
+            'neotags_use_compression': int(compression != 'none'),
+            'neotags_compression_type': compression,
+            'neotags_use_index': int(index),
+            'neotags_use_binary': int(binary is not None),
+            'neotags_bin': binary or '',
+            'neotags_cache_size': 64 if cache else 0,
+            'neotags_large_buffer': 0,
+            'neotags_loaded': 0,
+            'neotags_verbose': 0,
+        })
+        variables.update(settings or {})
+
+        suffix = corpus.COMPRESSIONS[compression][0]
+        tagfile = '%s/%s.tags%s' % (tagdir, project.replace(os.sep, '__'),
+                                    suffix)
+        os.symlink(os.path.abspath(tags), tagfile)
+        if index:
+            # Otherwise it would be built in the background.
+            with opener(tagfile) as fp:
+                TagIndex(tagfile).build(fp)
+
+        ext = corpus.LANGUAGES[corpus.FILETYPES[ft]][1]
+        self.buffer = Buffer(1, os.path.join(project, 'buffer.' + ext), lines)
+        self.nvim = Nvim(variables, ft, self.buffer)
+        self.neotags = Neotags(self.nvim)
+        self.neotags.init()
+        self.ft = ft
+        # Attach to the buffer, and uncompress the tags file.
+        self.neotags.update(True)
+
+    def parse_tags(self):
+        """Find the tags of the buffer, from reading the tags file to
+        filtering them by the buffer's tokens.
+        """
+        return lambda: self.neotags._parseTags(self.ft)
+
+    def highlight(self):
+        """Make the highlight commands of the tags found, and send them."""
+        hl = HighlightGroup()
+        hl.ft = self.ft
+        hl.file = self.buffer.name
+        hl.number = self.buffer.number
+
+        def run():
+            hl.highlights = {}
+            self.nvim.commands.clear()
+            self.neotags.highlight(True, hl)
+            self.neotags._flush(hl)
+        return run
+
+    def update(self):
+        """All of a forced update."""
+        return lambda: self.neotags.update(True)
@@ -0,0 +1,261 @@
+#include "neotags.h"
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+
+#define DAEMON_FIELDS 9
+#define MAX_LOADED    32
+
+/*  Daemon mode. Instead of handling one buffer and exiting, the program reads
+    requests from the standard input until it is closed. Every tags file that
+    was read stays in memory, already split into tags, and is only read again
+    once it changes on disk.
+
+    A request is one line holding the same arguments that are otherwise given
+    on the command line, in the same order and separated by tabs, followed by
+    exactly as many bytes of vim buffer as the sixth of them says. Each request
+    is answered by a line "<status> <length>" followed by <length> bytes: the
+    tags in the usual format if the status is 0, or else an error message. */
+
+struct tagfile {
+    char *name;
+    char *comptype;
+    char *buf;
+    taglist tags;
+    struct stat st;
+    struct tagfile *next;
+};
+
+static struct tagfile *loaded = NULL;
+
+static int handle_request(FILE *out, char **args, string *vim_buf,
+                          const char **error);
+static struct tagfile *load_tagfile(const char *comptype,
+                                    const char *filename);
+static void free_tagfile(struct tagfile *file);
+
+
+int
+run_daemon(void)
+{
+    #ifdef DOSISH
+    errx(1, "Daemon mode is not supported on this platform.");
+    #else
+    char *header;
+
+    while (my_getline(&header), header != NULL) {
+        char *args[DAEMON_FIELDS], *pos = header;
+        int nargs = 0;
+
+        while (nargs < DAEMON_FIELDS && pos) {
+            args[nargs++] = strsep(&pos, "\t");
+        }
+
+        if (nargs != DAEMON_FIELDS || pos) {
+            errx(1, "Malformed request.");
+        }
+
+        const size_t nchars = strtoull(args[5], NULL, 10);
+        string vim_buf      = { malloc(nchars + 1llu), 0, 0 };
+
+        vim_buf.len            = fread(vim_buf.s, 1, nchars, stdin);
+        vim_buf.s[vim_buf.len] = '\0';
+
+        if (vim_buf.len != nchars) {
+            errx(1, "Read error => size: %zu, read: %zu", nchars, vim_buf.len);
+        }
+
+        const char *error = NULL;
+        char *data        = NULL;
+        size_t size       = 0;
+        FILE *out         = open_memstream(&data, &size);
+
+        const int status = handle_request(out, args, &vim_buf, &error);
+        fclose(out);
+
+        if (status) {
+            printf("%d %zu\n%s", status, strlen(error), error);
+        } else {
+            printf("0 %zu\n", size);
+            fwrite(data, 1, size, stdout);
+        }
+
+        fflush(stdout);
+        free_all(data, vim_buf.s, header);
+    }
+
+    while (loaded) {
+        struct tagfile *next = loaded->next;
+        free_tagfile(loaded);
+        loaded = next;
+    }
+
+    return 0;
+    #endif
+}
+
+
+static int
+handle_request(FILE *out, char **args, string *vim_buf, const char **error)
+{
+    const strlist *files    = get_colon_data(args[0]);
+    const string  ctlang    = tostring(args[1]);
+    const string  vimlang   = tostring(args[2]);
+    const string  order     = tostring(args[3]);
+    const bool    strip_com = strtol(args[4], NULL, 10);
+    const strlist *skip     = get_colon_data(args[6]);
+    const strlist *equiv    = get_colon_data(args[7]);
+    const string  filename  = tostring(args[8]);
+
+    const struct Tag **tagp = NULL;
+    int64_t ntags = 0;
+    int status    = 0;
+
+    if (!(lang_id = id_lang(&vimlang))) {
+        *error = "Unsupported language.";
+        status = 1;
+        goto done;
+    }
+
+    is_c_or_cpp = (lang_id->id == _C_ || lang_id->id == _CPP_);
+
+    /*  Load (or find) every requested file first, as loading one may evict
+        another from the list. */
+    for (int64_t i = 0; i + 1 < files->num; i += 2) {
+        struct tagfile *file = load_tagfile(files->lst[i]->s,
+                                            files->lst[i + 1]->s);
+
+        if (file) {
+            ntags += file->tags.num;
+        }
+    }
+
+    if (ntags == 0) {
+        *error = "No tags found!";
+        status = 1;
+        goto done;
+    }
+
+    tagp  = nmalloc(ntags, sizeof(*tagp));
+    ntags = 0;
+
+    for (struct tagfile *file = loaded; file; file = file->next) {
+        for (int64_t i = 0; i + 1 < files->num; i += 2) {
+            if (streq(file->name, files->lst[i + 1]->s)) {
+                for (int64_t j = 0; j < file->tags.num; ++j) {
+                    tagp[ntags++] = &file->tags.lst[j];
+                }
+
+                break;
+            }
+        }
+    }
+
+    if (strip_com) {
+        strip_comments(vim_buf);
+    }
+
+    strlist *toks = tokenize(vim_buf);
+    strlist *list = tok_search(tagp, ntags, toks, skip, equiv, &ctlang,
+                               &order, &filename);
+
+    if (lang_id->id == _VIM_) {
+        print_tags_vim(out, list, vimlang.s);
+    } else {
+        print_tags(out, list, vimlang.s);
+    }
+
+    free_all_strlists(toks, list);
+    free_all(toks->lst, toks, list->lst, list);
+
+done:
+    free_colon_data(files);
+    free_colon_data(skip);
+    free_colon_data(equiv);
+    free(tagp);
+
+    return status;
+}
+
+
+/*  Return the parsed tags of `filename', reading it only if it isn't loaded
+    yet or has changed since it was. Files are kept in most recently used
+    order and only the MAX_LOADED most recent ones are kept. */
+static struct tagfile *
+load_tagfile(const char *comptype, const char *filename)
+{
+    struct tagfile **prev = &loaded, *file = NULL;
+    struct stat st;
+
+    if (stat(filename, &st) != 0) {
+        warn("Failed to stat file '%s'", filename);
+        return NULL;
+    }
+
+    for (; *prev; prev = &(*prev)->next) {
+        if (streq((*prev)->name, filename)) {
+            file  = *prev;
+            *prev = file->next;
+            break;
+        }
+    }
+
+    if (file && streq(file->comptype, comptype) &&
+            file->st.st_mtime == st.st_mtime &&
+            file->st.st_size == st.st_size && file->st.st_ino == st.st_ino) {
+        file->next = loaded;
+        return loaded = file;
+    }
+
+    if (file) {
+        free_tagfile(file);
+    }
+
+    strlist lines = { nmalloc(INIT_TAGS, sizeof(*lines.lst)), 0, INIT_TAGS };
+    char *buf     = getlines(&lines, comptype, filename);
+
+    if (!buf) {
+        free_all_strlists(&lines);
+        free(lines.lst);
+        return NULL;
+    }
+
+    file  = malloc(sizeof * file);
+    *file = (struct tagfile) {
+        .name     = strdup(filename),
+        .comptype = strdup(comptype),
+        .buf      = buf,
+        .tags     = { nmalloc(INIT_TAGS, sizeof(*file->tags.lst)), 0, INIT_TAGS },
+        .st       = st,
+        .next     = loaded,
+    };
+
+    parse_tags(&file->tags, &lines);
+    free_all_strlists(&lines);
+    free(lines.lst);
+
+    loaded = file;
+
+    /* Forget the least recently used files. */
+    prev = &loaded;
+
+    for (int i = 0; *prev && i < MAX_LOADED; ++i) {
+        prev = &(*prev)->next;
+    }
+
+    while (*prev) {
+        struct tagfile *next = (*prev)->next;
+        free_tagfile(*prev);
+        *prev = next;
+    }
+
+    return file;
+}
+
+
+static void
+free_tagfile(struct tagfile *file)
+{
+    free_all(file->name, file->comptype, file->buf, file->tags.lst, file);
+}
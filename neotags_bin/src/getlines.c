@@ -14,38 +14,99 @@
 
 
 static void ll_strsep(struct StringLst *tags, char *buf);
-static void plain_getlines(struct StringLst *tags, const char *filename);
-static void gz_getlines(struct StringLst *tags, const char *filename);
+static char *plain_getlines(struct StringLst *tags, const char *filename);
+static char *gz_getlines(struct StringLst *tags, const char *filename);
 #ifdef LZMA_SUPPORT
-    static void xz_getlines(struct StringLst *tags, const char *filename);
+    static char *xz_getlines(struct StringLst *tags, const char *filename);
 #endif
 
 /* ========================================================================== */
 
 
-int
+/*  Returns the buffer holding the file's contents, which every line added to
+    `tags' points into, or NULL on failure. It is up to the caller to free it
+    once it is done with the lines. */
+char *
 getlines(struct StringLst *tags, const char *comptype, const char *filename)
 {
     warnx("Attempting to read tag file %s", filename);
 
     if (streq(comptype, "none")) {
-        plain_getlines(tags, filename);
+        return plain_getlines(tags, filename);
     } else if (streq(comptype, "gzip")) {
-        gz_getlines(tags, filename);
+        return gz_getlines(tags, filename);
     }
 
     #ifdef LZMA_SUPPORT
     else if (streq(comptype, "lzma")) {
-        xz_getlines(tags, filename);
+        return xz_getlines(tags, filename);
     }
 
     #endif
-    else {
-        warnx("Unknown compression type %s!", comptype);
-        return 0;
-    }
 
-    return 1; /* 1 indicates success here... */
+    warnx("Unknown compression type %s!", comptype);
+    return NULL;
+}
+
+
+/*  Split every line of a tags file into its name, file, kind and language,
+    adding those that have both of the latter to `out'. The lines are split in
+    place (tabs become nul bytes), so they can only be parsed once. */
+void
+parse_tags(struct TagLst *out, const struct StringLst *lines)
+{
+    for (int64_t i = 0; i < lines->num; ++i) {
+        char *cur = lines->lst[i]->s;
+
+        /* Skip empty lines and comments. */
+        if (!cur[0] || cur[0] == '!') {
+            continue;
+        }
+
+        struct Tag tag = { .kind = '\0' };
+
+        /* The name is first, followed by two fields we don't need. */
+        tag.name.s   = strsep(&cur, "\t");
+        tag.name.len = cur ? (size_t)(cur - tag.name.s - 1) : strlen(tag.name.s);
+        if (!cur) {
+            continue;
+        }
+        tag.file.s   = strsep(&cur, "\t");
+        tag.file.len = cur ? (size_t)(cur - tag.file.s - 1) : strlen(tag.file.s);
+        if (!cur || !(cur = strchr(cur, '\t'))) {
+            continue;
+        }
+
+        /*  Extract the 'kind' and 'language' fields. The former is the
+            only one that is 1 character long, and the latter is prefaced. */
+        char *tok;
+        while ((tok = strsep(&cur, "\t"))) {
+            if (tok[0] && !tok[1]) {
+                tag.kind = *tok;
+            } else if (strncmp(tok, "language:", 9) == 0) {
+                tag.lang = tostring(tok + 9);
+            }
+        }
+
+        if (!tag.lang.s || !tag.kind) {
+            continue;
+        }
+
+        #ifdef DOSISH
+
+        if (tag.lang.len && tag.lang.s[tag.lang.len - 1] == '\r') {
+            tag.lang.s[--tag.lang.len] = '\0';
+        }
+
+        #endif
+
+        if (out->num == out->max) {
+            out->lst = nrealloc(out->lst, (out->max += TAGS_INC),
+                                sizeof(*out->lst));
+        }
+
+        out->lst[out->num++] = tag;
+    }
 }
 
 
@@ -53,8 +114,6 @@ static void
 ll_strsep(struct StringLst *tags, char *buf)
 {
     char *tok;
-    /* Set this global pointer so the string can be free'd later... */
-    add_backup(&backup_pointers, buf);
 
     while ((tok = strsep(&buf, "\n")) != NULL) {
         if (*tok == '\0') {
@@ -92,7 +151,7 @@ report_size(struct archive_size *size)
 /* PLAIN */
 
 
-static void
+static char *
 plain_getlines(struct StringLst *tags, const char *filename)
 {
     FILE *fp = safe_fopen(filename, "rb");
@@ -103,13 +162,16 @@ plain_getlines(struct StringLst *tags, const char *filename)
 
     if (fread(buffer, 1, st.st_size, fp) != (size_t)st.st_size || ferror(fp)) {
         warn("Error reading file %s", filename);
-        return;
+        fclose(fp);
+        free(buffer);
+        return NULL;
     }
 
     buffer[st.st_size] = '\0';
 
     fclose(fp);
     ll_strsep(tags, buffer);
+    return buffer;
 }
 
 
@@ -119,7 +181,7 @@ plain_getlines(struct StringLst *tags, const char *filename)
 #include <zlib.h>
 
 
-static void
+static char *
 gz_getlines(struct StringLst *tags, const char *filename)
 {
     struct archive_size size;
@@ -130,7 +192,7 @@ gz_getlines(struct StringLst *tags, const char *filename)
 
     if (!gfp) {
         warn("Failed to open file");
-        return;
+        return NULL;
     }
 
     /* Magic macros to the rescue. */
@@ -143,6 +205,7 @@ gz_getlines(struct StringLst *tags, const char *filename)
     /* Always remember to null terminate the thing. */
     out_buf[size.uncompressed] = '\0';
     ll_strsep(tags, (char *)out_buf);
+    return (char *)out_buf;
 }
 
 
@@ -155,7 +218,7 @@ extern const char *message_strm(lzma_ret);
 
 
 /* It would be nice if there were some magic macros to read an xz file too. */
-static void
+static char *
 xz_getlines(struct StringLst *tags, const char *filename)
 {
     struct archive_size size;
@@ -214,5 +277,6 @@ xz_getlines(struct StringLst *tags, const char *filename)
     free(in_buf);
 
     ll_strsep(tags, (char *)out_buf);
+    return (char *)out_buf;
 }
 #endif
@@ -49,7 +49,7 @@ id_lang(const string *lang)
     lower_string(lang->s);
     for (size_t i = 1; i < ARRSIZ(languages); ++i) {
         if (string_eq(lang, &languages[i].lang)) {
-            printf("Recognized ft as language \"%s\".", languages[i].lang.s);
+            warnx("Recognized ft as language \"%s\".", languages[i].lang.s);
             return &languages[i];
         }
     }
@@ -60,17 +60,19 @@ id_lang(const string *lang)
 
 
 #define DATA (list->lst)
-#define PRINT(IT) (printf("%s#%c\t%s\n", ft, DATA[IT]->kind, DATA[IT]->s))
-
-void print_tags_vim(struct StringLst *list, const char *ft)
+void print_tags_vim(FILE *fp, struct StringLst *list, const char *ft)
 {
     char *tmp;
 
+    if (list->num == 0) {
+        return;
+    }
+
     /* Always print the first tag. */
     if (DATA[0]->kind == 'f' && (tmp = strchr(DATA[0]->s, ':'))) {
-        printf("%s#%c\t%s\n", ft, DATA[0]->kind, tmp + 1);
+        fprintf(fp, "%s#%c\t%s\n", ft, DATA[0]->kind, tmp + 1);
     } else {
-        printf("%s#%c\t%s\n", ft, DATA[0]->kind, DATA[0]->s);
+        fprintf(fp, "%s#%c\t%s\n", ft, DATA[0]->kind, DATA[0]->s);
     }
 
 
@@ -78,9 +80,9 @@ void print_tags_vim(struct StringLst *list, const char *ft)
         if (DATA[i]->len != DATA[i - 1]->len ||
             memcmp(DATA[i]->s, DATA[i - 1]->s, DATA[i]->len) != 0) {
             if (DATA[0]->kind == 'f' && (tmp = strchr(DATA[i]->s, ':'))) {
-                printf("%s#%c\t%s\n", ft, DATA[i]->kind, tmp + 1);
+                fprintf(fp, "%s#%c\t%s\n", ft, DATA[i]->kind, tmp + 1);
             } else {
-                printf("%s#%c\t%s\n", ft, DATA[i]->kind, DATA[i]->s);
+                fprintf(fp, "%s#%c\t%s\n", ft, DATA[i]->kind, DATA[i]->s);
             }
         }
 }
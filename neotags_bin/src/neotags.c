@@ -8,11 +8,9 @@
 
 #ifdef DOSISH
     #include <malloc.h>
-    #define __CONST__
     #define SEPCHAR ';'
 #else
     #include <alloca.h>
-    #define __CONST__ const
     #define SEPCHAR ':'
 #endif
 
@@ -27,12 +25,6 @@ const struct language_id *lang_id;
 char *program_name;
 struct Backups backup_pointers;
 
-static const strlist *get_colon_data(char *oarg);
-static void print_tags(const strlist *lst, const char *ft);
-static strlist *tok_search(strlist *tags, strlist *vimbuf,
-                           const strlist *skip,
-                           const strlist *equiv, const string *lang,
-                           const string *order, const string *filename);
 static void *do_tok_search(void *vdata);
 
 bool is_c_or_cpp;
@@ -45,6 +37,14 @@ main(int argc, char *argv[])
         errx(1, "This program can't be run manually.");
     }
 
+    program_name = handle_progname(*argv);
+    backup_pointers.lst = nmalloc((backup_pointers.max = 1024llu),
+                                  sizeof(char *));
+
+    if (argc == 2 && streq(argv[1], "--daemon")) {
+        return run_daemon();
+    }
+
     if (--argc != REQUIRED_INPUT) {
         errx(2, "Error: Wrong number of paramaters (%d, need %d).",
              argc, REQUIRED_INPUT);
@@ -53,9 +53,7 @@ main(int argc, char *argv[])
     printf("Program ID: %s\n",  PROG_ID);
 
     int nread = 0;
-    program_name = handle_progname(*argv++);
-    backup_pointers.lst = nmalloc((backup_pointers.max = 1024llu),
-                                  sizeof(char *));
+    ++argv;
 
     /*  The only thing that uses this program is neotags.py, so the input is
         guarenteed to be provided in the following order. */
@@ -69,21 +67,41 @@ main(int argc, char *argv[])
     const strlist *equiv    = get_colon_data(*argv++);
     const string  filename  = tostring(*argv++);
 
-    lang_id     = id_lang(&vimlang);
+    if (!(lang_id = id_lang(&vimlang))) {
+        errx(1, "Error: unsupported language.");
+    }
     is_c_or_cpp = (lang_id->id == _C_ || lang_id->id == _CPP_);
 
-    strlist tags   = { nmalloc(INIT_TAGS, sizeof(*tags.lst)), 0, INIT_TAGS };
+    strlist lines  = { nmalloc(INIT_TAGS, sizeof(*lines.lst)), 0, INIT_TAGS };
+    taglist tags   = { nmalloc(INIT_TAGS, sizeof(*tags.lst)), 0, INIT_TAGS };
     string vim_buf = { malloc(nchars + 1llu), 0, 0 };
 
     /* Read all of the tag existing files and combine the tags into one list. */
-    for (unsigned i = 0; i < files->num; i += 2) {
-        nread += getlines(&tags, files->lst[i]->s, files->lst[i + 1]->s);
+    for (unsigned i = 0; i + 1 < files->num; i += 2) {
+        char *buf = getlines(&lines, files->lst[i]->s, files->lst[i + 1]->s);
+
+        if (buf) {
+            add_backup(&backup_pointers, buf);
+            ++nread;
+        }
     }
 
     if (nread == 0) {
         errx(1, "Error: no files were successfully read.");
     }
 
+    parse_tags(&tags, &lines);
+
+    if (tags.num == 0) {
+        errx(1, "No tags found!");
+    }
+
+    const struct Tag **tagp = nmalloc(tags.num, sizeof(*tagp));
+
+    for (int64_t i = 0; i < tags.num; ++i) {
+        tagp[i] = &tags.lst[i];
+    }
+
     /* Get the contents of the vim buffer from the standard input. */
     vim_buf.len            = fread(vim_buf.s, 1, nchars, stdin);
     vim_buf.s[vim_buf.len] = '\0';
@@ -97,30 +115,36 @@ main(int argc, char *argv[])
     }
 
     /*  Crudely tokenize the vim buffer into words, discarding punctuation
-        and hopefully not any identifiers. The returned list is sorted and
-        ready for use with bsearch. */
+        and hopefully not any identifiers. */
     strlist *toks = tokenize(&vim_buf);
-    strlist *list = tok_search(&tags, toks, skip, equiv, &ctlang, &order,
-                               &filename);
+    strlist *list = tok_search(tagp, tags.num, toks, skip, equiv, &ctlang,
+                               &order, &filename);
+
+    if (list->num == 0) {
+        errx(0, "No tags found in buffer.");
+    }
 
     if (lang_id->id == _VIM_) {
-        print_tags_vim(list, vimlang.s);
+        print_tags_vim(stdout, list, vimlang.s);
     } else {
-        print_tags(list, vimlang.s);
+        print_tags(stdout, list, vimlang.s);
     }
 
     /* Pointlessly free everything. */
     free_list(&backup_pointers);
-    free_all_strlists(&tags, files, skip, equiv, toks, list);
-    free_all(equiv->lst, (void *)equiv, files->lst, files, skip->lst, skip,
-             tags.lst, vim_buf.s, toks->lst, toks, list->lst, list, backup_pointers.lst);
+    free_all_strlists(&lines, toks, list);
+    free_colon_data(files);
+    free_colon_data(skip);
+    free_colon_data(equiv);
+    free_all(lines.lst, tags.lst, tagp, vim_buf.s, toks->lst, toks, list->lst,
+             list, backup_pointers.lst);
 
     return 0;
 }
 
 /* ========================================================================== */
 
-static const strlist *
+const strlist *
 get_colon_data(char *oarg)
 {
     char sep[2], *tok, *arg = oarg;
@@ -149,6 +173,14 @@ get_colon_data(char *oarg)
 }
 
 
+void
+free_colon_data(const strlist *lst)
+{
+    free_list(lst);
+    free_all(lst->lst, (void *)lst);
+}
+
+
 /*  Compares two struct Strings in a reasonably efficient manner, avoiding actual
     lexical comparision unless it is absolutely necessary. The results won't be
     "properly" sorted alphabetically, but that doesn't matter - the only
@@ -174,30 +206,81 @@ tag_cmp(const void *vA, const void *vB)
 }
 
 
-/* Also compares two struct Strings, but ignores the 'kind' field. */
-static int
-s_string_cmp(const void *vA, const void *vB)
+/*  A set of the tokens in the vim buffer: an open addressing hash table of
+    FNV-1a hashes with linear probing. The table is kept at least twice as
+    large as the number of tokens, so it never fills up and every lookup is
+    close to a single probe. */
+struct tokset {
+    const string **tab;
+    size_t mask;
+};
+
+static uint64_t
+hash_string(const string *str)
 {
-    int ret;
-    const string *A = *(string **)(vA);
-    const string *B = *(string **)(vB);
+    uint64_t hash = UINT64_C(14695981039346656037);
 
-    if (A->len == B->len) {
-        ret = memcmp(A->s, B->s, A->len);
-    } else {
-        ret = A->len - B->len;
+    for (size_t i = 0; i < str->len; ++i) {
+        hash ^= (unsigned char)str->s[i];
+        hash *= UINT64_C(1099511628211);
     }
 
-    return ret;
+    return hash;
+}
+
+
+static struct tokset *
+tokset_new(const strlist *toks)
+{
+    size_t size = 64;
+
+    while (size < (size_t)toks->num * 2) {
+        size <<= 1;
+    }
+
+    struct tokset *set = malloc(sizeof * set);
+    *set = (struct tokset) {
+        calloc(size, sizeof * set->tab), size - 1
+    };
+
+    for (int64_t i = 0; i < toks->num; ++i) {
+        size_t h = hash_string(toks->lst[i]) & set->mask;
+
+        while (set->tab[h] && !string_eq(set->tab[h], toks->lst[i])) {
+            h = (h + 1) & set->mask;
+        }
+
+        set->tab[h] = toks->lst[i];
+    }
+
+    return set;
+}
+
+
+static bool
+tokset_has(const struct tokset *set, const string *str)
+{
+    for (size_t h = hash_string(str) & set->mask; set->tab[h];
+            h = (h + 1) & set->mask) {
+        if (string_eq(set->tab[h], str)) {
+            return true;
+        }
+    }
+
+    return false;
 }
 
 
 #define DATA (lst->lst)
-#define PRINT(IT) (printf("%s#%c\t%s\n", ft, DATA[IT]->kind, DATA[IT]->s))
+#define PRINT(IT) (fprintf(fp, "%s#%c\t%s\n", ft, DATA[IT]->kind, DATA[IT]->s))
 
-static void
-print_tags(const strlist *lst, const char *ft)
+void
+print_tags(FILE *fp, const strlist *lst, const char *ft)
 {
+    if (lst->num == 0) {
+        return;
+    }
+
     /* Always print the first tag. */
     PRINT(0);
 
@@ -231,16 +314,8 @@ in_order(const strlist *equiv, const string *order, char *kind)
 
 
 static bool
-is_correct_lang(const string *lang, __CONST__ string *match_lang)
+is_correct_lang(const string *lang, const string *match_lang)
 {
-    #ifdef DOSISH
-
-    if (match_lang->s[match_lang->len - 1] == '\r') {
-        match_lang->s[match_lang->len - 1] = '\0';
-    }
-
-    #endif
-
     if (string_eq_i(match_lang, lang)) {
         return true;
     }
@@ -265,22 +340,23 @@ skip_tag(const strlist *skip, const string *find)
 /*============================================================================*/
 
 
-#define vim_d  (vimbuf->lst)
-#define uniq_d (uniq->lst)
 struct pdata {
-    const strlist *vim_buf;
+    const struct tokset *vim_buf;
     const strlist *skip;
     const strlist *equiv;
     const string *lang;
     const string *order;
     const string *filename;
-    string **lst;
+    const struct Tag *const *lst;
     int num;
 };
 
 
-static strlist *
-tok_search(strlist *tags,
+/*  Returns the tags that belong in the buffer, sorted so that duplicates are
+    adjacent. The strings in the returned list point into `tags'. */
+strlist *
+tok_search(const struct Tag *const *tags,
+           int64_t ntags,
            strlist *vimbuf,
            const strlist *skip,
            const strlist *equiv,
@@ -288,10 +364,6 @@ tok_search(strlist *tags,
            const string *order,
            const string *filename)
 {
-    if (tags->num == 0) {
-        errx(1, "No tags found!");
-    }
-
     int num_threads = find_num_cpus();
 
     if (num_threads <= 0) {
@@ -300,36 +372,24 @@ tok_search(strlist *tags,
 
     pthread_t *tid = alloca(num_threads * sizeof(*tid));
     strlist **out  = alloca(num_threads * sizeof(*out));
-    warn("Sorting through %" PRIi64 " tags with %d cpus.", tags->num, num_threads);
-
-    /*  Because we may have examined multiple tags files, it's very possible
-        for there to be duplicate tags. Sort the list and remove any. */
-    qsort(vim_d, vimbuf->num, sizeof(*vim_d), &s_string_cmp);
+    warnx("Sorting through %" PRIi64 " tags with %d cpus.", ntags, num_threads);
 
-    strlist *uniq = malloc(sizeof * uniq);
-    *uniq = (strlist) {
-        .lst = nmalloc(vimbuf->num, sizeof * uniq->lst),
-        .num = 1, .max = vimbuf->num
-    };
-    uniq_d[0] = vim_d[0];
-
-    for (int i = 1; i < vimbuf->num; ++i)
-        if (!string_eq(vim_d[i], vim_d[i - 1])) {
-            uniq_d[uniq->num++] = vim_d[i];
-        }
+    /*  Hash the buffer's tokens once, so that checking each tag against
+        them costs the same however big the buffer is. */
+    struct tokset *toks = tokset_new(vimbuf);
 
     /*  Launch the actual search in separate threads, with each handling as
         close to an equal number of tags as the math allows. */
     for (int i = 0; i < num_threads; ++i) {
         struct pdata *tmp = malloc(sizeof * tmp);
-        int quot = (int)tags->num / num_threads;
+        int quot = (int)ntags / num_threads;
         int num  = (i == num_threads - 1)
-                   ? (int)(tags->num - ((num_threads - 1) * quot))
+                   ? (int)(ntags - ((num_threads - 1) * quot))
                    : quot;
 
         *tmp = (struct pdata) {
-            uniq, skip, equiv, lang, order, filename,
-                  tags->lst + (i * quot), num
+            toks, skip, equiv, lang, order, filename,
+                  tags + (i * quot), num
         };
 
         if (pthread_create(tid + i, NULL, &do_tok_search, tmp) != 0) {
@@ -342,7 +402,7 @@ tok_search(strlist *tags,
         pthread_join(tid[i], (void **)(&out[i]));
     }
 
-    free_all(uniq->lst, uniq);
+    free_all(toks->tab, toks);
     unsigned total = 0;
     unsigned offset = 0;
 
@@ -350,13 +410,9 @@ tok_search(strlist *tags,
         total += out[T]->num;
     }
 
-    if (total == 0) {
-        errx(0, "No tags found in buffer.");
-    }
-
     /*  Combine the returned data from all threads into one array, which is
         then sorted and returned. */
-    string **alldata = nmalloc(total, sizeof * alldata);
+    string **alldata = nmalloc(total + 1, sizeof * alldata);
     strlist *ret     = malloc(sizeof * ret);
     *ret = (strlist) {
         alldata, total, total
@@ -377,8 +433,7 @@ tok_search(strlist *tags,
     return ret;
 }
 
-#define INIT_MAX ((data->num / 2) * 3)
-#define cur_str (data->lst[i]->s)
+#define INIT_MAX ((data->num / 2) * 3 + 2)
 
 static void *
 do_tok_search(void *vdata)
@@ -391,38 +446,8 @@ do_tok_search(void *vdata)
     };
 
     for (int i = 0; i < data->num; ++i) {
-        /* Skip empty lines and comments. */
-        if (!cur_str[0] || cur_str[0] == '!') {
-            continue;
-        }
-
-        string name, match_file;
-
-        /* The name is first, followed by two fields we don't need. */
-        name.s         = strsep(&cur_str, "\t");
-        name.len       = (cur_str - name.s - 1);
-        match_file.s   = strsep(&cur_str, "\t");
-        match_file.len = (cur_str - match_file.s - 1);
-        cur_str = strchr(cur_str, '\t');
-
-        char *tok, kind = '\0';
-        string match_lang = { NULL, 0, 0 };
-
-        /*  Extract the 'kind' and 'language' fields. The former is the
-            only one that is 1 character long, and the latter is prefaced. */
-        while ((tok = strsep(&cur_str, "\t"))) {
-            if (tok[0] && !tok[1]) {
-                kind = *tok;
-            } else if (strncmp(tok, "language:", 9) == 0) {
-                match_lang = tostring(tok + 9);
-            }
-        }
-
-        if (!match_lang.s || !kind) {
-            continue;
-        }
-
-        string *name_p = &name;
+        const struct Tag *tag = data->lst[i];
+        char kind = tag->kind;
 
         /*  Prune tags. Include only those that are:
               1) of a type in the `order' list,
@@ -431,14 +456,13 @@ do_tok_search(void *vdata)
               4) are present in the current vim buffer.
             If invalid, just move on. */
         if (in_order(data->equiv, data->order, &kind) &&
-            is_correct_lang(data->lang, &match_lang) &&
-            !skip_tag(data->skip, &name) &&
-            (string_eq(data->filename, &match_file) ||
-             bsearch(&name_p, data->vim_buf->lst, data->vim_buf->num,
-                     sizeof(*data->vim_buf->lst), &s_string_cmp))) {
+            is_correct_lang(data->lang, &tag->lang) &&
+            !skip_tag(data->skip, &tag->name) &&
+            (string_eq(data->filename, &tag->file) ||
+             tokset_has(data->vim_buf, &tag->name))) {
             string *tmp = malloc(sizeof * tmp);
             *tmp = (string) {
-                name.s, name.len, kind
+                tag->name.s, tag->name.len, kind
             };
             add_to_list(ret, tmp);
         }
@@ -59,6 +59,20 @@ struct StringLst {
     int64_t max;
 };
 
+/* One parsed line of a tags file. All strings point into the file's buffer. */
+struct Tag {
+    struct String name;
+    struct String file;
+    struct String lang;
+    char kind;
+};
+
+struct TagLst {
+    struct Tag *lst;
+    int64_t num;
+    int64_t max;
+};
+
 struct Backups {
     char **lst;
     int64_t num;
@@ -67,6 +81,7 @@ struct Backups {
 
 typedef struct String string;
 typedef struct StringLst strlist;
+typedef struct TagLst taglist;
 
 enum lang_e {
     _NONE_ = 0,
@@ -199,13 +214,31 @@ extern void *xreallocarray(void *ptr, size_t num,
 /*
     Else
 */
-extern int  getlines(strlist *tags, const char *comptype,
-                     const char *filename);
+extern char *getlines(strlist *tags, const char *comptype,
+                      const char *filename);
+extern void parse_tags(taglist *out, const strlist *lines);
 extern void strip_comments(string *buffer);
 extern strlist *tokenize(string *vimbuf);
 /* extern enum lang_e id_lang(const string *lang); */
 extern const struct language_id *id_lang(const string *lang);
-extern void print_tags_vim(strlist *list, const char *ft);
+extern void print_tags_vim(FILE *fp, strlist *list, const char *ft);
+
+/*
+    neotags.c
+*/
+extern bool is_c_or_cpp;
+extern const strlist *get_colon_data(char *oarg);
+extern void free_colon_data(const strlist *lst);
+extern void print_tags(FILE *fp, const strlist *lst, const char *ft);
+extern strlist *tok_search(const struct Tag *const *tags, int64_t ntags,
+                           strlist *vimbuf, const strlist *skip,
+                           const strlist *equiv, const string *lang,
+                           const string *order, const string *filename);
+
+/*
+    daemon.c
+*/
+extern int run_daemon(void);
 
 
 /*===========================================================================*/
@@ -105,13 +105,14 @@ handle_cstyle(struct String *vim_buf)
     const char *pos  = vim_buf->s;
 
     double_q = single_q = slash = escape = skip = header = false;
-    buf_orig = buf = malloc(vim_buf->len + 2);
 
     if (!*pos) {
         warnx("Empty vim buffer!");
         return;
     }
 
+    buf_orig = buf = malloc(vim_buf->len + 3);
+
     /*  Add a non-offensive character to the buffer so we never have to worry
         about going out of bounds when checking 1 character backwards. */
     *buf++ = ' ';
@@ -154,7 +155,8 @@ handle_cstyle(struct String *vim_buf)
                     --buf;
 
                     if (!(tmp = strstr(pos, "*/"))) {
-                        errx(1, "Couldn't find end of comment.");
+                        warnx("Couldn't find end of comment.");
+                        break;
                     }
 
                     pos = tmp + 2;
@@ -315,13 +317,14 @@ handle_python(struct String *vim_buf)
     char *buf, *buf_orig;
     bool escape, comment, skip;
 
-    buf    = buf_orig = malloc(vim_buf->len + 2LLU);
-    escape = comment  = skip = false;
-
     if (*pos == '\0') {
-        errx(1, "Empty vim buffer!");
+        warnx("Empty vim buffer!");
+        return;
     }
 
+    buf    = buf_orig = malloc(vim_buf->len + 3LLU);
+    escape = comment  = skip = false;
+
     /*  Add a non-offensive character to the buffer so we never have to worry
         about going out of bounds when checking 1 character backwards. */
     *buf++ = ' ';
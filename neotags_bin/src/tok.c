@@ -19,13 +19,12 @@ static void tokenize_vim(struct StringLst *list, char *vimbuf, cmp_f check);
 static char *strsep_f(char **stringp, cmp_f check);
 
 
+/*  Split the buffer into words in place: the returned strings point into
+    `vimbuf', which is clobbered and must outlive them. */
 struct StringLst *
 tokenize(struct String *vimbuf)
 {
-        char *cpy = malloc(vimbuf->len + 1);
-        memcpy(cpy, vimbuf->s, vimbuf->len);
-        cpy[vimbuf->len] = '\0';
-        add_backup(&backup_pointers, cpy);
+        char *cpy = vimbuf->s;
 
         struct StringLst *list = malloc(sizeof *list);
         *list = (struct StringLst){
@@ -66,7 +65,7 @@ do_tokenize(struct StringLst *list, char *vimbuf, cmp_f check)
                struct String *tmp;
                tmp = malloc(sizeof *tmp);
                tmp->s = tok;
-               tmp->len = vimbuf - tok - 1;
+               tmp->len = vimbuf ? (size_t)(vimbuf - tok - 1) : strlen(tok);
                add_to_list(list, tmp);
         }
 }
@@ -118,12 +117,13 @@ tokenize_vim(struct StringLst *list, char *vimbuf, cmp_f check)
                if (!tok[0])
                        continue;
                struct String *tmp = malloc(sizeof *tmp);
-               *tmp = (struct String){ tok, vimbuf - tok - 1LLU, 0 };
+               const char *end = vimbuf ? vimbuf - 1 : tok + strlen(tok);
+               *tmp = (struct String){ tok, end - tok, 0 };
                add_to_list(list, tmp);
 
                if ((col = strchr(tok, ':'))) {
                        tmp = malloc(sizeof *tmp);
-                       *tmp = (struct String){ tok, vimbuf - (col + 1) - 1LLU, 0 };
+                       *tmp = (struct String){ tok, end - (col + 1), 0 };
                        add_to_list(list, tmp);
                }
         }
@@ -32,6 +32,7 @@ if file_readable(g:neotags_bin)
 else
     call InitVar('use_binary',  0)
 endif
+call InitVar('bin_daemon', 1)
 
 call InitVar('use_compression',   1)
 call InitVar('compression_level', 9)
@@ -43,13 +44,23 @@ call InitVar('find_tool',        0)
 call InitVar('tagfiles_by_type', 0)
 call InitVar('regex_tool',       'ag')
 call InitVar('highlight',        1)
+call InitVar('highlight_backend', 'syntax')
 call InitVar('no_autoconf',      1)
 call InitVar('recursive',        1)
 call InitVar('run_ctags',        1)
+call InitVar('use_index',        1)
+call InitVar('incremental',      1)
+call InitVar('update_delay',     50)
+call InitVar('cache_size',       64)
+call InitVar('max_buffers',      100)
+call InitVar('large_buffer',     20000)
 call InitVar('verbose',          0)
+call InitVar('stats',            0)
 call InitVar('strip_comments',   1)
 call InitVar('silent_timeout',   0)
 call InitVar('ctags_timeout',    240)
+call InitVar('ctags_jobs',       0)
+call InitVar('parse_jobs',       0)
 call InitVar('patternlength',    2048)
 
 " People often make annoying #defines for C and C++ keywords, types, etc. Avoid
@@ -195,6 +206,24 @@ runtime! plugin/neotags/*.vim
 
 let g:neotags_loaded = 1
 
+" Let the plugin know when it has to read the settings again.
+function! s:ConfigChanged(dict, key, change)
+    call NeotagsConfigChanged(a:key)
+endfunction
+
+call dictwatcheradd(g:, 'neotags*', function('s:ConfigChanged'))
+
+" For each [line, col] in positions, whether it is inside a syntax group whose
+" name matches pattern. Lets the extmark backend skip strings and comments.
+function! NeotagsNotin(positions, pattern) abort
+    let l:inside = []
+    for [l:line, l:col] in a:positions
+        let l:names = map(synstack(l:line, l:col), 'synIDattr(v:val, "name")')
+        call add(l:inside, match(l:names, a:pattern) >= 0)
+    endfor
+    return l:inside
+endfunction
+
 function! neotags#initNeotags(...)
 	call NeotagsInit()
 endfunction
@@ -229,8 +258,12 @@ command! -nargs=? -complete=file NeotagsRemoveProject call s:Add_Remove_Project(
 command! -nargs=1 -complete=file NeotagsAddProjectDirectory call NeotagsAddProjectDir(getcwd(), <f-args>)
 command! -nargs=1 -complete=file NeotagsRemoveProjectDirectory call NeotagsRemoveProjectDir(getcwd(), <f-args>)
 command! NeotagsToggle call NeotagsToggle()
+command! NeotagsUpdate call NeotagsUpdate()
 command! NeotagsVerbosity call Neotags_Toggle_Verbosity()
 command! NeotagsBinaryToggle call Neotags_Toggle_C_Binary()
+command! NeotagsMemory call NeotagsMemory()
+command! NeotagsReload call NeotagsReload()
+command! -nargs=? -complete=file NeotagsStats call NeotagsStats(<q-args>)
 
 nnoremap <unique> <Plug>NeotagsToggle :call NeotagsToggle()<CR>
 nmap <silent> <leader>tag <Plug>NeotagsToggle
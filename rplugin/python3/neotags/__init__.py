@@ -21,16 +21,55 @@ class NeotagsHandlers(object):
 
     @pynvim.function('NeotagsHighlight')
     def highlight(self, args):
-        self.__vim.async_call(self.__neotags.update, False)
+        self.__vim.async_call(self.__neotags.request, args, False)
 
     @pynvim.function('NeotagsRehighlight')
     def rehighlight(self, args):
-        # self.__vim.async_call(self.__neotags.highlight, True)
-        self.__vim.async_call(self.__neotags.update, True)
+        self.__vim.async_call(self.__neotags.request, args, True)
 
     @pynvim.function('NeotagsUpdate')
     def update(self, args):
-        self.__vim.async_call(self.__neotags.update, True)
+        self.__vim.async_call(self.__neotags.request, args, False, 'full')
+
+    @pynvim.function('NeotagsUpdateFile')
+    def update_file(self, args):
+        self.__vim.async_call(self.__neotags.request, args, False, 'file')
+
+    @pynvim.function('NeotagsForget')
+    def forget(self, args):
+        self.__vim.async_call(self.__neotags.forget, args)
+
+    @pynvim.function('NeotagsScroll')
+    def scroll(self, args):
+        self.__vim.async_call(self.__neotags.scroll)
+
+    @pynvim.function('NeotagsConfigChanged')
+    def config_changed(self, args):
+        self.__vim.async_call(self.__neotags.config_changed, args)
+
+    @pynvim.function('NeotagsReload')
+    def reload(self, args):
+        self.__vim.async_call(self.__neotags.reload)
+
+    @pynvim.function('NeotagsMemory')
+    def memory(self, args):
+        self.__vim.async_call(self.__neotags.memory)
+
+    @pynvim.function('NeotagsStats')
+    def stats(self, args):
+        self.__vim.async_call(self.__neotags.stats, args)
+
+    @pynvim.rpc_export('nvim_buf_lines_event')
+    def on_buf_lines(self, *args):
+        self.__neotags.buf_lines(*args)
+
+    @pynvim.rpc_export('nvim_buf_changedtick_event')
+    def on_buf_changedtick(self, *args):
+        pass
+
+    @pynvim.rpc_export('nvim_buf_detach_event')
+    def on_buf_detach(self, *args):
+        self.__neotags.buf_detach(*args)
 
     @pynvim.function('NeotagsToggle')
     def toggle(self, args):
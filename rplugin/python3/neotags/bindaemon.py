@@ -0,0 +1,52 @@
+import subprocess
+
+
+class BinDaemon:
+    """A long running `neotags --daemon' process. It keeps every tags file it
+    has read in memory, already split into tags, and only reads one again once
+    it changes on disk, so a query costs neither a process spawn nor reading
+    and decompressing the tags files. See neotags_bin/src/daemon.c for the
+    protocol.
+    """
+
+    def __init__(self, binary):
+        self.binary = binary
+        self.__proc = None
+
+    def query(self, args, indata):
+        """Send the binary's usual arguments and the buffer contents, and
+        return the (status, output) it answers with. A process that died is
+        restarted once; OSError is raised if that doesn't help.
+        """
+        request = ('\t'.join(args) + '\n').encode() + indata
+
+        for _ in range(2):
+            if self.__proc is None or self.__proc.poll() is not None:
+                self._start()
+            try:
+                self.__proc.stdin.write(request)
+                self.__proc.stdin.flush()
+                status, size = map(int, self.__proc.stdout.readline().split())
+                out = self.__proc.stdout.read(size)
+                if len(out) == size:
+                    return status, out
+            except (OSError, ValueError):
+                pass
+            # Whatever happened, the stream can't be trusted any more.
+            self.close()
+
+        raise OSError('The neotags daemon stopped responding.')
+
+    def close(self):
+        if self.__proc is not None:
+            self.__proc.kill()
+            self.__proc.wait()
+            self.__proc = None
+
+    def _start(self):
+        self.__proc = subprocess.Popen(
+            (self.binary, '--daemon'),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
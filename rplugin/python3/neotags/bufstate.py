@@ -0,0 +1,107 @@
+import sys
+from collections import OrderedDict
+
+
+class BufferState:
+    """Everything remembered about one buffer between updates."""
+
+    def __init__(self, number):
+        self.number = number
+        # Highlight group -> md5 of the tags it was last highlighted with.
+        self.highlights = {}
+        # Highlight group -> the commands that did it.
+        self.cmds = {}
+        # Highlight group -> the set of names it currently matches.
+        self.names = {}
+        # Highlight group -> the names it left to the extmark backend.
+        self.marks = {}
+        # Name -> highlight group, as currently placed by the extmark backend,
+        # and the range of lines it placed them on.
+        self.words = None
+        self.marked = None
+        # Whether the buffer's tags were found since the last ctags run.
+        self.parsed = False
+        # The BufferTokens of the buffer, if attached to it.
+        self.tokens = None
+        # The BufferTokens of a large buffer while it is being filled, and the
+        # line events that arrived meanwhile.
+        self.building = None
+        self.queued = []
+
+    def reset(self):
+        """Forget the highlighting, keeping the tokens."""
+        self.highlights = {}
+        self.cmds = {}
+        self.names = {}
+        self.marks = {}
+        self.words = None
+        self.marked = None
+        self.parsed = False
+
+    def size(self):
+        """Roughly how many bytes the state takes up."""
+        size = sys.getsizeof(self.highlights) + sys.getsizeof(self.cmds)
+        for key, md5 in self.highlights.items():
+            size += sys.getsizeof(key) + sys.getsizeof(md5)
+        for cmds in self.cmds.values():
+            size += sys.getsizeof(cmds) + sum(map(sys.getsizeof, cmds))
+        for names in (*self.names.values(), *self.marks.values()):
+            size += sys.getsizeof(names) + sum(map(sys.getsizeof, names))
+        if self.words is not None:
+            size += sys.getsizeof(self.words)
+        for tokens in (self.tokens, self.building):
+            if tokens is not None:
+                size += tokens.size()
+        return size
+
+
+class BufferStates:
+    """The BufferState of every buffer, in least recently used order. Only
+    the `max_hidden' most recently used buffers besides the current one are
+    kept; `on_evict' is called with the state of every buffer that is dropped
+    to make room, but not with those that are forgotten explicitly.
+    """
+
+    def __init__(self, max_hidden, on_evict=None):
+        self.max_hidden = max_hidden
+        self.on_evict = on_evict
+        self.__states = OrderedDict()
+
+    def __len__(self):
+        return len(self.__states)
+
+    def __iter__(self):
+        return iter(self.__states.values())
+
+    def get(self, number):
+        """Return the state of buffer `number', without creating it."""
+        return self.__states.get(number)
+
+    def use(self, number):
+        """Return the state of buffer `number', creating it if needed, and
+        mark it as the most recently used one.
+        """
+        state = self.__states.get(number)
+        if state is None:
+            state = self.__states[number] = BufferState(number)
+            self._trim()
+        else:
+            self.__states.move_to_end(number)
+        return state
+
+    def forget(self, number):
+        return self.__states.pop(number, None)
+
+    def reset(self):
+        for state in self.__states.values():
+            state.reset()
+
+    def size(self):
+        return sys.getsizeof(self.__states) + sum(
+            state.size() for state in self.__states.values())
+
+    def _trim(self):
+        while len(self.__states) > self.max_hidden + 1:
+            _, state = self.__states.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(state)
@@ -0,0 +1,141 @@
+import re
+import sys
+
+from neotags.utils import strip_c_line
+
+# Languages whose comments and strings are stripped before tokenizing.
+STRIP_LANGS = ('c', 'cpp', 'java', 'go', 'rust', 'cs')
+
+_WORD = re.compile(rb'\w+')
+
+
+def _encode(lines):
+    # Kept as UTF-8 so that offsets into a line are nvim's byte columns.
+    return [line.encode('utf-8', errors='surrogateescape')
+            if isinstance(line, str) else line for line in lines]
+
+
+class BufferTokens:
+    """The multiset of identifiers in one buffer, kept up to date from the
+    nvim_buf_lines_event notifications nvim sends for an attached buffer. Each
+    change only re-tokenizes the lines it touched (plus, when it opens or
+    closes a block comment, the following lines up to where the comment state
+    is the same as before), so checking whether a tag occurs in the buffer
+    never needs the whole buffer to be sent over or split again.
+    """
+
+    def __init__(self, lines, tick, strip):
+        self.tick = tick
+        self.strip = strip
+        self.lines = []
+        self.__starts = []
+        self.__toks = []
+        self.__counts = {}
+        self.replace(0, 0, _encode(lines))
+
+    def __contains__(self, token):
+        return token in self.__counts
+
+    def __len__(self):
+        return len(self.__counts)
+
+    def size(self):
+        """Roughly how many bytes the tracker takes up."""
+        return (sys.getsizeof(self.lines) + sum(map(sys.getsizeof, self.lines))
+                + sys.getsizeof(self.__starts) + sys.getsizeof(self.__toks)
+                + sum(map(sys.getsizeof, self.__toks))
+                + sys.getsizeof(self.__counts)
+                + sum(map(sys.getsizeof, self.__counts)))
+
+    def text(self):
+        """The buffer contents, as the C binary expects them on stdin."""
+        text = b'\n'.join(self.lines)
+        if not text.isascii():
+            text = text.decode('utf-8', errors='surrogateescape').encode(
+                'ascii', errors='replace')
+        return text
+
+    def words(self, first, last):
+        """Yield (line, start, end, word) for every word on lines [first,
+        last), skipping those that are stripped.
+        """
+        for i in range(first, min(last, len(self.lines))):
+            line = self.lines[i]
+            if self.strip:
+                line, _ = strip_c_line(line, self.__starts[i])
+            for match in _WORD.finditer(line):
+                yield i, match.start(), match.end(), match.group()
+
+    def set_strip(self, strip):
+        """Re-tokenize everything if the filetype changed how to."""
+        if strip != self.strip:
+            self.strip = strip
+            self.replace(0, len(self.lines), self.lines)
+
+    def append(self, lines):
+        """Add `lines' to the end of the buffer."""
+        end = len(self.lines)
+        return self.replace(end, end, _encode(lines))
+
+    def on_lines(self, tick, first, last, data):
+        """Apply one nvim_buf_lines_event. Events older than the contents
+        the tracker was created from are ignored. Returns the range of lines
+        that were tokenized again, as replace() does.
+        """
+        if tick is not None:
+            if tick < self.tick:
+                return first, first
+            self.tick = tick
+        if last < 0:
+            last = len(self.lines)
+        return self.replace(first, last, _encode(data))
+
+    def replace(self, first, last, lines):
+        """Replace lines [first, last) with `lines'. Returns the range of
+        lines that were tokenized again, which may extend past the new lines
+        when a block comment was opened or closed.
+        """
+        for toks in self.__toks[first:last]:
+            self._remove(toks)
+
+        count = len(lines)
+        self.lines[first:last] = lines
+        self.__starts[first:last] = [False] * count
+        self.__toks[first:last] = [()] * count
+
+        state = self.__starts[first - 1] if first > 0 else False
+        if first > 0 and self.strip:
+            # The state at the end of the previous line.
+            _, state = strip_c_line(self.lines[first - 1], state)
+
+        i = first
+        while i < len(self.lines):
+            if i >= first + count:
+                if self.__starts[i] == state:
+                    break
+                self._remove(self.__toks[i])
+            state = self._tokenize(i, state)
+            i += 1
+
+        return first, i
+
+    def _tokenize(self, i, state):
+        self.__starts[i] = state
+        line = self.lines[i]
+        if self.strip:
+            line, state = strip_c_line(line, state)
+
+        toks = self.__toks[i] = tuple(set(_WORD.findall(line)))
+        counts = self.__counts
+        for tok in toks:
+            counts[tok] = counts.get(tok, 0) + 1
+        return state
+
+    def _remove(self, toks):
+        counts = self.__counts
+        for tok in toks:
+            n = counts[tok] - 1
+            if n:
+                counts[tok] = n
+            else:
+                del counts[tok]
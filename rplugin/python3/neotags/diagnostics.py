@@ -1,5 +1,5 @@
-import inspect
 import re
+import sys
 import time
 
 
@@ -29,9 +29,9 @@ class Diagnostics:
     def debug_end(self, message):
         otime = self.__start_time.pop()
         try:
-            self.debug_echo('%d: (%.4fs) END => %s' % (inspect.stack()[1][2],
-                            time.time() - otime, message))
-        except IndexError:
+            self.debug_echo('%d: (%.4fs) END => %s' % (
+                sys._getframe(1).f_lineno, time.time() - otime, message))
+        except ValueError:
             self.inform_echo(message)
 
     def inform_echo(self, message):
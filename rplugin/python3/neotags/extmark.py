@@ -0,0 +1,94 @@
+class ExtmarkBackend:
+    """Highlights tags by placing highlights on their occurrences in a
+    namespace of their own, instead of through syntax groups that nvim has to
+    match again on every redraw. The occurrences are found in the lines of a
+    BufferTokens; as highlights move along with the text they are on, only
+    the lines that changed ever need to be looked at again. Only the lines
+    around the window are highlighted at first, and the range is extended
+    as the window scrolls.
+
+    As containedin=ALLBUT,... keeps syntax groups out of them, occurrences
+    inside the syntax groups of g:neotags_global_notin (strings, comments)
+    are skipped. nvim is asked which ones are in one, once for every range
+    of lines highlighted.
+    """
+
+    def __init__(self, vim, notin=()):
+        self.vim = vim
+        self.ns = vim.api.create_namespace('neotags')
+        self.notin = None
+        self.set_notin(notin)
+
+    def set_notin(self, groups):
+        """Skip the occurrences in the syntax groups whose names match one
+        of the patterns in `groups'. Returns whether that changed.
+        """
+        notin = r'^\%%(%s\)$' % r'\|'.join(groups) if groups else None
+        changed = notin != self.notin
+        self.notin = notin
+        return changed
+
+    def highlight(self, number, tokens, words, first=0, last=-1):
+        """Replace the highlights on lines [first, last) of buffer `number'.
+        `words' maps every name to highlight to its highlight group.
+        """
+        calls = self.calls(number, tokens, words, first, last)
+        self.vim.api.call_atomic(calls, async_=True)
+        return len(calls) - 1
+
+    def calls(self, number, tokens, words, first=0, last=-1):
+        """The same as highlight(), as a list of calls for nvim_call_atomic
+        instead of sending it right away.
+        """
+        if last < 0:
+            last = len(tokens.lines)
+
+        found = [(line, start, end, words[word])
+                 for line, start, end, word in tokens.words(first, last)
+                 if word in words]
+        if self.notin is not None and found:
+            inside = self.vim.call(
+                'NeotagsNotin', [[line + 1, start + 1]
+                                 for line, start, _, _ in found], self.notin)
+            found = [tag for tag, skip in zip(found, inside) if not skip]
+
+        calls = [['nvim_buf_clear_namespace', [number, self.ns, first, last]]]
+        for line, start, end, group in found:
+            calls.append(['nvim_buf_add_highlight',
+                          [number, self.ns, group, line, start, end]])
+        return calls
+
+    def place(self, number, tokens, words, marked, first, last):
+        """The calls that highlight lines [first, last) of buffer `number'
+        too, given that the lines in the range `marked' already are, and the
+        range that is highlighted after them. With `marked' None, or not
+        next to [first, last), every other highlight is dropped so that the
+        highlighted lines stay one range.
+        """
+        if marked is None or first > marked[1] or last < marked[0]:
+            calls = self.calls(number, tokens, words, first, last)
+            calls[0] = ['nvim_buf_clear_namespace', [number, self.ns, 0, -1]]
+            return calls, (first, last)
+
+        calls = []
+        if first < marked[0]:
+            calls.extend(self.calls(number, tokens, words, first, marked[0]))
+        if last > marked[1]:
+            calls.extend(self.calls(number, tokens, words, marked[1], last))
+        return calls, (min(first, marked[0]), max(last, marked[1]))
+
+    @staticmethod
+    def shift(marked, first, last, count):
+        """Where the range `marked' is once lines [first, last) have been
+        replaced by `count' lines. Lines replaced inside it stay in it.
+        """
+        delta = count - (last - first)
+        if last <= marked[0]:
+            return marked[0] + delta, marked[1] + delta
+        if first >= marked[1]:
+            return marked
+        return (min(first, marked[0]),
+                max(first + count, marked[1] + delta))
+
+    def clear(self, number):
+        self.vim.api.buf_clear_namespace(number, self.ns, 0, -1, async_=True)
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+# What a file changed by since it was last tagged.
+SAME = 'same'
+LAYOUT = 'layout'
+CHANGED = 'changed'
+
+# Filetypes whose /* */ and // comments are left out of code_hash(), and
+# those in which a line starting with `#' is a comment. Rust, JavaScript and
+# TypeScript aren't among the former: a ' there may be a lifetime rather than
+# a character literal, and a / may start a regex, so a comment can't be told
+# apart from code without parsing them. Any change to their comments counts.
+C_COMMENT_LANGS = ('c', 'cpp', 'java', 'go', 'cs')
+HASH_COMMENT_LANGS = ('python', 'sh', 'zsh', 'bash', 'ruby', 'perl', 'make',
+                      'cmake', 'yaml', 'toml')
+
+_TOKEN = re.compile(rb'\w+|[^\w\s]')
+# The comments of a C-like file, and the literals that may contain what looks
+# like one. Only the comments are left out; a literal is kept as it is, so
+# something mistaken for one (a C++ digit separator, say) never hides code.
+_C_COMMENT = re.compile(rb'''
+      "(?:[^"\\\n]|\\.)*"?
+    | `[^`]*`?
+    | '(?:[^'\\\n]|\\[^\n]+?)'
+    | (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+''', re.S | re.X)
+_INDENT = re.compile(rb'[ \t]*')
+
+
+def _uncomment(match):
+    return b' ' if match.group('comment') else match.group()
+
+
+def code_hash(data, ft):
+    """Hash of `data' that ignores its comments (as far as the filetype's are
+    known) and every whitespace but the indentation, which may matter.
+    """
+    if ft in C_COMMENT_LANGS:
+        data = _C_COMMENT.sub(_uncomment, data)
+    md5 = hashlib.md5()
+    for line in data.splitlines():
+        if ft in HASH_COMMENT_LANGS and line.lstrip().startswith(b'#'):
+            continue
+        tokens = _TOKEN.findall(line)
+        if tokens:
+            md5.update(b'%d ' % len(_INDENT.match(line).group()))
+            md5.update(b' '.join(tokens) + b'\n')
+    return md5.hexdigest()
+
+
+class Manifest:
+    """The mtime, size and hashes of every file of a project as it was last
+    tagged, kept in a JSON file next to the project's tags file. It tells
+    whether a saved file has to be tagged again at all, and if so whether
+    only its whitespace or comments changed, in which case its tags move but
+    none appear or disappear and nothing has to be highlighted anew.
+
+    Files are only recorded once their tags were written, and the whole
+    manifest is dropped when the project is tagged from scratch.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__lock = threading.Lock()
+        self.__files = None
+
+    def compare(self, name, ft):
+        """Compare file `name' with how it was last tagged. Returns what it
+        changed by and the entry to record() once it has been tagged again.
+        """
+        try:
+            st = os.stat(name)
+            with open(name, 'rb') as fp:
+                data = fp.read()
+        except OSError:
+            return CHANGED, None
+
+        stamp = [st.st_mtime_ns, st.st_size]
+        with self.__lock:
+            old = self._files().get(name)
+        if old is not None and old[:2] == stamp:
+            return SAME, old
+
+        content = hashlib.md5(data).hexdigest()
+        if old is not None and old[2] == content:
+            self.record(name, stamp + old[2:])
+            return SAME, old
+
+        entry = stamp + [content, code_hash(data, ft)]
+        if old is not None and old[3] == entry[3]:
+            return LAYOUT, entry
+        return CHANGED, entry
+
+    def record(self, name, entry):
+        with self.__lock:
+            self._files()[name] = entry
+            tmp = self.path + '.new'
+            with open(tmp, 'w') as fp:
+                json.dump(self.__files, fp)
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        with self.__lock:
+            self.__files = {}
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _files(self):
+        if self.__files is None:
+            try:
+                with open(self.path, 'r') as fp:
+                    self.__files = json.load(fp)
+            except (OSError, ValueError):
+                self.__files = {}
+        return self.__files
@@ -12,21 +12,50 @@
 import hashlib
 import os
 import re
+import shutil
 import subprocess
 import sys
+import tempfile
+import threading
 import time
-import json
+from concurrent.futures import BrokenExecutor
 from copy import deepcopy
 from pynvim.api import NvimError
 
 # sys.path.append(os.path.dirname(__file__))
-from neotags.utils import (do_set_base, do_remove_base, get_project_path,
-                           do_add_extra_dir, do_remove_extra_dir, find_tags,
-                           strip_c, tokenize, bindex)
+from neotags.utils import (do_set_base, do_remove_base, do_add_extra_dir,
+                           do_remove_extra_dir, merge_tags, strip_c,
+                           tokenize, trie_patterns)
+from neotags.bindaemon import BinDaemon
+from neotags.buftokens import BufferTokens, STRIP_LANGS
+from neotags.bufstate import BufferStates
 from neotags.diagnostics import Diagnostics
+from neotags.extmark import ExtmarkBackend
+from neotags.manifest import Manifest, SAME, LAYOUT
+from neotags.projects import ProjectRegistry
+from neotags.shards import ShardedCtags
+from neotags.tagcache import TagCache
+from neotags.tagindex import TagIndex
+from neotags.tagpool import TagPool, find_candidates
+from neotags.scheduler import Scheduler
+from neotags.settings import Settings
+from neotags.stats import Stats
+from neotags.worker import Worker
 
 CLIB = None
 dia = None
+NEWSUFFIX = '.new'
+# The worker job that rebuilds the index of a tags file, as a part of it.
+INDEX_PART = '.idx'
+# How much of a failed highlight call is shown with its error.
+MAX_ERROR_CALL = 200
+# How much of ctags' output is passed on at a time.
+CTAGS_CHUNK = 1024 * 1024
+NAME = re.compile(rb'\w+')
+# Lines above and below the window that are highlighted first in large buffers,
+# and how many lines of them are tokenized at a time afterwards.
+VIEWPORT_MARGIN = 100
+TOKENIZE_CHUNK = 5000
 if sys.platform == 'win32':
     SEPCHAR = ';'
 else:
@@ -39,27 +68,29 @@ class Neotags(object):
         self.__prefix = r'\C\<'
         self.__suffix = r'\>'
         self.__initialized = False
-        self.__is_running = False
         self.__run_ctags = False
 
-        self.__cmd_cache = {}
-        self.__exists_buffer = {}
+        self.__ftconfig = {}
         self.__groups = {}
-        self.__md5_cache = {}
+        self.__batch = []
         self.__regex_buffer = {}
         self.__tmp_cache = {}
-        self.__cur = {'file': None, 'buf': None}
-
-        self.__seen = []
+        self.__manifests = {}
+        self.__projects = None
+        self.__cur = {'file': None, 'buf': None, 'tokens': None}
+        self.__buffers = None
         self.__backup_groups = {}
 
         self.__autocmd = None
         self.__gzfile = None
         self.__init_tagfiles = None
         self.__neotags_bin = None
+        self.__daemon = None
+        self.__extmarks = None
         self.__patternlength = None
         self.__slurp = None
         self.__tagfile = None
+        self.__index = None
 
         self.__ctov = ''
         self.__fsuffix = ''
@@ -67,12 +98,18 @@ class Neotags(object):
         self.__match_pattern = ''
         self.__match_pattern_not = ''
         self.__notin_pattern = ''
-        self.__to_escape = ''
         self.__vtoc = ''
 
         self.__hlbuf = 1
 
         self.vim = vim
+        self.__stats = Stats()
+        self.__settings = Settings(vim, self.__stats)
+        self.__generation = None
+        self.__worker = Worker(vim)
+        self.__tagcache = None
+        self.__tagpool = None
+        self.__scheduler = None
 
     def init(self):
         if self.__initialized:
@@ -80,7 +117,6 @@ class Neotags(object):
         self.__ctov = self.vv('ft_conv')
         self.__vtoe = self.vv('ft_ext')
         self.__init_tagfiles = self.vim.api.eval('&tags').split(",")
-        self.__to_escape = re.compile(r'[.*^$/\\~\[\]]')
 
         self.__vtoc = {}
         for x, y in self.__ctov.items():
@@ -98,9 +134,13 @@ class Neotags(object):
 
         if self.vv('use_binary') == 1:
             self.__neotags_bin = self._get_binary()
+        if self.vv('highlight_backend') == 'extmark':
+            self.__extmarks = ExtmarkBackend(self.vim,
+                                             self.vv('global_notin'))
 
         global dia
         dia = Diagnostics(bool(self.vv('verbose')), self.vim, self.vv)
+        self.__stats.enabled = bool(self.vv('stats'))
 
         if self.vv('use_compression'):
             global CLIB
@@ -127,6 +167,13 @@ class Neotags(object):
 
         self.__autocmd = "if execute('autocmd User') =~# 'NeotagsPost' | " \
                          "doautocmd User NeotagsPost | endif"
+        self.__scheduler = Scheduler(self.vim, self._update_buffer,
+                                     self.vv('update_delay') / 1000)
+        self.__tagcache = TagCache(self.vv('cache_size') * 1024 * 1024)
+        self.__tagpool = TagPool(self._parse_jobs())
+        self.__buffers = BufferStates(self.vv('max_buffers'),
+                                      self._evict_buffer)
+        self.__generation = self.__settings.generation
         self.__initialized = True
 
         if self.vv('enabled'):
@@ -136,70 +183,201 @@ class Neotags(object):
 
             self.__patternlength = self.vv('patternlength')
 
-            self.vim.command('autocmd %s * call NeotagsUpdate()' %
-                             evupd, async_=True)
+            if self.vv('incremental'):
+                self.vim.command(
+                    "autocmd %s * call NeotagsUpdateFile(expand('<abuf>'))" %
+                    evupd, async_=True)
+            else:
+                self.vim.command(
+                    "autocmd %s * call NeotagsUpdate(expand('<abuf>'))" %
+                    evupd, async_=True)
             self.vim.command(
-                'autocmd %s * call NeotagsHighlight()' % evhl, async_=True)
+                "autocmd %s * call NeotagsHighlight(expand('<abuf>'))" %
+                evhl, async_=True)
             self.vim.command(
-                'autocmd %s * call NeotagsRehighlight()' % evre, async_=True)
+                "autocmd %s * call NeotagsRehighlight(expand('<abuf>'))" %
+                evre, async_=True)
+            if self.__extmarks is not None:
+                self.vim.command(
+                    "if exists('##WinScrolled') | "
+                    "autocmd WinScrolled * call NeotagsScroll() | endif",
+                    async_=True)
+            self.vim.command(
+                "autocmd BufDelete,BufWipeout * "
+                "call NeotagsForget(expand('<abuf>'))", async_=True)
 
             if self.vv('loaded'):
                 self.update(False)
 
-    def update(self, force):
-        """Update tags file, tags cache, and highlighting."""
+    def request(self, args, force, ctags=None):
+        """Queue an update of the buffer given in `args' (the current one if
+        none is given). `ctags' is None, 'file' to re-tag only the current file
+        or 'full' to re-run ctags over the whole project. ctags is started
+        right away; the highlighting is left to the scheduler. Once ctags is
+        done, _ctags_done() asks for the buffer to be highlighted again, which
+        only adds the new names to the groups unless `force' is given.
+        """
+        if not self.__initialized:
+            return
+        if args and args[0]:
+            bufnr = int(args[0])
+        else:
+            bufnr = self.vim.current.buffer.number
+
+        if ctags is not None and not self._start_ctags(ctags == 'file'):
+            dia.debug_echo('No tags can have changed, not highlighting.')
+            return
+        self.__scheduler.request(bufnr, force)
+
+    def _update_buffer(self, bufnr, force):
+        if bufnr != self.vim.current.buffer.number:
+            dia.debug_echo('Buffer %d is no longer current, skipping.' % bufnr)
+            return
+        self.update(force)
+
+    def buf_lines(self, buf, tick, first, last, data, more):
+        """Handle a nvim_buf_lines_event for an attached buffer."""
+        state = self.__buffers.get(buf.number)
+        if state is not None and state.building is not None:
+            state.queued.append((tick, first, last, data))
+        elif state is not None and state.tokens is not None:
+            if state.words:
+                state.marked = self.__extmarks.shift(state.marked, first,
+                                                     last, len(data))
+            first, end = state.tokens.on_lines(tick, first, last, data)
+            if state.words:
+                first = max(first, state.marked[0])
+                end = min(end, state.marked[1])
+                if self.__extmarks.notin is not None:
+                    # Opening or closing a string or comment changes what is
+                    # in one on the lines below as well.
+                    end = state.marked[1]
+                if first < end:
+                    self.__extmarks.highlight(buf.number, state.tokens,
+                                              state.words, first, end)
+
+    def buf_detach(self, buf):
+        """Handle a nvim_buf_detach_event (the buffer was unloaded)."""
+        state = self.__buffers.get(buf.number)
+        if state is not None:
+            state.tokens = None
+            state.words = None
+            state.building = None
+            state.queued = []
+
+    def forget(self, args):
+        """Drop everything known about a deleted or wiped out buffer."""
+        if not self.__initialized or not args or not args[0]:
+            return
+        bufnr = int(args[0])
+        self.__buffers.forget(bufnr)
+        self.__scheduler.discard(bufnr)
+
+    def memory(self):
+        """Report how much is being kept about buffers and tags files."""
+        if not self.__initialized:
+            return
+        dia.inform_echo('Neotags: %d buffers (~%d KiB), %d cached tag lists '
+                        '(~%d KiB)' % (len(self.__buffers),
+                                       self.__buffers.size() // 1024,
+                                       len(self.__tagcache),
+                                       self.__tagcache.size // 1024))
+
+    def stats(self, args):
+        """Report how long each stage of the updates took, or with a file
+        name, write every span to it as a Chrome trace.
+        """
+        if not self.__initialized:
+            return
+        if not self.__stats.enabled:
+            dia.inform_echo('Neotags: set g:neotags_stats to 1 to collect '
+                            'stats.')
+            return
+        path = args[0] if args else ''
+        if path:
+            path = os.path.expanduser(path)
+            try:
+                count = self.__stats.export(path)
+            except OSError as err:
+                dia.error("Failed to write trace -> '%s'" % err)
+                return
+            dia.inform_echo('Neotags: wrote %d spans to %s' % (count, path))
+        else:
+            dia.inform_echo('\n'.join(
+                ['Neotags: times in ms'] + self.__stats.report()))
+
+    def _evict_buffer(self, state):
+        """Called for every buffer BufferStates drops to make room."""
+        dia.debug_echo('Forgetting hidden buffer %d' % state.number)
+        if state.words:
+            self.__extmarks.clear(state.number)
+        if state.tokens is not None or state.building is not None:
+            self.vim.api.buf_detach(state.number, async_=True)
+
+    def _start_ctags(self, incremental):
+        """Returns False if the current buffer needn't be highlighted again,
+        as none of its file's tags can have changed.
+        """
         ft = self.vim.api.eval('&ft')
+        if (not self.vv('enabled') or not self.vv('run_ctags') or ft == ''
+                or ft in self.vv('ignore')):
+            return True
+
+        self.__cur['file'] = os.path.realpath(
+            self.vim.api.eval("expand('%:p:p')"))
+        self.__cur['buf'] = self.vim.current.buffer
+        return self._run_ctags(True, incremental, ft)
+
+    def update(self, force):
+        """Update tags cache and highlighting."""
+        ft, preview, file = self.vim.api.eval(
+            "[&ft, &previewwindow, expand('%:p:p')]")
         init_time = time.time()
 
         if not self.vv('enabled'):
             self._clear(ft)
             self.vim.command(self.__autocmd, async_=True)
             return
-        if ft == '' or ft in self.vv('ignore') or self.vim.api.eval('&previewwindow'):
+        if self.__generation != self.__settings.generation:
+            self._apply_settings()
+        if ft == '' or ft in self.vv('ignore') or preview:
             self.vim.command(self.__autocmd, async_=True)
             return
-        if self.__is_running:
-            # XXX This should be more robust
-            return
 
         dia.debug_start()
-        self.__is_running = True
-        self.__exists_buffer = {}
 
         hl = HighlightGroup()
         hl.ft = ft
-        hl.file = self.vim.api.eval("expand('%:p:p')")
+        hl.file = file
         self.__cur['file'] = os.path.realpath(hl.file)
         self.__cur['buf'] = self.vim.current.buffer
-        hl.highlights, hl.number = self._getbufferhl()
-
-        if hl.number in self.__md5_cache:
-            hl.highlights = self.__md5_cache[hl.number]
-        else:
-            self.__md5_cache[hl.number] = hl.highlights = {}
-
-        if force:
-            if self.vv('run_ctags'):
-                self._run_ctags(True)
-            self.__groups[ft] = self._parseTags(ft)
-
-        elif hl.number not in self.__seen:
-            self.__seen.append(self.__cur['buf'].number)
-            self.__groups[ft] = self._parseTags(ft)
-
-        elif hl.number not in self.__cmd_cache:
-            self.__groups[ft] = self._parseTags(ft)
-
-        self.highlight(force, hl)
+        hl.number = self.__cur['buf'].number
+        state = self.__buffers.use(hl.number)
+        hl.highlights = state.highlights
+
+        if force or not state.parsed or not state.cmds:
+            state.parsed = True
+            with self.__stats.span('tags'):
+                self.__groups[ft] = self._parseTags(ft)
+
+        if self.__scheduler.superseded(hl.number):
+            dia.clear_stack()
+            dia.debug_echo('Superseded by a newer request, aborting.')
+            return
 
-        self.vim.command(self.__autocmd, async_=True)
+        with self.__stats.span('commands'):
+            self.highlight(force, hl)
+        with self.__stats.span('rpc'):
+            self._flush(hl)
 
         dia.clear_stack()
         dia.debug_echo('Finished all => (%.4fs)' % (time.time() - init_time))
-        self.__is_running = False
 
     def highlight(self, force, hl):
-        """Analyze the tags data and format it for nvim's regex engine."""
+        """Analyze the tags data and format it for nvim's regex engine. The
+        commands are only queued up, to be sent by _flush().
+        """
+        self.__batch = []
         restored_groups = self.vv('restored_groups')
         if hl.ft not in self.__backup_groups:
             self.__backup_groups[hl.ft] = {}
@@ -213,13 +391,15 @@ class Neotags(object):
         order = self._tags_order(hl.ft)
 
         if groups is None:
-            self.__is_running = False
             dia.debug_end('Skipping file')
             return
         if not order:
             order = groups.keys()
 
         for hl.key in order:
+            if self.__scheduler.superseded(hl.number):
+                dia.debug_echo('Superseded by a newer request, aborting.')
+                break
             dia.debug_start()
             hl.group = self._exists(hl.key, '.group', None)
             fgroup = self._exists(hl.key, '.filter.group', None)
@@ -233,8 +413,7 @@ class Neotags(object):
                 hl.suffix = self._exists(hl.key, '.suffix', self.__suffix)
                 hl.notin = self._exists(hl.key, '.notin', [])
 
-                if not self._highlight(hl, groups[hl.key], force):
-                    break
+                self._highlight(hl, groups[hl.key], force)
             else:
                 dia.error("Unexpected error")
 
@@ -249,8 +428,10 @@ class Neotags(object):
                     hl.key, '.filter.suffix', self.__suffix)
                 fhl.notin = self._exists(hl.key, '.filter.notin', [])
 
-                if not self._highlight(fhl, groups[fhl.key], force):
-                    break
+                self._highlight(fhl, groups[fhl.key], force)
+
+        if self.__extmarks is not None:
+            self._place_marks(hl.number)
 
         for group in self.__backup_groups[hl.ft]:
             self._restore_group(hl.ft, group)
@@ -262,32 +443,41 @@ class Neotags(object):
 # Projects
 
     def setBase(self, args):
-        do_set_base(dia, self.vv('settings_file'), args)
+        do_set_base(dia, self._projects(), args)
 
     def removeBase(self, args):
-        do_remove_base(dia, self.vv('settings_file'), args)
+        do_remove_base(dia, self._projects(), args)
 
     def addExtraDir(self, args):
-        do_add_extra_dir(dia, self.vv('settings_file'), args)
+        do_add_extra_dir(dia, self._projects(), args)
 
     def removeExtraDir(self, args):
-        do_remove_extra_dir(dia, self.vv('settings_file'), args)
+        do_remove_extra_dir(dia, self._projects(), args)
 
 ##############################################################################
 # Private
 
     def _highlight(self, hl, group, force):
-        highlights, number = hl.highlights, hl.number
+        number = hl.number
+        state = self.__buffers.use(number)
+        highlights = state.highlights
 
         dia.debug_echo("Highlighting for buffer %s" % number)
-        if number in self.__md5_cache:
-            highlights = self.__md5_cache[number]
-        else:
-            self.__md5_cache[number] = highlights = {}
 
-        current = []
         cmds = []
         hl.key = '_Neotags_%s_%s' % (hl.key.replace('#', '_'), hl.group)
+
+        # Plain words go to the extmark backend, if it is used and the group
+        # needs nothing only a syntax match can do. The rest is left here.
+        if (self.__extmarks is not None and state.tokens is not None
+                and not hl.notin and hl.allow_keyword == 1
+                and hl.prefix == self.__prefix and hl.suffix == self.__suffix):
+            marks = state.marks[hl.key] = {x for x in group
+                                           if NAME.fullmatch(x)}
+            group = [x for x in group if x not in marks]
+        else:
+            state.marks.pop(hl.key, None)
+
         md5 = hashlib.md5()
         strgrp = b''.join(group)
 
@@ -298,66 +488,162 @@ class Neotags(object):
 
         if not force \
                 and (hl.key in highlights and md5hash == highlights[hl.key]) \
-                or (number != self.__hlbuf and number in self.__cmd_cache
-                    and hl.key in self.__cmd_cache[number]):
+                or (number != self.__hlbuf and hl.key in state.cmds):
             try:
-                cmds = self.__cmd_cache[number][hl.key]
+                cmds = state.cmds[hl.key]
             except KeyError:
                 dia.error('Key error in _highlight()!')
                 dia.debug_end('')
-                return True
-            dia.debug_echo("Updating from cache" % cmds)
+                return
+            full_cmds = cmds
+            if number == self.__hlbuf and hl.key in state.names:
+                # Still in place from the last update of this buffer.
+                dia.debug_echo("Unchanged")
+                cmds = []
+            else:
+                dia.debug_echo("Updating from cache")
 
         else:
-            cmds.append('silent! syntax clear %s' % hl.key)
-
-            for i in range(0, len(group), self.__patternlength):
-                current = group[i:i + self.__patternlength]
-                current = [x.decode('ascii') for x in current]
-                if hl.notin:
-                    hl.notin = [*hl.notin, *self.vv('global_notin')]
-                    dia.debug_echo(hl.notin)
-                    cmds.append(self.__notin_pattern %
-                                (hl.key, hl.prefix, r'\|'.join(current),
-                                 hl.suffix, ','.join(hl.notin)))
-                elif (hl.prefix == self.__prefix and
-                      hl.suffix == self.__suffix and
-                      hl.allow_keyword == 1 and
-                      '.' not in r''.join(current)):
-                    cmds.append(self.__keyword_pattern %
-                                (hl.key, r' '.join(current)))
-                else:
-                    cmds.append(self.__match_pattern_not %
-                                (hl.key, hl.prefix, r'\|'.join(current), hl.suffix, ','.join(self.vv('global_notin'))))
-
-            if hl.ft != self.vim.api.eval('&ft'):
-                dia.debug_end('filetype changed aborting highlight')
-                return False
+            names = set(group)
+            applied = state.names.get(hl.key)
+            added = None
+
+            # If no name was removed, the group that is already in place only
+            # has to be extended with the new ones.
+            if not force and applied is not None and applied <= names:
+                added = sorted(names - applied)
+                if len(added) > len(names) // 2:
+                    added = None
+
+            if added is not None:
+                dia.debug_echo('Adding %d names to %s' % (len(added), hl.key))
+                cmds = self._syntax_cmds(hl, added)
+                full_cmds = state.cmds[hl.key][:-1] + cmds + \
+                    state.cmds[hl.key][-1:]
+            else:
+                cmds.append('silent! syntax clear %s' % hl.key)
+                cmds.extend(self._syntax_cmds(hl, group))
+                cmds.append('hi def link %s %s' % (hl.key, hl.group))
+                full_cmds = cmds
+
+            highlights[hl.key] = md5hash
+            state.names[hl.key] = names
+
+        if cmds:
+            full_cmd = ' | '.join(cmds)
+            dia.debug_echo(full_cmd)
+            self.__batch.append(['nvim_command', [full_cmd]])
+
+        state.cmds[hl.key] = full_cmds
+        dia.debug_end('Updated highlight for %s' % hl.key)
+
+    def _flush(self, hl):
+        """Send everything highlight() queued up, and the NeotagsPost
+        autocommand, in one batch. The highlighting is dropped if another
+        buffer or filetype was switched to in the meantime. A call that
+        fails is reported and the rest are still sent.
+        """
+        batch, self.__batch = self.__batch, []
+        if batch and self.vim.api.eval("[&ft, bufnr('%')]") != [hl.ft,
+                                                                 hl.number]:
+            dia.debug_echo('Buffer changed, aborting.')
+            state = self.__buffers.get(hl.number)
+            if state is not None:
+                # Nothing can be assumed about what is in place any more.
+                state.names = {}
+                state.words = None
+            batch = []
+
+        batch.append(['nvim_command', [self.__autocmd]])
+        # call_atomic stops at the first call that fails, so what comes after
+        # it is sent again on its own.
+        while batch:
+            _, err = self.vim.api.call_atomic(batch)
+            if err is None:
+                break
+            index, _, message = err
+            name, args = batch[index]
+            call = args[0] if name == 'nvim_command' else '%s%r' % (name,
+                                                                    args)
+            dia.error("Failed to highlight -> '%s' in: %s" % (
+                message, call[:MAX_ERROR_CALL]))
+            batch = batch[index + 1:]
+
+    def _place_marks(self, number):
+        """Highlight the names the groups of buffer `number' left to the
+        extmark backend on the lines around the window, unless they are
+        already.
+        """
+        state = self.__buffers.get(number)
+        if state is None or state.tokens is None:
+            return
 
-            self.__md5_cache[number][hl.key] = md5hash
-            cmds.append('hi def link %s %s' % (hl.key, hl.group))
+        words = {}
+        for key, names in state.marks.items():
+            for name in names:
+                words[name] = key
+        marked = state.marked if words == state.words else None
+        first, last = self._viewport()
 
-        full_cmd = ' | '.join(cmds)
-        dia.debug_echo(full_cmd)
+        dia.debug_start()
+        calls, state.marked = self.__extmarks.place(
+            number, state.tokens, words, marked, first, last)
+        state.words = words
+        self.__batch.extend(calls)
+        dia.debug_end('Placing highlights on lines %d-%d of buffer %d' %
+                      (state.marked[0], state.marked[1], number))
+
+    def scroll(self):
+        """Extend the highlights of the extmark backend to the lines that
+        scrolled into view.
+        """
+        if not self.__initialized or self.__extmarks is None:
+            return
+        number = self.vim.current.buffer.number
+        state = self.__buffers.get(number)
+        if state is None or not state.words:
+            return
 
-        if self.__cur['buf'] == self.vim.current.buffer:
-            self.vim.command(full_cmd, async_=True)
-            success = True
-        else:
-            dia.debug_echo('Buffer changed, aborting.')
-            success = False
+        self._place_marks(number)
+        batch, self.__batch = self.__batch, []
+        if batch:
+            self.vim.api.call_atomic(batch, async_=True)
 
-        try:
-            self.__cmd_cache[number][hl.key] = cmds
-        except KeyError:
-            self.__cmd_cache[number] = {}
-            self.__cmd_cache[number][hl.key] = cmds
-        finally:
-            if success:
-                dia.debug_end('Updated highlight for %s' % hl.key)
+    def _syntax_cmds(self, hl, names):
+        """The syntax commands that add `names' to the group `hl.key'.
+        Keywords go in chunks of at most `patternlength' names. The names
+        that need a match are factored into trie patterns instead, each as
+        long as `patternlength' of the names would be as a flat alternation.
+        """
+        cmds = []
+        notin = ','.join([*hl.notin, *self.vv('global_notin')])
+        global_notin = ','.join(self.vv('global_notin'))
+        names = [x.decode('ascii') for x in names]
+
+        if (not hl.notin and
+                hl.prefix == self.__prefix and
+                hl.suffix == self.__suffix and
+                hl.allow_keyword == 1):
+            keywords = [x for x in names if '.' not in x]
+            names = [x for x in names if '.' in x]
+            for i in range(0, len(keywords), self.__patternlength):
+                cmds.append(self.__keyword_pattern %
+                            (hl.key, r' '.join(
+                                keywords[i:i + self.__patternlength])))
+        if not names:
+            return cmds
+
+        budget = self.__patternlength * (
+            sum(map(len, names)) // len(names) + 2)
+        for pattern in trie_patterns(names, budget):
+            if hl.notin:
+                cmds.append(self.__notin_pattern %
+                            (hl.key, hl.prefix, pattern, hl.suffix, notin))
             else:
-                dia.pop()
-            return True
+                cmds.append(self.__match_pattern_not %
+                            (hl.key, hl.prefix, pattern, hl.suffix,
+                             global_notin))
+        return cmds
 
     def _parseTags(self, ft):
         self._get_files()
@@ -369,16 +655,18 @@ class Neotags(object):
 
         if not os.path.exists(self.__gzfile):
             if self.vv('run_ctags'):
-                self._run_ctags(True)
-                files.append(self.__gzfile)
+                # Highlight from whatever else is available until it's done.
+                if not self.__worker.busy(self.__gzfile):
+                    self._run_ctags(True)
             else:
                 self.__gzfile = None
         else:
-            dia.debug_echo('updating vim-tagfile')
-            with self._open(self.__gzfile, 'rb', self.vv('compression_type')) as fp:
-                self._update_vim_tagfile(self.__gzfile, fp)
+            self._update_vim_tagfile(self.__gzfile)
             files.append(self.__gzfile)
 
+        if self.__gzfile is not None:
+            self._update_index()
+
         for File in self.__init_tagfiles:
             if os.path.exists(File):
                 files.append(File)
@@ -389,8 +677,10 @@ class Neotags(object):
             dia.error('No tag files found!')
             return None
 
-        # Slurp the whole content of the current buffer
-        self.__slurp = '\n'.join(self.__cur['buf'])
+        self.__cur['tokens'] = self._buffer_tokens(ft)
+        if self.__cur['tokens'] is None:
+            # Slurp the whole content of the current buffer
+            self.__slurp = '\n'.join(self.__cur['buf'])
 
         if self.__neotags_bin is not None:
             try:
@@ -402,6 +692,150 @@ class Neotags(object):
         else:
             return self._get_tags(files, ft)
 
+    def _update_index(self):
+        """Use the index of the project tags file if it is up to date. If the
+        tags file changed since it was last indexed, the index is rebuilt on
+        the worker thread and the tags file itself is read until then.
+        """
+        self.__index = None
+        if (not self.vv('use_index') or not os.path.exists(self.__gzfile)
+                or self.__worker.busy(self.__gzfile)):
+            return
+
+        index = TagIndex(self.__gzfile)
+        if index.is_fresh():
+            self.__index = index
+            return
+
+        gzfile = self.__gzfile
+        cmpt = self.vv('compression_type')
+        stats = self.__stats
+
+        def job(log):
+            with stats.span('index.build'):
+                try:
+                    with self._open(gzfile, 'rb', cmpt) as fp:
+                        index.build(fp)
+                except (IOError, EOFError) as err:
+                    log.append((True, "Failed to index tags file -> '%s'" %
+                                err))
+                    return False
+            log.append((False, 'Rebuilt tags index %s' % index.path))
+            # The tags themselves are the same as those read meanwhile.
+            return False
+
+        dia.debug_echo('Rebuilding tags index %s in the background' %
+                       index.path)
+        self.__worker.submit(gzfile, job, self._ctags_done, part=INDEX_PART)
+
+    def _buffer_tokens(self, ft):
+        """Return the tokens of the current buffer, attaching to it first if
+        this is the first time it is seen. Returns None if the buffer cannot
+        be attached to, in which case its contents have to be read in full.
+        """
+        buf = self.__cur['buf']
+        strip = ft.lower().split('.')[0] in STRIP_LANGS
+        state = self.__buffers.use(buf.number)
+        tokens = state.tokens
+
+        if state.building is not None:
+            return self._viewport_tokens(strip)
+
+        if tokens is None:
+            # Read the buffer in the same batch as attaching so that no change
+            # can slip in between the two.
+            results, err = self.vim.api.call_atomic([
+                ['nvim_buf_attach', [buf, False, {}]],
+                ['nvim_buf_get_lines', [buf, 0, -1, False]],
+                ['nvim_buf_get_changedtick', [buf]],
+            ])
+            if err is not None or not results[0]:
+                dia.debug_echo('Failed to attach to buffer %d' % buf.number)
+                return None
+
+            lines, tick = results[1], results[2]
+            large = self.vv('large_buffer')
+            if large > 0 and len(lines) > large:
+                # Highlight what is in view right away, and the rest once all
+                # of the buffer has been tokenized bit by bit in between
+                # whatever else nvim has to do.
+                dia.debug_echo('Tokenizing buffer %d (%d lines) in the '
+                               'background' % (buf.number, len(lines)))
+                state.building = BufferTokens([], tick, strip)
+                self.vim.async_call(self._build_tokens, buf.number, lines, 0)
+                return self._viewport_tokens(strip, lines)
+
+            dia.debug_start()
+            with self.__stats.span('tokenize'):
+                tokens = BufferTokens(lines, tick, strip)
+            state.tokens = tokens
+            dia.debug_end('Attached to buffer %d (%d tokens)' %
+                          (buf.number, len(tokens)))
+        else:
+            tokens.set_strip(strip)
+
+        return tokens
+
+    def _viewport(self):
+        """The range of lines of the current buffer that are in the window,
+        give or take VIEWPORT_MARGIN lines.
+        """
+        top, bottom = self.vim.api.eval("[line('w0'), line('w$')]")
+        return max(0, top - 1 - VIEWPORT_MARGIN), bottom + VIEWPORT_MARGIN
+
+    def _viewport_tokens(self, strip, lines=None):
+        """Return the tokens of the lines of the current buffer that are in
+        the window, give or take VIEWPORT_MARGIN lines.
+        """
+        first, last = self._viewport()
+        if lines is None:
+            lines = self.__cur['buf'][first:last]
+        else:
+            lines = lines[first:last]
+        return BufferTokens(lines, None, strip)
+
+    def _build_tokens(self, number, lines, start):
+        """Tokenize the next TOKENIZE_CHUNK lines of a large buffer, and
+        once all are, start tracking it and highlight all of it.
+        """
+        state = self.__buffers.get(number)
+        if state is None or state.building is None:
+            # Forgotten or unloaded in the meantime.
+            return
+
+        tokens = state.building
+        end = start + TOKENIZE_CHUNK
+        tokens.append(lines[start:end])
+        if end < len(lines):
+            self.vim.async_call(self._build_tokens, number, lines, end)
+            return
+
+        state.building = None
+        state.tokens = tokens
+        for event in state.queued:
+            tokens.on_lines(*event)
+        state.queued = []
+        dia.debug_echo('Attached to buffer %d (%d tokens)' %
+                       (number, len(tokens)))
+
+        state.parsed = False
+        self.__scheduler.request(number, False)
+
+    def _bin_daemon(self, args):
+        """Return the binary's daemon process, or None if the binary should be
+        run once per query instead.
+        """
+        if (not self.vv('bin_daemon') or sys.platform == 'win32'
+                or any('\t' in arg or '\n' in arg for arg in args)):
+            return None
+
+        if self.__daemon is None or self.__daemon.binary != self.__neotags_bin:
+            if self.__daemon is not None:
+                self.__daemon.close()
+            self.__daemon = BinDaemon(self.__neotags_bin)
+
+        return self.__daemon
+
     def _get_backup(self, ft, group):
         tmp = self.vim.api.eval("execute('syn list %s')" % group)
         tmp = re.sub(r'.*xxx\s*(.*)\s*links to (.*)',
@@ -423,8 +857,7 @@ class Neotags(object):
         cmds.append('syntax keyword %s %s' % (group, ' '.join(symbols)))
         cmds.append('hi! link %s %s' % (group, lnk))
 
-        full_cmd = ' | '.join(cmds)
-        self.vim.command(full_cmd, async_=True)
+        self.__batch.append(['nvim_command', [' | '.join(cmds)]])
 
 
 # =============================================================================
@@ -436,14 +869,10 @@ class Neotags(object):
         vimlang = languages[0]
         lang = self._vim_to_ctags(languages)[0]
 
-        try:
-            order = self.vim.api.eval('neotags#%s#order' % ft)
-        except NvimError:
+        order = self._exists(ft, '#order', None)
+        if order is None:
             return None
-        try:
-            equivalent = self.vim.api.eval('neotags#%s#equivalent' % ft)
-        except NvimError:
-            equivalent = None
+        equivalent = self._exists(ft, '#equivalent', None)
 
         groups = {
             "%s#%s" % (ft, kind): []
@@ -453,16 +882,21 @@ class Neotags(object):
         if filetypes is None:
             return groups
 
-        if self.__gzfile is not None:
+        if self.__index is not None and files[0] == self.__gzfile:
+            # Hand the binary only the slice of the index in this language.
+            tagfile = '%s.%s.slice' % (self.__tagfile, re.sub(r'\W', '_', lang))
+            file_list = 'none%s%s' % (SEPCHAR, self.__index.export(tagfile, lang))
+            for File in files[1:]:
+                file_list += '%snone%s%s' % (SEPCHAR, SEPCHAR, File)
+        elif files[0] == self.__gzfile:
             comp_type = self.vv('compression_type')
             comp_type = 'none' if comp_type is None else comp_type
             file_list = '%s%s%s' % (comp_type, SEPCHAR, files[0])
             for File in files[1:]:
                 file_list += '%snone%s%s' % (SEPCHAR, SEPCHAR, File)
         else:
-            file_list = ''
-            for File in files:
-                file_list += '%snone%s%s' % (SEPCHAR, SEPCHAR, File)
+            file_list = SEPCHAR.join('none%s%s' % (SEPCHAR, File)
+                                     for File in files)
 
         stime = time.time()
         dia.debug_echo("=============== Executing C code ===============")
@@ -478,7 +912,10 @@ class Neotags(object):
         else:
             equiv_str = SEPCHAR.join([A + B for A, B in equivalent.items()])
 
-        indata = self.__slurp.encode('ascii', errors='replace')
+        if self.__cur['tokens'] is not None:
+            indata = self.__cur['tokens'].text()
+        else:
+            indata = self.__slurp.encode('ascii', errors='replace')
         File = self.__cur['file']
 
         dia.debug_echo("Cmd is: %s" % [
@@ -497,36 +934,51 @@ class Neotags(object):
         #    7) The `ignored' tags list (colon separated)
         #    8) The list of groups considered equivalent (colon separated)
         # All numbers must be converted to strings for the subprocess interface.
-        proc = subprocess.Popen(
-            (
-                self.__neotags_bin,
-                file_list,
-                lang,
-                vimlang,
-                order,
-                str(self.vv('strip_comments')),
-                str(len(indata)),
-                ignored_tags,
-                equiv_str,
-                File
-            ),
-            stdin=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE,
+        args = (
+            file_list,
+            lang,
+            vimlang,
+            order,
+            str(self.vv('strip_comments')),
+            str(len(indata)),
+            ignored_tags,
+            equiv_str,
+            File
         )
-        out, err = proc.communicate(input=indata)
-        if sys.platform == 'win32':
-            out = out.rstrip().split(b'\n').rstrip(b'\r')
-        else:
+
+        daemon = self._bin_daemon(args)
+        if daemon is not None:
+            try:
+                with self.__stats.span('binary'):
+                    returncode, out = daemon.query(args, indata)
+            except OSError as error:
+                raise CBinError(-1, str(error))
+            if returncode:
+                raise CBinError(returncode, out.decode(errors='replace'))
             out = out.rstrip().split(b'\n')
-        err = err.rstrip().decode(errors='replace').split('\n')
+            err = []
+        else:
+            proc = subprocess.Popen(
+                (self.__neotags_bin, *args),
+                stdin=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+            with self.__stats.span('binary'):
+                out, err = proc.communicate(input=indata)
+            if sys.platform == 'win32':
+                out = out.rstrip().split(b'\n').rstrip(b'\r')
+            else:
+                out = out.rstrip().split(b'\n')
+            err = err.rstrip().decode(errors='replace').split('\n')
+            returncode = proc.returncode
 
         dia.debug_echo("Returned %d items" % (len(out)))
         for line in err:
             if line:
                 dia.debug_echo("ERR: %s" % line)
-        if proc.returncode:
-            raise CBinError(proc.returncode, err[-1])
+        if returncode:
+            raise CBinError(returncode, err[-1])
 
         for line in out:
             try:
@@ -551,21 +1003,17 @@ class Neotags(object):
         filetypes = ft.lower().split('.')
         languages = ft.lower().split('.')
         dia.debug_echo("=============== Executing Python code ===============")
-        match_list = []
+        candidates = []
 
         try:
             ignored_tags = self.vv('ignored_tags')[ft]
         except KeyError:
             ignored_tags = []
-        try:
-            order = self.vim.api.eval('neotags#%s#order' % ft)
-        except NvimError:
+        order = self._exists(ft, '#order', None)
+        if order is None:
             dia.debug_echo("No order string found.")
             return
-        try:
-            equivalent = self.vim.api.eval('neotags#%s#equivalent' % ft)
-        except NvimError:
-            equivalent = None
+        equivalent = self._exists(ft, '#equivalent', None)
 
         stime = time.time()
         groups = {
@@ -576,29 +1024,25 @@ class Neotags(object):
         if filetypes is None:
             dia.debug_echo("No filetypes identified, returning.")
             return groups
-        if self.__gzfile is None:
-            comp_type = None
-        else:
-            comp_type = self.vv('compression_type')
-
+        key_lang = self._vim_to_ctags(languages)[0]
+        query = (key_lang, order, ignored_tags, equivalent)
+        missing = []
         for File in files:
             try:
-                with self._open(File, 'rb', comp_type) as fp:
-                    data = fp.read()
-                    tags = find_tags(dia, data, self._vim_to_ctags(languages)[0],
-                                     order, ignored_tags, equivalent)
-                    match_list.append(tags)
+                tags = self._get_candidates(File, ft, query)
             except FileNotFoundError:
                 if File == self.__gzfile:
                     dia.error("No tags file found. Make sure Universal Ctags is "
                               "installed and in your $PATH.")
                 continue
+            if tags is None:
+                missing.append(File)
+            else:
+                candidates.append(tags)
+        if missing:
+            candidates.extend(self._read_candidates(missing, ft, query))
 
-            comp_type = None
-
-        match_list = [i for s in match_list for i in s]
-        self._parse(ft, match_list, groups, languages,
-                    ignored_tags, equivalent, order)
+        self._parse(ft, candidates, groups)
         for grp in groups.keys():
             groups[grp] = list(set(groups[grp]))
 
@@ -609,87 +1053,378 @@ class Neotags(object):
 
         return groups
 
-    def _parse(self, ft, match_list, groups, languages, ignored_tags, equivalent, order):
+    def _candidates_key(self, File, ft, query):
+        st = os.stat(File)
+        _, order, ignored_tags, equivalent = query
+        return ((File, ft, order, tuple(ignored_tags),
+                 tuple(sorted(equivalent.items())) if equivalent else None),
+                (st.st_mtime_ns, st.st_size))
+
+    def _get_candidates(self, File, ft, query):
+        """Return the tags in `File' that may be highlighted in a buffer of
+        filetype `ft' as {kind: [names]}, if they are cached or can be looked
+        up in the index, or None if the file has to be read. They only
+        depend on the file and the filetype's settings, so they are cached
+        until the file changes.
+        """
+        key, stamp = self._candidates_key(File, ft, query)
+        candidates = self.__tagcache.get(key, stamp)
+        if candidates is not None:
+            dia.debug_echo("Using cached tags for %s" % File)
+            return candidates
+
+        if self.__index is None or File != self.__gzfile:
+            return None
+
+        key_lang, order, ignored_tags, equivalent = query
+        with self.__stats.span('index'):
+            tags = self.__index.query(key_lang, order, equivalent,
+                                      ignored_tags)
+        candidates = {}
+        for tag in tags:
+            candidates.setdefault(tag['kind'], []).append(tag['name'])
+
+        self.__tagcache.put(key, stamp, candidates)
+        return candidates
+
+    def _read_candidates(self, files, ft, query):
+        """Read the tags of `files' that _get_candidates() couldn't find,
+        in several processes at once if there is enough to read.
+        """
+        sources = []
+        stamps = []
+        for File in files:
+            try:
+                stamps.append(self._candidates_key(File, ft, query))
+            except FileNotFoundError:
+                continue
+            comp_type = (self.vv('compression_type')
+                         if File == self.__gzfile else None)
+            sources.append((File, comp_type))
+
+        results = None
+        try:
+            if self.__tagpool.worthwhile(sources):
+                with self.__stats.span('find_tags.pool'):
+                    results = self.__tagpool.parse(sources, query, self._open)
+        except (OSError, BrokenExecutor) as err:
+            dia.error("Failed to read the tags files in parallel -> '%s'" %
+                      err)
+            self.__tagpool.shutdown()
+            self.__tagpool.jobs = 1
+
+        if results is None:
+            results = []
+            for File, comp_type in sources:
+                with self.__stats.span('decompress'):
+                    try:
+                        with self._open(File, 'rb', comp_type) as fp:
+                            data = fp.read()
+                    except FileNotFoundError:
+                        data = b''
+                with self.__stats.span('find_tags'):
+                    results.append(find_candidates(data, query))
+
+        ret = []
+        for (key, stamp), (candidates, errors) in zip(stamps, results):
+            for error in errors:
+                dia.error(error)
+            self.__tagcache.put(key, stamp, candidates)
+            ret.append(candidates)
+        return ret
+
+    def _parse(self, ft, candidates, groups):
         dia.debug_start()
-        key_lang = languages[0]
+        toks = self.__cur['tokens']
 
-        if key_lang in ('c', 'cpp', 'java', 'go', 'rust', 'cs'):
-            buf = strip_c(self.__slurp, dia)
-        else:
-            buf = bytes(self.__slurp, 'ascii', errors='replace')
+        if toks is None:
+            with self.__stats.span('strip'):
+                if ft.lower().split('.')[0] in STRIP_LANGS:
+                    buf = strip_c(self.__slurp, dia)
+                else:
+                    buf = bytes(self.__slurp, 'ascii', errors='replace')
 
-        toks = sorted(tokenize(buf, dia))
+            with self.__stats.span('tokenize'):
+                toks = tokenize(buf, dia)
 
-        for match in match_list:
-            if (bindex(toks, match['name']) != (-1)
-                    or b'$' in match['name']
-                    or b'.' in match['name']):
-                key = "%s#%s" % (ft, match['kind'].decode('ascii'))
-                groups[key].add(match['name'])
+        with self.__stats.span('match'):
+            for tags in candidates:
+                for kind, names in tags.items():
+                    group = groups["%s#%s" % (ft, kind.decode('ascii'))]
+                    for name in names:
+                        if name in toks or b'$' in name or b'.' in name:
+                            group.add(name)
 
         dia.debug_end("Finished _parse, found %d items."
                       % sum(map(len, groups.values())))
 
 # =============================================================================
 
-    def _run_ctags(self, force):
+    def _run_ctags(self, force, incremental=False, ft=None):
+        """Run ctags in the background. The current tags file keeps being used
+        for highlighting until the new one has been written, at which point it
+        is swapped in atomically and the current buffer is re-highlighted.
+        Returns False if only the current file was to be re-tagged and none of
+        its tags can have changed.
+        """
+        if incremental:
+            changed = self._run_ctags_file(ft)
+            if changed is not None:
+                return changed
+
         dia.debug_start()
         ctags_command = self._get_ctags_command(force)
         if ctags_command is None:
             dia.debug_end("Not running ctags.")
-            return
+            return True
 
-        try:
-            proc = subprocess.Popen(
-                ctags_command, shell=True, stderr=subprocess.PIPE)
-            proc.wait(self.vv('ctags_timeout'))
-            err = proc.communicate()[1]
+        timeout = self.vv('ctags_timeout')
+        silent_timeout = self.vv('silent_timeout')
+        cmpt = self.vv('compression_type')
+        level = self.vv('compression_level')
+        tagfile = self.__tagfile
+        newfile = tagfile + NEWSUFFIX
+        gzfile = self.__gzfile
+        index = TagIndex(gzfile) if self.vv('use_index') else None
+        vimfile = self.__tmp_cache.get(gzfile)
+        manifest = self._manifest()
+
+        stats = self.__stats
+
+        def run(**kwargs):
+            with stats.span('ctags'):
+                if isinstance(ctags_command, ShardedCtags):
+                    return ctags_command.run(**kwargs)
+                return self._stream_ctags(ctags_command=ctags_command,
+                                          **kwargs)
+
+        def job(log):
+            # The output is compressed as it comes in, and written out
+            # uncompressed alongside for the index and vim.
+            with open(newfile, 'wb') as plain:
+                if cmpt in ('gzip', 'lzma'):
+                    with self._open(gzfile + NEWSUFFIX, 'wb', cmpt,
+                                    level=level) as dst:
+                        done = run(log=log, timeout=timeout,
+                                   silent_timeout=silent_timeout,
+                                   sinks=(plain, dst))
+                else:
+                    done = run(log=log, timeout=timeout,
+                               silent_timeout=silent_timeout, sinks=(plain,))
 
-            if err:
-                dia.error('Ctags completed with errors')
-                for e in err.decode('ascii').split('\n'):
-                    dia.error(e)
+            if not done:
+                for File in (newfile, gzfile + NEWSUFFIX):
+                    if os.path.exists(File):
+                        os.unlink(File)
+                return False
+
+            if cmpt in ('gzip', 'lzma'):
+                os.replace(gzfile + NEWSUFFIX, gzfile)
+                source = newfile
             else:
-                dia.debug_echo('Ctags completed successfully')
+                os.replace(newfile, gzfile)
+                source = gzfile
+
+            if index is not None:
+                with stats.span('index.build'), open(source, 'rb') as src:
+                    index.build(src)
+            manifest.clear()
+
+            if source != gzfile:
+                if vimfile is not None:
+                    # Already uncompressed, so let vim have it as it is.
+                    st = os.stat(gzfile)
+                    os.replace(newfile, vimfile['name'])
+                    vimfile['stamp'] = (st.st_mtime_ns, st.st_size)
+                else:
+                    os.unlink(newfile)
 
-            cmpt = self.vv('compression_type')
-            try:
-                dia.debug_start()
-                if cmpt in ('gzip', 'lzma'):
-                    with open(self.__tagfile, 'rb') as src:
-                        with self._open(self.__gzfile, 'wb', cmpt, level=9) as dst:
-                            dst.write(src.read())
+            return True
+
+        self.__worker.submit(gzfile, job, self._ctags_done)
+        dia.debug_end("Started ctags in the background")
+        return True
 
-                        src.seek(0)
-                        self._update_vim_tagfile(self.__gzfile, src)
+    def _stream_ctags(self, log, ctags_command, timeout, silent_timeout,
+                      sinks):
+        """Run ctags and write its output to each of `sinks' as it comes in,
+        so that it never has to be held in memory. Returns whether ctags ran
+        to completion. Called on the worker thread.
+        """
+        with tempfile.TemporaryFile() as errfile:
+            try:
+                proc = subprocess.Popen(ctags_command, shell=True,
+                                        stdout=subprocess.PIPE,
+                                        stderr=errfile)
+            except FileNotFoundError as error:
+                log.append((True, 'failed to run Ctags %s' % error))
+                return False
 
-                    os.unlink(self.__tagfile)
+            timed_out = []
 
-            except IOError as err:
-                dia.error("Unexpected IO Error -> '%s'" % err)
+            def kill():
+                timed_out.append(True)
+                try:
+                    self._kill(proc.pid)
+                except ImportError:
+                    proc.kill()
 
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+            try:
+                for chunk in iter(lambda: proc.stdout.read(CTAGS_CHUNK), b''):
+                    for sink in sinks:
+                        sink.write(chunk)
+                proc.wait()
             finally:
-                dia.debug_end('Finished compressing file.')
+                timer.cancel()
+                proc.stdout.close()
+
+            if timed_out:
+                if silent_timeout == 0:
+                    log.append((True, 'Ctags process timed out!'))
+                return False
+
+            errfile.seek(0)
+            err = errfile.read()
+
+        if err:
+            log.append((True, 'Ctags completed with errors'))
+            for e in err.decode('ascii', errors='replace').split('\n'):
+                log.append((True, e))
+        else:
+            log.append((False, 'Ctags completed successfully'))
+
+        return True
+
+    def _wait_ctags(self, log, ctags_command, timeout, silent_timeout,
+                    **kwargs):
+        """Run ctags and wait for it. Called on the worker thread."""
+        try:
+            proc = subprocess.Popen(ctags_command, shell=True,
+                                    stderr=subprocess.PIPE, **kwargs)
+            out, err = proc.communicate(timeout=timeout)
 
         except FileNotFoundError as error:
-            dia.error('failed to run Ctags %s' % error)
+            log.append((True, 'failed to run Ctags %s' % error))
+            return None
 
         except subprocess.TimeoutExpired:
             try:
                 self._kill(proc.pid)
             except ImportError:
                 proc.kill()
+            proc.communicate()
+            if silent_timeout == 0:
+                log.append((True, 'Ctags process timed out!'))
+            return None
+
+        if err:
+            log.append((True, 'Ctags completed with errors'))
+            for e in err.decode('ascii', errors='replace').split('\n'):
+                log.append((True, e))
+        else:
+            log.append((False, 'Ctags completed successfully'))
+
+        return out if out is not None else True
+
+    def _ctags_done(self, log, result):
+        """Called on the main loop once a background ctags job finished."""
+        for err, message in log:
+            if err:
+                dia.error(message)
             else:
-                if self.vv('silent_timeout') == 0:
-                    self.vim.command("echom 'Ctags process timed out!'",
-                                     async_=True)
+                dia.debug_echo(message)
+
+        if isinstance(result, Exception):
+            dia.error("Unexpected error updating tags -> '%s'" % result)
+        elif result:
+            # Every buffer has to be re-filtered against the new tags.
+            for state in self.__buffers:
+                state.parsed = False
+            self.__scheduler.request(self.vim.current.buffer.number, False)
+
+    def _run_ctags_file(self, ft):
+        """Re-tag only the current file and splice its tags into the existing
+        tags file, replacing the old ones and keeping the file sorted. Nothing
+        is done if the file is still as it was last tagged. Returns whether
+        any of its tags may have appeared or disappeared, or None if there is
+        no tags file to update, in which case the caller should fall back to
+        a full run.
+        """
+        recurse, _, run = self._get_files()
+        if not run:
+            return True
+        if not recurse or not os.path.exists(self.__gzfile):
+            return None
+
+        File = self.__cur['file']
+        manifest = self._manifest()
+        change, entry = manifest.compare(File, ft)
+        if change == SAME:
+            dia.debug_echo('%s is unchanged, not re-tagging it.' % File)
+            return False
+
+        ctags_args = [arg for arg in self.vv('ctags_args')
+                      if arg != '-L -' and not arg.startswith('-R')]
+        ctags_command = '%s %s -f - "%s"' % (
+            self.vv('ctags_bin'), ' '.join(ctags_args), File)
+        dia.debug_echo(ctags_command)
+
+        timeout = self.vv('ctags_timeout')
+        silent_timeout = self.vv('silent_timeout')
+        foldcase = '--sort=foldcase' in ctags_args or '--sort=2' in ctags_args
+        cmpt = self.vv('compression_type')
+        level = self.vv('compression_level')
+        gzfile = self.__gzfile
+        index = TagIndex(gzfile) if self.vv('use_index') else None
+
+        stats = self.__stats
+
+        def job(log):
+            with stats.span('ctags'):
+                out = self._wait_ctags(log, ctags_command, timeout,
+                                       silent_timeout, stdout=subprocess.PIPE)
+            if out is None:
+                return False
 
-        finally:
-            dia.debug_end("Finished running ctags")
+            new = [line + b'\n' for line in out.splitlines()
+                   if line and not line.startswith(b'!_')]
+            fresh = index is not None and index.is_fresh()
+
+            with self._open(gzfile, 'rb', cmpt) as src:
+                with self._open(gzfile + NEWSUFFIX, 'wb', cmpt,
+                                level=level) as dst:
+                    for line in merge_tags(src, new, File.encode(), foldcase):
+                        dst.write(line)
+            os.replace(gzfile + NEWSUFFIX, gzfile)
+
+            if fresh:
+                index.replace_file(File.encode(), new)
+            if entry is not None:
+                manifest.record(File, entry)
+
+            log.append((False, 'Re-tagged %s (%d tags)' % (File, len(new))))
+            # The tags only moved, so there is nothing to highlight anew.
+            return change != LAYOUT
+
+        self.__worker.submit(gzfile, job, self._ctags_done, part=File)
+        return change != LAYOUT
+
+    def _manifest(self):
+        """The Manifest of the current tags file."""
+        manifest = self.__manifests.get(self.__tagfile)
+        if manifest is None:
+            manifest = self.__manifests[self.__tagfile] = Manifest(
+                self.__tagfile + '.manifest')
+        return manifest
 
     def _get_ctags_command(self, force):
-        """Create the commandline to be invoked when running ctags."""
-        ctags_args = self.vv('ctags_args')
+        """Create the commandline to be invoked when running ctags. When a
+        project is to be indexed by several ctags processes at once, the
+        ShardedCtags that runs them is returned instead.
+        """
+        ctags_args = list(self.vv('ctags_args'))
 
         # NOTE: _get_files() sets self.__tagfile and self.__gzfile!
         recurse, paths, run = self._get_files()
@@ -697,20 +1432,41 @@ class Neotags(object):
                        and os.stat(self.__gzfile).st_size > 0):
             return None
 
-        ctags_args.append('-f "%s"' % self.__tagfile)
+        ctags_args.append('-f -')
         ctags_binary = None
 
         path_args = ' '.join(['"%s"' % p for p in paths])
-        if recurse:
-            if self.vv('find_tool'):
-                find_tool = "%s %s" % (self.vv('find_tool'), path_args)
-                if (self.__tagfiles_by_type == 1):
-                    ft = self.vim.api.eval('&ft')
-                    languages = self._vim_to_ext(ft.lower().split('.'))
-
-                    find_tool = '%s | %s "\\.(%s)$"' % (
-                        find_tool, self.vv('regex_tool'), '|'.join(languages))
+        find_tool = None
+        if recurse and self.vv('find_tool'):
+            find_tool = "%s %s" % (self.vv('find_tool'), path_args)
+            if (self.__tagfiles_by_type == 1):
+                ft = self.vim.api.eval('&ft')
+                languages = self._vim_to_ext(ft.lower().split('.'))
+
+                find_tool = '%s | %s "\\.(%s)$"' % (
+                    find_tool, self.vv('regex_tool'), '|'.join(languages))
+
+        jobs = self.vv('ctags_jobs') or os.cpu_count() or 1
+        # ptags already runs in parallel on its own.
+        if recurse and jobs > 1 and not any(
+                arg.startswith('-c ') for arg in ctags_args):
+            excludes = [arg[len('--exclude='):].strip('\'"')
+                        for arg in ctags_args
+                        if arg.startswith('--exclude=')]
+            foldcase = ('--sort=foldcase' in ctags_args
+                        or '--sort=2' in ctags_args)
+            ctags_args.append('-L -')
+            full_command = '%s %s' % (self.vv('ctags_bin'),
+                                      ' '.join(ctags_args))
+            dia.debug_echo("Running up to %d ctags processes on dir(s) %s" %
+                           (jobs, path_args))
+            dia.debug_echo(full_command)
+
+            return ShardedCtags(full_command, paths, jobs, find_tool,
+                                excludes, foldcase)
 
+        if recurse:
+            if find_tool:
                 ctags_args.append('-L -')
                 ctags_binary = "%s | %s" % (
                     find_tool,
@@ -753,25 +1509,76 @@ class Neotags(object):
         return orderlist
 
     def _exists(self, kind, var, default):
-        buf = kind + var
-
-        if buf not in self.__exists_buffer:
-            try:
-                self.__exists_buffer[buf] = self.vim.api.eval('neotags#' + buf)
-            except NvimError:
-                self.__exists_buffer[buf] = default
+        """Look up `neotags#<kind><var>' (e.g. `neotags#c#f.filter.group')
+        in the configuration of its filetype, or return `default'.
+        """
+        filetype, _, name = (kind + var).partition('#')
+        name = name.split('.')
+        value = self._ft_config(filetype).get(name[0])
 
-        return self.__exists_buffer[buf]
+        for key in name[1:]:
+            if not isinstance(value, dict):
+                return default
+            value = value.get(key)
 
-    def _getbufferhl(self):
-        number = self.__cur['buf'].number
+        return default if value is None else value
 
-        if number in self.__md5_cache.keys():
-            highlights = self.__md5_cache[number]
+    def _ft_config(self, filetype):
+        """Return every `g:neotags#<filetype>#' variable, without the
+        prefix. They are read in one go and kept until one of them changes.
+        """
+        config = self.__ftconfig.get(filetype)
+        if config is None:
+            prefix = 'neotags#%s#' % filetype
+            config = self.vim.api.eval(
+                "filter(copy(g:), {k, v -> stridx(k, '%s') == 0})" % prefix)
+            config = {k[len(prefix):]: v for k, v in config.items()}
+            self.__ftconfig[filetype] = config
+        return config
+
+    def config_changed(self, args):
+        """Called when a `g:neotags_' or `g:neotags#' variable is set or
+        removed.
+        """
+        key = args[0] if args else ''
+        if key.startswith('neotags_'):
+            self.__settings.invalidate()
+        elif key.count('#') >= 2:
+            self.__ftconfig.pop(key.split('#')[1], None)
         else:
-            self.__md5_cache[number] = highlights = {}
+            self.__settings.invalidate()
+            self.__ftconfig.clear()
 
-        return highlights, number
+    def reload(self):
+        """Read all settings again and rehighlight the current buffer."""
+        if not self.__initialized:
+            return
+        self.__settings.invalidate()
+        self.__ftconfig.clear()
+        dia.inform_echo('Neotags: reloaded the settings.')
+        self.request([], True)
+
+    def _apply_settings(self):
+        """Pass on the settings that are kept elsewhere once they were
+        reloaded.
+        """
+        self.__generation = self.__settings.generation
+        self.__patternlength = self.vv('patternlength')
+        self.__scheduler.delay = self.vv('update_delay') / 1000
+        self.__tagcache.max_size = self.vv('cache_size') * 1024 * 1024
+        if self.__tagpool.jobs != self._parse_jobs():
+            self.__tagpool.shutdown()
+            self.__tagpool = TagPool(self._parse_jobs())
+        self.__buffers.max_hidden = self.vv('max_buffers')
+        self.__stats.enabled = bool(self.vv('stats'))
+        if (self.__extmarks is not None
+                and self.__extmarks.set_notin(self.vv('global_notin'))):
+            # Every highlight has to be placed again.
+            for state in self.__buffers:
+                state.words = None
+
+    def _parse_jobs(self):
+        return self.vv('parse_jobs') or os.cpu_count() or 1
 
     def _clear(self, ft):
         if ft is None:
@@ -790,6 +1597,12 @@ class Neotags(object):
 
         self.vim.command(' | '.join(cmds), async_=True)
 
+        if self.__extmarks is not None:
+            state = self.__buffers.get(self.vim.current.buffer.number)
+            if state is not None and state.words:
+                self.__extmarks.clear(state.number)
+                state.words = None
+
     def _kill(self, proc_pid):
         import psutil
 
@@ -831,17 +1644,9 @@ class Neotags(object):
                    and path not in self.vv('norecurse_dirs'))
 
         if recurse:
-            try:
-                with open(self.vv('settings_file'), 'r') as fp:
-                    projects = json.load(fp)
-
-            except (json.JSONDecodeError, FileNotFoundError):
-                # Just reset the projects file
-                projects = {}
-                with open(self.vv('settings_file'), 'w') as fp:
-                    fp.write('')
-
-            proj_path = get_project_path(projects, path)
+            with self.__stats.span('project'):
+                projects = self._projects()
+                proj_path = projects.find(path)
             if proj_path is not None:
                 path = proj_path
                 run = projects[path].get('run', 1)
@@ -853,11 +1658,19 @@ class Neotags(object):
         else:
             self._path_replace(File)
 
-        self.vim.command('let g:neotags_file = "%s"' %
-                         self.__tagfile, async_=True)
+        # Only when it changed, as every write makes the settings be reloaded.
+        if self.vv('file') != self.__tagfile:
+            self.vv('file', SET=self.__tagfile)
 
         return recurse, [path] + extra_dirs, run
 
+    def _projects(self):
+        """The ProjectRegistry of g:neotags_settings_file."""
+        path = self.vv('settings_file')
+        if self.__projects is None or self.__projects.path != path:
+            self.__projects = ProjectRegistry(path)
+        return self.__projects
+
     def _path_replace(self, path):
         if (sys.platform == 'win32'):
             # For some reason replace wouldn't work here. I have no idea why.
@@ -896,34 +1709,39 @@ class Neotags(object):
 
         return binary
 
-    def _update_vim_tagfile(self, tagfile, open_file):
+    def _update_vim_tagfile(self, tagfile):
+        """Make sure vim's 'tags' includes an uncompressed copy of `tagfile'.
+        The copy is only written again once the tags file's mtime or size
+        changed, and is replaced atomically.
+        """
         try:
-            if tagfile not in self.__tmp_cache:
-                tmpfile = open(self.vim.call('tempname'), 'wb')
-                self.__tmp_cache[tagfile] = {
-                    'fp': tmpfile,
-                    'name': tmpfile.name
-                }
-                tmpfile.write(open_file.read())
-                self.vim.command('set tags+=%s' % tmpfile.name, async_=True)
-            else:
-                if sys.platform == 'win32':
-                    tmpfile = open(self.__tmp_cache[tagfile]['name'], 'wb')
-                else:
-                    tmpfile = self.__tmp_cache[tagfile]['fp']
-                tmpfile.seek(0)
-                tmpfile.truncate(0)
-                tmpfile.flush()
-                tmpfile.write(open_file.read())
-
-            tmpfile.flush()
-            # On windows we must close the file or else it will be impossible
-            # to delete it when nvim itself closes.
-            if sys.platform == 'win32':
-                tmpfile.close()
+            st = os.stat(tagfile)
+        except OSError:
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        comp_type = self.vv('compression_type')
+        entry = self.__tmp_cache.get(tagfile)
+        if entry is None:
+            # An uncompressed tags file can be used as it is.
+            name = tagfile if comp_type is None else self.vim.call('tempname')
+            entry = self.__tmp_cache[tagfile] = {'name': name, 'stamp': None}
+            self.vim.command('set tags+=%s' % name, async_=True)
+
+        if entry['name'] == tagfile or entry['stamp'] == stamp:
+            return
 
-        except IOError as err:
+        dia.debug_start()
+        try:
+            with self.__stats.span('decompress'), \
+                    self._open(tagfile, 'rb', comp_type) as src:
+                with open(entry['name'] + NEWSUFFIX, 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+            os.replace(entry['name'] + NEWSUFFIX, entry['name'])
+            entry['stamp'] = stamp
+        except (IOError, EOFError) as err:
             dia.error("Unexpected io error: %s" % err)
+        dia.debug_end('Updated vim tags file %s' % entry['name'])
 
     def _open(self, filename, mode, comp_type, level=None, **kwargs):
         if comp_type not in ('gzip', 'lzma'):
@@ -945,9 +1763,9 @@ class Neotags(object):
         """
         try:
             if SET is None:
-                return self.vim.vars["neotags_" + varname]
+                return self.__settings[varname]
             else:
-                self.vim.vars["neotags_" + varname] = SET
+                self.__settings[varname] = SET
                 return SET
 
         except (NvimError, KeyError) as err:
@@ -966,9 +1784,10 @@ class Neotags(object):
         else:
             dia.inform_echo("Disabling neotags.")
             self.vv('enabled', SET=0)
-            self.__seen = []
-            self.__md5_cache = {}
-            self.__cmd_cache = {}
+            for state in self.__buffers:
+                if state.words:
+                    self.__extmarks.clear(state.number)
+            self.__buffers.reset()
             self.update(force=False)
 
     def toggle_C_bin(self):
@@ -979,6 +1798,9 @@ class Neotags(object):
                 self.vv('use_binary', SET=1)
         else:
             self.__neotags_bin = None
+            if self.__daemon is not None:
+                self.__daemon.close()
+                self.__daemon = None
             self.vv('use_binary', SET=0)
             dia.inform_echo("Switching to use python code.")
 
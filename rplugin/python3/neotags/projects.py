@@ -0,0 +1,103 @@
+import json
+import os
+
+# Key under which a node of the trie keeps the project rooted at it. Path
+# components are never empty, so it can't clash with one.
+ROOT = ''
+
+
+def components(path):
+    return [part for part in os.path.normpath(path).split(os.sep) if part]
+
+
+class ProjectRegistry:
+    """The saved project directories, read from `path' (see
+    g:neotags_settings_file) the first time they are needed and again only
+    once the file's mtime or size changed. The projects are also kept in a
+    trie of their path components, so that the project a path belongs to is
+    found with one step per component of the path, however many there are.
+    When projects are nested, the deepest one wins.
+
+    Changes are written to a temporary file which then replaces the old one,
+    so that a half-written file is never seen. A file that can't be decoded
+    is treated as if there were no projects, but left as it is.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__stamp = None
+        self.__projects = {}
+        self.__trie = {}
+
+    def __contains__(self, root):
+        self._load()
+        return root in self.__projects
+
+    def __getitem__(self, root):
+        self._load()
+        return self.__projects[root]
+
+    def find(self, path):
+        """Return the root of the deepest project containing `path', or
+        None.
+        """
+        self._load()
+        node = self.__trie
+        found = node.get(ROOT)
+        for part in components(path):
+            node = node.get(part)
+            if node is None:
+                break
+            found = node.get(ROOT, found)
+        return found
+
+    def add(self, root, project):
+        self._load()
+        self.__projects[root] = project
+        self._insert(root)
+        self.save()
+
+    def remove(self, root):
+        self._load()
+        self.__projects.pop(root)
+        self._build()
+        self.save()
+
+    def save(self):
+        tmp = self.path + '.new'
+        with open(tmp, 'w') as fp:
+            json.dump(self.__projects, fp)
+        os.replace(tmp, self.path)
+        self.__stamp = self._stat()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _load(self):
+        stamp = self._stat()
+        if stamp == self.__stamp:
+            return
+        self.__stamp = stamp
+
+        try:
+            with open(self.path, 'r') as fp:
+                projects = json.load(fp)
+        except (ValueError, OSError):
+            projects = {}
+        self.__projects = projects if isinstance(projects, dict) else {}
+        self._build()
+
+    def _build(self):
+        self.__trie = {}
+        for root in self.__projects:
+            self._insert(root)
+
+    def _insert(self, root):
+        node = self.__trie
+        for part in components(root):
+            node = node.setdefault(part, {})
+        node[ROOT] = root
@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+
+
+class Scheduler:
+    """Coalesces bursts of update requests. Requests are queued per buffer: a
+    request for a buffer that already has one waiting is merged into it (and
+    moved to the back of the queue) instead of being queued again, and the
+    queue is only run once no new request has arrived for `delay' seconds, so
+    the latest request always runs last. Only one request runs at a time. The
+    running one may poll superseded() to give up as soon as a newer request
+    for the same buffer comes in.
+
+    Everything except the debounce timer runs on the main loop.
+    """
+
+    def __init__(self, vim, run, delay):
+        self.vim = vim
+        self.run = run
+        self.delay = delay
+        self.__pending = OrderedDict()
+        self.__running = False
+        self.__timer = None
+
+    def request(self, bufnr, force):
+        force = self.__pending.pop(bufnr, False) or force
+        self.__pending[bufnr] = force
+
+        if self.__timer is not None:
+            self.__timer.cancel()
+        if self.delay <= 0:
+            self.vim.async_call(self._fire)
+        else:
+            self.__timer = threading.Timer(self.delay, self.vim.async_call,
+                                           (self._fire,))
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    def superseded(self, bufnr):
+        """Whether a newer request for `bufnr' is waiting."""
+        return bufnr in self.__pending
+
+    def discard(self, bufnr):
+        self.__pending.pop(bufnr, None)
+
+    def _fire(self):
+        if self.__running or not self.__pending:
+            return
+
+        bufnr, force = self.__pending.popitem(last=False)
+        self.__running = True
+        try:
+            self.run(bufnr, force)
+        finally:
+            self.__running = False
+            if self.__pending:
+                self.vim.async_call(self._fire)
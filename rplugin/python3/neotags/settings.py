@@ -0,0 +1,38 @@
+PREFIX = 'neotags_'
+
+
+class Settings:
+    """A snapshot of every g:neotags_* variable, so that reading a setting
+    never waits on nvim. They are all read in one go the first time one is
+    needed after the snapshot was invalidated, which happens whenever nvim
+    reports that one of them changed (see the dictwatcher in
+    plugin/neotags.vim) and on :NeotagsReload. Every reload bumps
+    `generation', so that whatever is derived from the settings can tell it
+    is out of date with a single comparison.
+    """
+
+    def __init__(self, vim, stats):
+        self.vim = vim
+        self.stats = stats
+        self.generation = 0
+        self.__values = None
+
+    def __getitem__(self, name):
+        if self.__values is None:
+            self.reload()
+        return self.__values[name]
+
+    def __setitem__(self, name, value):
+        self.vim.vars[PREFIX + name] = value
+        if self.__values is not None:
+            self.__values[name] = value
+
+    def invalidate(self):
+        self.__values = None
+
+    def reload(self):
+        with self.stats.span('settings'):
+            values = self.vim.api.eval(
+                "filter(copy(g:), {k, v -> stridx(k, '%s') == 0})" % PREFIX)
+        self.__values = {k[len(PREFIX):]: v for k, v in values.items()}
+        self.generation += 1
@@ -0,0 +1,176 @@
+import fnmatch
+import heapq
+import os
+import subprocess
+import tempfile
+import time
+
+# Directories ctags is never pointed at, on top of those excluded by the
+# --exclude arguments.
+VCS_DIRS = ('.git', '.hg', '.svn', '.bzr')
+# Below this many files per process, another process isn't worth starting.
+MIN_SHARD_FILES = 64
+
+
+class ShardedCtags:
+    """Indexes a project with several ctags processes at once. The files of
+    the project are listed up front (by `find_tool' when one is set, by
+    walking `paths' otherwise), split into batches of about equal total size
+    and fed to one ctags process each through `-L -'. As ctags sorts what it
+    writes, the outputs are merged back into one sorted tags file the same
+    way merge_tags() does.
+    """
+
+    def __init__(self, command, paths, jobs, find_tool=None, excludes=(),
+                 foldcase=False):
+        self.command = command
+        self.paths = paths
+        self.jobs = jobs
+        self.find_tool = find_tool
+        self.excludes = list(VCS_DIRS) + list(excludes)
+        self.foldcase = foldcase
+
+    def files(self, timeout=None):
+        """The files to index as (size, path) pairs."""
+        if self.find_tool:
+            out = subprocess.run(self.find_tool, shell=True, timeout=timeout,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL).stdout
+            names = (line for line in out.decode('utf-8', 'replace')
+                     .splitlines() if line)
+        else:
+            names = self._walk()
+
+        files = []
+        for name in names:
+            try:
+                files.append((os.stat(name).st_size, name))
+            except OSError:
+                pass
+        return files
+
+    def split(self, files):
+        """Split `files' into batches of about equal total size, biggest
+        files first so that no batch is left with one huge file at the end.
+        """
+        count = min(self.jobs, -(-len(files) // MIN_SHARD_FILES))
+        if count <= 1:
+            return [[name for _, name in files]]
+
+        heap = [(0, i) for i in range(count)]
+        batches = [[] for _ in range(count)]
+        for size, name in sorted(files, reverse=True):
+            total, i = heapq.heappop(heap)
+            batches[i].append(name)
+            heapq.heappush(heap, (total + size, i))
+        return batches
+
+    def run(self, log, timeout, silent_timeout, sinks):
+        """Index the project and write the merged tags to each of `sinks'.
+        Returns whether every ctags process ran to completion.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            files = self.files(timeout)
+        except subprocess.TimeoutExpired:
+            if silent_timeout == 0:
+                log.append((True, 'Listing the files to tag timed out!'))
+            return False
+
+        batches = self.split(files)
+        log.append((False, 'Running %d ctags processes on %d files' % (
+            len(batches), len(files))))
+
+        outputs, procs = [], []
+        try:
+            for batch in batches:
+                listing = tempfile.TemporaryFile()
+                listing.write(''.join(name + '\n' for name in batch)
+                              .encode('utf-8', 'surrogateescape'))
+                listing.seek(0)
+                out = tempfile.TemporaryFile()
+                err = tempfile.TemporaryFile()
+                outputs.append((out, err))
+                try:
+                    procs.append(subprocess.Popen(
+                        self.command, shell=True, stdin=listing, stdout=out,
+                        stderr=err))
+                except FileNotFoundError as error:
+                    log.append((True, 'failed to run Ctags %s' % error))
+                    return False
+                finally:
+                    listing.close()
+
+            for proc in procs:
+                try:
+                    proc.wait(max(deadline - time.monotonic(), 0))
+                except subprocess.TimeoutExpired:
+                    if silent_timeout == 0:
+                        log.append((True, 'Ctags process timed out!'))
+                    return False
+
+            errors = False
+            for _, err in outputs:
+                err.seek(0)
+                for e in err.read().decode('ascii', 'replace').splitlines():
+                    log.append((True, e))
+                    errors = True
+            log.append((errors, 'Ctags completed with errors' if errors
+                        else 'Ctags completed successfully'))
+
+            for out, _ in outputs:
+                out.seek(0)
+            for line in self._merge([out for out, _ in outputs]):
+                for sink in sinks:
+                    sink.write(line)
+            return True
+
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+            for out, err in outputs:
+                out.close()
+                err.close()
+
+    def _merge(self, outputs):
+        """Merge the sorted outputs, keeping the pseudo tags of the first."""
+        def tags(out):
+            return (line for line in out if not line.startswith(b'!_'))
+
+        key = bytes.lower if self.foldcase else None
+        return heapq.merge(outputs[0], *map(tags, outputs[1:]), key=key)
+
+    def _walk(self):
+        """The files below `paths', without those `excludes' matches. Like
+        ctags, a pattern is compared with the name of a file or directory,
+        and with its path, both as walked and relative to the path it was
+        found under, so that one such as `build/*' or `src/gen' works.
+        Symlinked directories are followed as ctags -R does, except for one
+        that leads back to a directory it is in.
+        """
+        def excluded(top, path):
+            candidates = (os.path.basename(path), path,
+                          os.path.relpath(path, top))
+            return any(fnmatch.fnmatch(candidate, pattern)
+                       for pattern in self.excludes
+                       for candidate in candidates)
+
+        for top in self.paths:
+            # The real paths of the directories above each one still to walk.
+            above = {top: {os.path.realpath(top)}}
+            for root, dirs, names in os.walk(top, followlinks=True):
+                parents = above.pop(root)
+                kept = []
+                for d in dirs:
+                    path = os.path.join(root, d)
+                    real = os.path.realpath(path)
+                    if real not in parents and not excluded(top, path):
+                        above[path] = parents | {real}
+                        kept.append(d)
+                dirs[:] = kept
+                for name in names:
+                    path = os.path.join(root, name)
+                    if not excluded(top, path):
+                        yield path
@@ -0,0 +1,128 @@
+import json
+import math
+import os
+import threading
+from collections import deque
+from time import perf_counter_ns
+
+# Histogram buckets per doubling of the duration, so each is about 19% wide.
+BUCKETS_PER_OCTAVE = 4
+# How many spans are kept for the trace at most, the oldest are dropped.
+MAX_EVENTS = 100000
+
+
+class Histogram:
+    """The durations of one stage, counted in logarithmic buckets so that
+    it takes the same room however long the session runs.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, duration):
+        bucket = int(math.log2(duration + 1) * BUCKETS_PER_OCTAVE)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def percentile(self, p):
+        """The upper bound of the bucket the p-th percentile falls in."""
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE) - 1,
+                           self.max)
+        return self.max
+
+
+class Span:
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *_):
+        self.stats.add(self.name, self.start, perf_counter_ns() - self.start)
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return None
+
+
+NULL_SPAN = NullSpan()
+
+
+class Stats:
+    """How long each stage of an update takes, over the whole session. A
+    stage is timed by running it in a `with stats.span(name):' block; while
+    the stats are disabled that hands out a span that does nothing, so the
+    spans can stay in place. The durations are kept in a Histogram per stage
+    for report(), and the latest MAX_EVENTS spans for export() as a trace
+    that chrome://tracing and Perfetto can show.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.__lock = threading.Lock()
+        self.__histograms = {}
+        self.__events = deque(maxlen=MAX_EVENTS)
+
+    def span(self, name):
+        return Span(self, name) if self.enabled else NULL_SPAN
+
+    def add(self, name, start, duration):
+        with self.__lock:
+            histogram = self.__histograms.get(name)
+            if histogram is None:
+                histogram = self.__histograms[name] = Histogram()
+            histogram.add(duration)
+            self.__events.append((name, start, duration,
+                                  threading.get_ident()))
+
+    def reset(self):
+        with self.__lock:
+            self.__histograms.clear()
+            self.__events.clear()
+
+    def report(self):
+        """One line per stage, in milliseconds."""
+        lines = ['%-20s %8s %10s %10s %10s %12s' % (
+            'stage', 'count', 'p50', 'p95', 'max', 'total')]
+        with self.__lock:
+            for name, hist in sorted(self.__histograms.items()):
+                lines.append('%-20s %8d %10.3f %10.3f %10.3f %12.3f' % (
+                    name, hist.count, hist.percentile(50) / 1e6,
+                    hist.percentile(95) / 1e6, hist.max / 1e6,
+                    hist.total / 1e6))
+        return lines
+
+    def export(self, path):
+        """Write the spans to `path' in the Chrome trace event format."""
+        pid = os.getpid()
+        with self.__lock:
+            events = [{'name': name, 'ph': 'X', 'ts': start / 1000,
+                       'dur': duration / 1000, 'pid': pid, 'tid': tid}
+                      for name, start, duration, tid in self.__events]
+
+        tmp = path + '.new'
+        with open(tmp, 'w') as fp:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp)
+        os.replace(tmp, path)
+        return len(events)
@@ -0,0 +1,61 @@
+import sys
+from collections import OrderedDict
+
+
+def candidates_size(candidates):
+    """Roughly how many bytes a {kind: [names]} dict takes up."""
+    size = sys.getsizeof(candidates)
+    for names in candidates.values():
+        size += sys.getsizeof(names) + sum(map(sys.getsizeof, names))
+    return size
+
+
+class TagCache:
+    """The tags of each tags file that may be highlighted in a buffer of some
+    filetype, grouped by kind, so that buffers sharing a tags file don't each
+    have to filter it again. Entries are stamped with the mtime and size of
+    the file they were read from and are only returned while those still
+    match. The least recently used entries are dropped once the cache holds
+    more than `max_size' bytes.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.__entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, key, stamp):
+        try:
+            entry_stamp, candidates, _ = self.__entries[key]
+        except KeyError:
+            return None
+        if entry_stamp != stamp:
+            self.discard(key)
+            return None
+
+        self.__entries.move_to_end(key)
+        return candidates
+
+    def put(self, key, stamp, candidates):
+        self.discard(key)
+        size = candidates_size(candidates)
+        if size > self.max_size:
+            return
+
+        self.__entries[key] = (stamp, candidates, size)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, _, old) = self.__entries.popitem(last=False)
+            self.size -= old
+
+    def discard(self, key):
+        entry = self.__entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def clear(self):
+        self.__entries.clear()
+        self.size = 0
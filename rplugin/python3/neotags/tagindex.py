@@ -0,0 +1,211 @@
+import os
+import sqlite3
+from collections import Counter
+
+INDEX_SUFFIX = '.idx'
+SCHEMA_VERSION = 2
+
+
+def split_tag_line(line):
+    """Return (name, file, kind, lang) for one tags line, or None if the line
+    is a pseudo tag or lacks either the kind or the language field.
+    """
+    fields = line.rstrip(b'\r\n').split(b'\t')
+    if len(fields) <= 3 or fields[0].startswith(b'!'):
+        return None
+
+    kind = lang = None
+    for field in fields[3:]:
+        if len(field) == 1:
+            kind = field
+        elif field.startswith(b'language:'):
+            lang = field[9:]
+
+    if kind is None or lang is None:
+        return None
+
+    return (fields[0], fields[1], kind.decode('ascii', errors='replace'),
+            lang.decode('ascii', errors='replace').lower())
+
+
+def query_kinds(order, equivalent):
+    """Map the raw ctags kinds that end up in `order' once `equivalent' has
+    been applied to the kind they are reported as.
+    """
+    kinds = {}
+    for kind in set(order) | set(equivalent or ()):
+        grp = kind if equivalent is None else equivalent.get(kind, kind)
+        if grp in order:
+            kinds[kind] = grp
+    return kinds
+
+
+def query_langs(key_lang):
+    """The lowercased language names matching `key_lang' (see find_tags)."""
+    key_lang = key_lang.lower()
+    if key_lang in ('c', 'c\\+\\+'):
+        return ('c', 'c++')
+    return (key_lang,)
+
+
+class TagIndex:
+    """A pre-parsed copy of a (possibly compressed) tags file, holding only
+    the name, file, kind and language of each tag in an sqlite database next
+    to the tags file. Queries by language and kind then cost time relative to
+    the number of matching tags rather than to the size of the tags file.
+
+    Every language has a generation that changes whenever its tags do, so a
+    slice of the index exported for one language is only written again once
+    that language's tags changed, however often the tags of others did.
+    """
+
+    def __init__(self, tagfile):
+        self.tagfile = tagfile
+        self.path = tagfile + INDEX_SUFFIX
+
+    def _connect(self, path=None):
+        return sqlite3.connect(self.path if path is None else path)
+
+    def is_fresh(self):
+        """Check that the index was built from the current tags file."""
+        try:
+            st = os.stat(self.tagfile)
+            con = self._connect()
+        except (OSError, sqlite3.Error):
+            return False
+
+        try:
+            row = con.execute(
+                'SELECT version, mtime, size FROM meta').fetchone()
+        except sqlite3.Error:
+            return False
+        finally:
+            con.close()
+
+        return row == (SCHEMA_VERSION, st.st_mtime_ns, st.st_size)
+
+    def build(self, lines):
+        """(Re)build the index from an iterable of raw tags lines. The new
+        index is written beside the old one and renamed into place, so
+        readers never see a half built database.
+        """
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+
+        con = self._connect(tmp)
+        try:
+            self._create(con)
+            con.executemany('INSERT INTO tags VALUES (?, ?, ?, ?)',
+                            filter(None, map(split_tag_line, lines)))
+            con.execute('CREATE INDEX tags_lang_kind ON tags (lang, kind)')
+            con.execute('CREATE INDEX tags_file ON tags (file)')
+            con.execute('INSERT INTO generations SELECT DISTINCT lang, 1 '
+                        'FROM tags')
+            self._stamp(con)
+            con.commit()
+        finally:
+            con.close()
+
+        os.replace(tmp, self.path)
+
+    def replace_file(self, filename, lines):
+        """Drop every tag belonging to `filename' and add those in `lines'.
+        Only the languages whose tags differ get a new generation.
+        """
+        rows = list(filter(None, map(split_tag_line, lines)))
+        con = self._connect()
+        try:
+            old = Counter(con.execute(
+                'SELECT name, file, kind, lang FROM tags WHERE file = ?',
+                (filename,)))
+            new = Counter(rows)
+            changed = {lang for _, _, _, lang in (old - new) + (new - old)}
+
+            con.execute('DELETE FROM tags WHERE file = ?', (filename,))
+            con.executemany('INSERT INTO tags VALUES (?, ?, ?, ?)', rows)
+            if changed:
+                generation, = con.execute(
+                    'SELECT coalesce(max(generation), 0) + 1 '
+                    'FROM generations').fetchone()
+                con.executemany('INSERT OR REPLACE INTO generations '
+                                'VALUES (?, ?)',
+                                [(lang, generation) for lang in changed])
+            self._stamp(con)
+            con.commit()
+        finally:
+            con.close()
+
+    def query(self, key_lang, order, equivalent, ignored_tags):
+        """Return the same list of entries find_tags() would for the tags
+        file, without ever reading it.
+        """
+        kinds = query_kinds(order, equivalent)
+        langs = query_langs(key_lang)
+        if not kinds:
+            return []
+
+        sql = 'SELECT name, kind FROM tags WHERE lang IN (%s) AND kind IN (%s) ORDER BY name' % (
+            ','.join('?' * len(langs)), ','.join('?' * len(kinds)))
+
+        con = self._connect()
+        try:
+            rows = con.execute(sql, (*langs, *kinds)).fetchall()
+        finally:
+            con.close()
+
+        ret = []
+        for name, kind in rows:
+            if name.decode('ascii', errors='replace') not in ignored_tags:
+                ret.append({'name': name,
+                            'kind': kinds[kind].encode('ascii')})
+        return ret
+
+    def export(self, dest, key_lang):
+        """Write the tags of one language to `dest' as an uncompressed tags
+        file (with an empty pattern field) for the C binary to read. The file
+        is only rewritten when the tags of the language changed since it was
+        last written.
+        """
+        langs = query_langs(key_lang)
+        marks = ','.join('?' * len(langs))
+        sql = 'SELECT name, file, kind, lang FROM tags WHERE lang IN (%s) ORDER BY name' % marks
+
+        con = self._connect()
+        try:
+            generation, = con.execute(
+                'SELECT max(generation) FROM generations WHERE lang IN (%s)'
+                % marks, langs).fetchone()
+            row = con.execute('SELECT generation FROM exports WHERE dest = ?',
+                              (dest,)).fetchone()
+            if row == (generation,) and os.path.exists(dest):
+                return dest
+
+            tmp = '%s.%d.tmp' % (dest, os.getpid())
+            with open(tmp, 'wb') as fp:
+                for name, File, kind, lang in con.execute(sql, langs):
+                    fp.write(b'%s\t%s\t\t%s\tlanguage:%s\n' % (
+                        name, File, kind.encode('ascii'),
+                        lang.encode('ascii')))
+            os.replace(tmp, dest)
+
+            con.execute('INSERT OR REPLACE INTO exports VALUES (?, ?)',
+                        (dest, generation))
+            con.commit()
+        finally:
+            con.close()
+        return dest
+
+    def _create(self, con):
+        con.execute('CREATE TABLE tags (name BLOB, file BLOB, kind TEXT, lang TEXT)')
+        con.execute('CREATE TABLE meta (version INTEGER, mtime INTEGER, size INTEGER)')
+        con.execute('CREATE TABLE generations (lang TEXT PRIMARY KEY, generation INTEGER)')
+        con.execute('CREATE TABLE exports (dest TEXT PRIMARY KEY, generation INTEGER)')
+
+    def _stamp(self, con):
+        st = os.stat(self.tagfile)
+        con.execute('DELETE FROM meta')
+        con.execute('INSERT INTO meta VALUES (?, ?, ?)',
+                    (SCHEMA_VERSION, st.st_mtime_ns, st.st_size))
@@ -0,0 +1,163 @@
+import heapq
+import multiprocessing
+import os
+import sys
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+
+from neotags.utils import find_tags
+
+# The least a process is given to parse at a time, about 80ms of find_tags().
+MIN_RANGE = 4 * 1024 * 1024
+# Roughly how much bigger a tags file is uncompressed, to guess how long a
+# compressed one takes to parse before it has been read.
+EXPANSION = 5
+
+
+class _Log:
+    """Keeps what find_tags() reports in a worker for the plugin to pass on,
+    as only the plugin host may talk to nvim.
+    """
+
+    def __init__(self):
+        self.errors = []
+
+    def error(self, msg):
+        self.errors.append(msg)
+
+
+def find_candidates(data, query):
+    """The tags find_tags() finds in `data' for `query', the rest of its
+    arguments, as ({kind: [names]}, [errors]).
+    """
+    log = _Log()
+    candidates = {}
+    for tag in find_tags(log, data, *query):
+        candidates.setdefault(tag['kind'], []).append(tag['name'])
+    return candidates, log.errors
+
+
+def _parse_range(path, start, end, query):
+    """Parse the lines of `path' that start in the bytes [start, end)."""
+    with open(path, 'rb') as fp:
+        if start:
+            # The line that starts right at `start' is ours, one that runs
+            # into it belongs to the range before.
+            fp.seek(start - 1)
+            fp.readline()
+        pos = fp.tell()
+        data = b''
+        if pos < end:
+            data = fp.read(end - pos)
+            if not data.endswith(b'\n'):
+                data += fp.readline()
+    return find_candidates(data, query)
+
+
+def _read(opener, path, comp_type):
+    with opener(path, 'rb', comp_type) as fp:
+        return fp.read()
+
+
+class TagPool:
+    """Runs find_tags() over large tags files in `jobs' processes. A plain
+    tags file is cut into byte ranges that each process reads and parses by
+    itself, so the file never has to pass through the plugin host. A
+    compressed one is uncompressed by a thread first (zlib and lzma let go of
+    the GIL while they work, so several files are read at once) and its
+    lines are then handed out in as many parts. As find_tags() sorts the
+    tags of each part, they are merged back into the order it gives the whole
+    file.
+    """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.__processes = None
+        self.__threads = None
+
+    def worthwhile(self, sources):
+        """Whether `sources', as given to parse(), take long enough to parse
+        to be split up.
+        """
+        if self.jobs <= 1:
+            return False
+        size = 0
+        for path, comp_type in sources:
+            size += os.path.getsize(path) * (1 if comp_type is None else
+                                             EXPANSION)
+        return size > MIN_RANGE
+
+    def ranges(self, size):
+        if not size:
+            return []
+        count = max(1, min(self.jobs, size // MIN_RANGE))
+        step = -(-size // count)
+        return [(start, min(start + step, size))
+                for start in range(0, size, step)]
+
+    def parse(self, sources, query, opener):
+        """Find the tags of `query' (the arguments of find_tags() after the
+        data) in each of `sources', a list of (path, compression type)
+        pairs. The type is None for a plain file; the others are read by
+        `opener(path, mode, comp_type)'. Returns a ({kind: [names]},
+        [errors]) pair per source.
+        """
+        processes = self._processes()
+        parts = [[] for _ in sources]
+        reads = {}
+        for i, (path, comp_type) in enumerate(sources):
+            if comp_type is None:
+                for start, end in self.ranges(os.path.getsize(path)):
+                    parts[i].append(processes.submit(
+                        _parse_range, path, start, end, query))
+            else:
+                reads[self._threads().submit(
+                    _read, opener, path, comp_type)] = i
+
+        for future in as_completed(reads):
+            data = future.result()
+            pos = 0
+            for _, end in self.ranges(len(data)):
+                if end <= pos:
+                    continue
+                end = data.find(b'\n', end - 1) + 1 or len(data)
+                parts[reads[future]].append(processes.submit(
+                    find_candidates, data[pos:end], query))
+                pos = end
+
+        results = []
+        for futures in parts:
+            pieces = {}
+            errors = []
+            for future in futures:
+                found, logged = future.result()
+                for kind, names in found.items():
+                    pieces.setdefault(kind, []).append(names)
+                errors.extend(logged)
+            candidates = {kind: list(heapq.merge(*names))
+                          for kind, names in pieces.items()}
+            results.append((candidates, errors))
+        return results
+
+    def shutdown(self):
+        for pool in (self.__processes, self.__threads):
+            if pool is not None:
+                pool.shutdown(wait=False)
+        self.__processes = self.__threads = None
+
+    def _processes(self):
+        if self.__processes is None:
+            # The workers are started afresh rather than forked from the
+            # plugin host and its threads, and have to import this package
+            # from the directory the host loaded it from.
+            root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            if root not in sys.path:
+                sys.path.append(root)
+            self.__processes = ProcessPoolExecutor(
+                self.jobs, mp_context=multiprocessing.get_context('spawn'))
+        return self.__processes
+
+    def _threads(self):
+        if self.__threads is None:
+            self.__threads = ThreadPoolExecutor(self.jobs)
+        return self.__threads
@@ -1,26 +1,19 @@
-import bisect
-import json
+import heapq
 import re
 import os.path
 
+from neotags.tagindex import query_kinds, query_langs
 
-def do_set_base(dia, settings_file, args):
-    try:
-        with open(settings_file, 'r') as fp:
-            projects = json.load(fp)
-    except (json.JSONDecodeError, FileNotFoundError):
-        projects = {}
 
+def do_set_base(dia, projects, args):
     path, run_ctags = args
     path = os.path.realpath(path)
     if os.path.exists(path):
         if path not in projects:
-            projects[path] = {
+            projects.add(path, {
                 'run': run_ctags,
                 'extra_dirs': [],
-            }
-            with open(settings_file, 'w') as fp:
-                json.dump(projects, fp)
+            })
             dia.inform_echo("Saved directory '%s' as a project base." % path)
         else:
             dia.error("Error: directory '%s' is already saved as a project base." % path)
@@ -28,40 +21,18 @@ def do_set_base(dia, settings_file, args):
         dia.error("Error: directory '%s' does not exist." % path)
 
 
-def do_remove_base(dia, settings_file, args):
-    try:
-        with open(settings_file, 'r') as fp:
-            projects = json.load(fp)
-    except (json.JSONDecodeError, FileNotFoundError):
-        return
-
+def do_remove_base(dia, projects, args):
     path = os.path.realpath(args[0])
 
     if path in projects:
-        projects.pop(path)
-        with open(settings_file, 'w') as fp:
-            json.dump(projects, fp)
+        projects.remove(path)
         dia.inform_echo("Removed directory '%s' from project list." % path)
     else:
         dia.inform_echo("Error: directory '%s' is not a known project base." % path)
 
-def get_project_path(projects, path):
-    for proj_path in projects:
-        if os.path.commonpath([path, proj_path]) == proj_path:
-            return proj_path
-
-    return None
-
-def do_add_extra_dir(dia, settings_file, args):
-    try:
-        with open(settings_file, 'r') as fp:
-            projects = json.load(fp)
-
-    except (json.JSONDecodeError, FileNotFoundError):
-        projects = {}
-
+def do_add_extra_dir(dia, projects, args):
     path, extra_dir = args
-    path = get_project_path(projects, os.path.realpath(path))
+    path = projects.find(os.path.realpath(path))
     extra_dir = os.path.realpath(extra_dir)
 
     if path is not None:
@@ -69,24 +40,16 @@ def do_add_extra_dir(dia, settings_file, args):
         if extra_dir not in extra_dirs:
             extra_dirs.append(extra_dir)
             projects[path]['extra_dirs'] = extra_dirs
-            with open(settings_file, 'w') as fp:
-                json.dump(projects, fp)
+            projects.save()
             dia.inform_echo("Added directory '%s' to project '%s'." % (extra_dir, path))
         else:
             dia.error("Error: directory '%s' is already added to project '%s'." % (extra_dir, path))
     else:
         dia.inform_echo("Error: directory '%s' is not a known project base." % path)
 
-def do_remove_extra_dir(dia, settings_file, args):
-    try:
-        with open(settings_file, 'r') as fp:
-            projects = json.load(fp)
-
-    except (json.JSONDecodeError, FileNotFoundError):
-        return
-
+def do_remove_extra_dir(dia, projects, args):
     path, extra_dir = args
-    path = get_project_path(projects, os.path.realpath(path))
+    path = projects.find(os.path.realpath(path))
     extra_dir = os.path.realpath(extra_dir)
 
     if path is not None:
@@ -94,8 +57,7 @@ def do_remove_extra_dir(dia, settings_file, args):
         if extra_dir in extra_dirs:
             extra_dirs.remove(extra_dir)
             projects[path]['extra_dirs'] = extra_dirs
-            with open(settings_file, 'w') as fp:
-                json.dump(projects, fp)
+            projects.save()
             dia.inform_echo("Removed directory '%s' from project '%s'." % (extra_dir, path))
         else:
             dia.error("Error: directory '%s' is not present in project '%s'." % (extra_dir, path))
@@ -103,163 +65,230 @@ def do_remove_extra_dir(dia, settings_file, args):
         dia.inform_echo("Error: directory '%s' is not a known project base." % path)
 
 def find_tags(dia, matches, key_lang, order, ignored_tags, equivalent):
+    """Find every tag in the raw tags file `matches' of the language
+    `key_lang' whose kind (after `equivalent' has been applied) is in `order'
+    and whose name is not in `ignored_tags'. A single regex finds the
+    `language:' fields of the wanted language across the whole buffer, so only
+    the lines that contain one are ever split.
+    """
     ret = []
-    key_lang = key_lang.lower()
+    kinds = query_kinds(order, equivalent)
+    langs = {x.encode('ascii', errors='replace') for x in query_langs(key_lang)}
+    if not kinds:
+        return ret
+
+    pattern = re.compile(rb'\tlanguage:(?i:%s)(?=[\t\n]|\Z)' % (
+        b'|'.join(re.escape(lang) for lang in langs)))
+    last = -1
+
+    for match in pattern.finditer(matches):
+        start = matches.rfind(b'\n', 0, match.start()) + 1
+        if start == last:
+            continue
+        last = start
+        end = matches.find(b'\n', match.end())
+        line = matches[start:] if end < 0 else matches[start:end]
 
-    for line in matches.split(b'\n'):
         line = line.split(b'\t')
         if len(line) <= 3 or line[0] == b'!':
             continue
-        entry = {}
-        entry['name'] = line[0]
+
+        kind = lang = None
         for field in line[3:]:
             if len(field) == 1:
-                entry['kind'] = field
+                kind = field
             elif field.startswith(b'language:'):
-                entry['lang'] = field[9:]
-
-        contains = lambda a, x: all(map(lambda y: y in a, x))
-
-        if contains(entry, ('lang', 'kind')):
-            grp = entry['kind'].decode('ascii')
-            grp = grp if equivalent is None else \
-                  grp if grp not in equivalent else \
-                  equivalent[grp]
-
-            entry['kind'] = bytes(grp, 'ascii')
-            entry_lang = entry['lang'].decode('ascii', errors='replace').lower()
-            entry_name = entry['name'].decode('ascii', errors='replace')
-
-            if (grp in order
-                    and (key_lang == entry_lang
-                            or (key_lang   in ('c', 'c\\+\\+') and
-                                entry_lang in ('c', 'c++')))
-                    and entry_name not in ignored_tags):
-                ret.append(entry)
-        else:
+                lang = field[9:]
+
+        if lang is None or lang.lower() not in langs:
+            continue
+        if kind is None:
             dia.error("No lang/kind")
+            continue
+
+        grp = kinds.get(kind.decode('ascii', errors='replace'))
+        if (grp is not None and line[0].decode('ascii', errors='replace')
+                not in ignored_tags):
+            ret.append({'name': line[0],
+                        'kind': bytes(grp, 'ascii'),
+                        'lang': lang})
 
     return sorted(ret, key=lambda x: x['name'])
 
 
-def strip_c(buf, dia):
-    """This is the ugliest python function I've ever written and I'm ashamed
-    that it exists. Can you tell that it's an almost line for line translation
-    of a C program? The two embedded functions were macros.
+def merge_tags(old, new, filename, foldcase=False):
+    """Merge the sorted tags lines in `new' into the sorted tags lines in
+    `old', dropping every old line that belongs to `filename'. The result is
+    a generator so the tags file never has to be held in memory at once.
     """
-    pos = bytes(buf, 'ascii', errors='replace')
-    single_q = double_q = slash = escape = skip = False
-    space = 0
-    buf = bytearray(len(pos) + 1)
-    buf[0] = ord(b' ')
-    i, x = 0, 1
-
-    def check_quote(tocheck, other):
-        nonlocal skip, escape
-        if not other:
-            if tocheck:
-                if not escape:
-                    tocheck = False
-                    skip = True
-            else:
-                tocheck = True
-
-        return tocheck, other
-
-    def QUOTE():
-        nonlocal double_q, single_q
-        return double_q or single_q
-
-    while i < len(pos):
-        ch = chr(pos[i])
-        if ch == '/':
-            if not QUOTE():
-                if slash:
-                    x -= 1
-                    end = i + pos[i:].find(b'\n')
-                    if end < 0:
-                        dia.error("Failed to find end of comment")
-                        return
-                    while pos[end - 1] == '\\':
-                        end = pos[end+1:].find(b'\n')
-                    i = end
-                    if chr(buf[x-1]) == '\n':
-                        skip = True
-                else:
-                    slash = True
-
-        elif ch == '*':
-            if not QUOTE() and slash:
-                x -= 1
-                end = i + pos[i:].find(b'*/')
-                if end < 0:
-                    dia.error("Failed to find end of comment")
-                    return
-                i = end + 2
-                try:
-                    ch = chr(pos[i])
-                except IndexError:
-                    break
-                if ch == '\n' and chr(buf[x-1]) == '\n':
-                    skip = True
-                slash = False
-
-        elif ch == '\n':
-            if not escape:
-                slash = double_q = False
-                if (chr(buf[x-1]) == '\n'):
-                    skip = True
-
-        elif ch == '#':
-            slash = False
-            endln = i + pos[i+1:].find(b'\n')
-            if chr(buf[x-1]) == '\n' and endln > 0:
-                tmp = i + 1
-                if chr(pos[i+1]).isspace():
-                    while chr(pos[tmp]).isspace() and tmp < endln:
-                        tmp += 1
-                thing = bytes(pos[tmp:tmp + 7])
-                if thing == b'include':
-                    i = endln + 2
-                    continue
-
-        elif ch == '\\':
-            pass
-
-        elif ch == '"':
-            double_q, single_q = check_quote(double_q, single_q)
-            slash = False
-
-        elif ch == "'":
-            single_q, double_q = check_quote(single_q, double_q)
-            slash = False
+    def keep(line):
+        fields = line.split(b'\t', 2)
+        return len(fields) < 3 or fields[1] != filename
 
-        else:
-            slash = False
+    def terminate(line):
+        return line if line.endswith(b'\n') else line + b'\n'
 
-        escape = not escape if (ch == '\\') else False
-        skip   = True       if (skip)       else (ch.isspace() and chr(buf[x-1]) == '\n')
-        space  = space + 1  if (ch.isspace() and not skip) else 0
+    key = bytes.lower if foldcase else None
+    return heapq.merge(map(terminate, filter(keep, old)),
+                       sorted(new, key=key), key=key)
 
-        if skip:
-            skip = False
-        elif not QUOTE() and space < 2:
-            buf[x] = ord(ch)
-            x += 1
 
-        i += 1
+# Everything strip_c() removes from a C-like buffer. The alternatives are
+# tried left to right at each position, so whichever construct starts first
+# wins (a quote inside a comment is part of the comment and vice versa).
+# Unterminated comments and character literals run to the end of the buffer,
+# unterminated strings to the end of the line.
+_C_JUNK = re.compile(rb'''
+      //[^\n]*
+    | /\*.*?(?:\*/|\Z)
+    | "(?:[^"\\\n]|\\.)*(?:"|$)
+    | '(?:[^'\\]|\\.)*(?:'|\Z)
+    | ^[ \t]*\#[ \t]*include[^\n]*
+''', re.M | re.S | re.X)
 
-    return bytes(buf[:x])
+
+def strip_c(buf, dia):
+    """Blank out comments, string and character literals and #include lines
+    from a C-like buffer so that their contents aren't mistaken for
+    identifiers. This is one linear regex pass over the buffer.
+    """
+    return _C_JUNK.sub(b' ', bytes(buf, 'ascii', errors='replace'))
+
+
+# The same for a single line. A block comment that is still open at the end of
+# the line is matched by `open' so the caller can carry it over to the next.
+_C_LINE_JUNK = re.compile(rb'''
+      //.*
+    | /\*.*?\*/
+    | (?P<open>/\*.*)
+    | "(?:[^"\\]|\\.)*(?:"|$)
+    | '(?:[^'\\]|\\.)*(?:'|$)
+    | ^[ \t]*\#[ \t]*include.*
+''', re.X)
+
+
+def strip_c_line(line, in_comment):
+    """Like strip_c() for one line of a buffer, except that whatever is
+    removed is replaced by as many spaces so that the columns of what is left
+    don't change. `in_comment' says whether the line starts inside a block
+    comment. Returns the stripped line and whether it ends inside one.
+    """
+    if in_comment:
+        end = line.find(b'*/')
+        if end < 0:
+            return b'', True
+        line = b' ' * (end + 2) + line[end + 2:]
+
+    parts = []
+    pos = 0
+    in_comment = False
+    for match in _C_LINE_JUNK.finditer(line):
+        parts.append(line[pos:match.start()])
+        parts.append(b' ' * (match.end() - match.start()))
+        pos = match.end()
+        in_comment = match.lastgroup == 'open'
+    parts.append(line[pos:])
+
+    return b''.join(parts), in_comment
 
 
 def tokenize(buf, dia):
-    split = list(set(re.split(b'\W', buf)))
-    return split
+    return set(re.split(b'\W', buf))
+
+
+# The characters that are special in a magic vim pattern between slashes.
+_VIM_SPECIAL = re.compile(r'[.*^$/\\~\[\]]')
+_VIM_ESCAPED = {char: '\\' + char for char in '.*^$/\\~[]'}
+_WORD_CHARS = frozenset('abcdefghijklmnopqrstuvwxyz'
+                        'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+
 
+def vim_escape(name):
+    return _VIM_SPECIAL.sub(r'\\\g<0>', name)
 
-def bindex(a, x):
-    """Locate the leftmost value exactly equal to x"""
-    i = bisect.bisect_left(a, x)
-    if i != len(a) and a[i] == x:
-        return i
-    return (-1)
+
+def _trie(names):
+    """A dict per prefix of `names', keyed by the next character. The key ''
+    marks that the prefix is a name itself.
+    """
+    root = {}
+    for name in names:
+        node = root
+        for char in name:
+            node = node.setdefault(char, {})
+        node[''] = None
+    return root
+
+
+def _trie_pattern(node):
+    """The vim pattern matching exactly the names below `node', with their
+    common prefixes factored out: get\\%(Name\\|Value\\)\\=.
+    """
+    chars = []
+    alternatives = []
+    for char in sorted(key for key in node if key):
+        child = node[char]
+        if char in _WORD_CHARS and child.keys() == {''}:
+            chars.append(char)
+            continue
+        # Follow a run of single children without recursing.
+        run = [_VIM_ESCAPED.get(char, char)]
+        while len(child) == 1 and '' not in child:
+            char, child = next(iter(child.items()))
+            run.append(_VIM_ESCAPED.get(char, char))
+        alternatives.append(''.join(run) + _trie_pattern(child))
+
+    if len(chars) == 1:
+        alternatives.insert(0, chars[0])
+    elif chars:
+        alternatives.insert(0, '[%s]' % ''.join(chars))
+
+    optional = '' in node
+    if not alternatives:
+        return ''
+    if len(alternatives) == 1:
+        pattern = alternatives[0]
+        if not optional:
+            return pattern
+        if len(pattern) == 1 or pattern[0] == '[' or (
+                len(pattern) == 2 and pattern[0] == '\\'):
+            # A single character or class needs no group.
+            return pattern + r'\='
+    else:
+        pattern = r'\|'.join(alternatives)
+    return r'\%(' + pattern + r'\)' + (r'\=' if optional else '')
+
+
+def _trie_split(node, prefix, budget):
+    pattern = _trie_pattern(node)
+    if len(prefix) + len(pattern) <= budget:
+        yield prefix + pattern
+        return
+    if '' in node:
+        yield prefix
+    for char in sorted(key for key in node if key):
+        yield from _trie_split(node[char], prefix + vim_escape(char), budget)
+
+
+def trie_patterns(names, budget):
+    """Vim alternations matching exactly `names', for \\%(...\\) groups.
+    Names are factored by their common prefixes so the regex engine tries
+    each character once instead of once per name. Every alternation is at
+    most `budget' characters long, unless a single name is longer; a prefix
+    whose names don't fit is split into one alternative per next character.
+    """
+    chunks = []
+    chunk = []
+    size = 0
+    root = _trie(names)
+    for char in sorted(key for key in root if key):
+        for pattern in _trie_split(root[char], vim_escape(char), budget):
+            if chunk and size + len(pattern) > budget:
+                chunks.append(r'\|'.join(chunk))
+                chunk = []
+                size = 0
+            chunk.append(pattern)
+            size += len(pattern) + 2
+    if chunk:
+        chunks.append(r'\|'.join(chunk))
+    return chunks
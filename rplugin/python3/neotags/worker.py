@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+
+
+class Worker:
+    """Runs jobs on a single background thread so that nothing slow (ctags,
+    compression, indexing) ever blocks the plugin host. Jobs are keyed by the
+    tags file they produce and, for a job that only redoes one part of it
+    (the tags of a single file), that part. Submitting a job for a key and
+    part that is still waiting replaces the waiting one instead of queueing
+    the same work twice. A job for the whole key makes the waiting jobs for
+    its parts unnecessary, so they are dropped, and a job for a part is
+    dropped while one for the whole is waiting.
+
+    A job is called as job(log) where `log' is a list to which it may append
+    (is_error, message) pairs, since nvim must not be touched from the worker
+    thread. Once it returns, done(log, result) is scheduled on the main loop
+    through vim.async_call. If the job raised, `result' is the exception.
+    """
+
+    def __init__(self, vim):
+        self.vim = vim
+        self.__lock = threading.Lock()
+        self.__pending = OrderedDict()
+        self.__running = None
+        self.__thread = None
+
+    def submit(self, key, job, done, part=None):
+        with self.__lock:
+            if part is None:
+                for pending in [k for k in self.__pending if k[0] == key]:
+                    del self.__pending[pending]
+            elif (key, None) in self.__pending:
+                return
+            self.__pending.pop((key, part), None)
+            self.__pending[key, part] = (job, done)
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self._run, daemon=True)
+                self.__thread.start()
+
+    def busy(self, key):
+        with self.__lock:
+            return ((self.__running is not None and
+                     self.__running[0] == key) or
+                    any(k[0] == key for k in self.__pending))
+
+    def _run(self):
+        while True:
+            with self.__lock:
+                if not self.__pending:
+                    self.__running = self.__thread = None
+                    return
+                key, (job, done) = self.__pending.popitem(last=False)
+                self.__running = key
+
+            log = []
+            try:
+                result = job(log)
+            except Exception as err:
+                result = err
+
+            self.vim.async_call(done, log, result)
@@ -0,0 +1,34 @@
+from neotags.bufstate import BufferStates
+
+
+def test_least_recently_used_buffers_are_evicted():
+    evicted = []
+    states = BufferStates(2, lambda state: evicted.append(state.number))
+    for number in (1, 2, 3):
+        states.use(number)
+    states.use(1)
+    states.use(4)
+    assert evicted == [2]
+    assert [state.number for state in states] == [3, 1, 4]
+    assert states.get(2) is None
+
+
+def test_forgotten_buffers_are_not_evicted():
+    evicted = []
+    states = BufferStates(1, lambda state: evicted.append(state.number))
+    state = states.use(1)
+    assert states.forget(1) is state
+    assert states.forget(1) is None
+    for number in (2, 3, 4):
+        states.use(number)
+    assert evicted == [2]
+    assert len(states) == 2
+
+
+def test_use_keeps_the_state():
+    states = BufferStates(5)
+    state = states.use(1)
+    state.parsed = True
+    assert states.use(1) is state
+    states.reset()
+    assert not state.parsed and states.get(1) is state
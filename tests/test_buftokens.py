@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+from neotags.buftokens import BufferTokens
+
+PIECES = ['foo', 'bar_1', 'Baz', '/*', '*/', '//', '"', "'x'", ' ', ' ', '(',
+          ';', '\\']
+
+
+def random_lines(rng, count):
+    return [''.join(rng.choice(PIECES) for _ in range(rng.randrange(8)))
+            for _ in range(count)]
+
+
+def same(tokens, lines, strip):
+    fresh = BufferTokens(lines, 0, strip)
+    assert tokens.lines == fresh.lines
+    assert (list(tokens.words(0, len(lines)))
+            == list(fresh.words(0, len(lines))))
+    assert tokens._BufferTokens__counts == fresh._BufferTokens__counts
+    assert tokens._BufferTokens__starts == fresh._BufferTokens__starts
+
+
+@pytest.mark.parametrize('strip', [False, True])
+def test_edits_give_the_same_tokens_as_starting_over(strip):
+    rng = random.Random(7)
+    for _ in range(50):
+        lines = random_lines(rng, rng.randrange(1, 20))
+        tokens = BufferTokens(lines, 1, strip)
+        for tick in range(2, 30):
+            first = rng.randrange(len(lines) + 1)
+            last = rng.randrange(first, len(lines) + 1)
+            data = random_lines(rng, rng.randrange(4))
+            tokens.on_lines(tick, first, last, data)
+            lines[first:last] = data
+            same(tokens, [line.encode() for line in lines], strip)
+
+
+def test_old_events_are_ignored():
+    tokens = BufferTokens(['foo'], 5, False)
+    tokens.on_lines(4, 0, 1, ['bar'])
+    assert b'foo' in tokens and b'bar' not in tokens
+
+
+def test_set_strip():
+    tokens = BufferTokens(['/* foo */ bar'], 1, False)
+    assert b'foo' in tokens
+    tokens.set_strip(True)
+    assert b'foo' not in tokens and b'bar' in tokens
@@ -0,0 +1,121 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from neotags.buftokens import BufferTokens
+from neotags.extmark import ExtmarkBackend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOTIN = ['.*String.*', '.*Comment.*']
+
+
+class Api:
+    def create_namespace(self, name):
+        return 1
+
+
+class Vim:
+    api = Api()
+
+
+def lines_of(calls):
+    return sorted({args[3] for name, args in calls
+                   if name == 'nvim_buf_add_highlight'})
+
+
+def setup():
+    tokens = BufferTokens([b'foo bar'] * 1000, 1, False)
+    return ExtmarkBackend(Vim()), tokens, {b'foo': 'Group'}
+
+
+def test_place_only_highlights_the_range():
+    backend, tokens, words = setup()
+    calls, marked = backend.place(1, tokens, words, None, 100, 200)
+    assert calls[0] == ['nvim_buf_clear_namespace', [1, 1, 0, -1]]
+    assert lines_of(calls) == list(range(100, 200))
+    assert marked == (100, 200)
+
+
+def test_place_extends_an_adjoining_range():
+    backend, tokens, words = setup()
+    calls, marked = backend.place(1, tokens, words, (100, 200), 150, 260)
+    assert lines_of(calls) == list(range(200, 260))
+    assert marked == (100, 260)
+
+    calls, marked = backend.place(1, tokens, words, marked, 120, 180)
+    assert calls == []
+    assert marked == (100, 260)
+
+
+def test_place_starts_over_far_away():
+    backend, tokens, words = setup()
+    calls, marked = backend.place(1, tokens, words, (100, 200), 500, 600)
+    assert calls[0] == ['nvim_buf_clear_namespace', [1, 1, 0, -1]]
+    assert lines_of(calls) == list(range(500, 600))
+    assert marked == (500, 600)
+
+
+def test_shift():
+    shift = ExtmarkBackend.shift
+    # Two lines inserted above, below and inside.
+    assert shift((100, 200), 10, 10, 2) == (102, 202)
+    assert shift((100, 200), 300, 300, 2) == (100, 200)
+    assert shift((100, 200), 150, 150, 2) == (100, 202)
+    # Ten lines deleted across the start.
+    assert shift((100, 200), 95, 105, 0) == (95, 190)
+
+
+class SyntaxVim(Vim):
+    """Answers NeotagsNotin() as nvim would, by running it in vim on
+    `lines' with the syntax of `ft'.
+    """
+
+    def __init__(self, tmp_path, lines, ft):
+        self.tmp_path = tmp_path
+        self.lines = lines
+        self.ft = ft
+        self.asked = []
+
+    def call(self, name, positions, pattern):
+        self.asked.append(positions)
+        with open(os.path.join(ROOT, 'plugin', 'neotags.vim')) as fp:
+            function = re.search(r'^function! %s\(.*?^endfunction$' % name,
+                                 fp.read(), re.M | re.S).group()
+        buffer = self.tmp_path / ('buffer.' + self.ft)
+        buffer.write_text('\n'.join(self.lines) + '\n')
+        out = self.tmp_path / 'out.json'
+        script = self.tmp_path / 'script.vim'
+        script.write_text('\n'.join([
+            function, 'syntax on', 'edit ' + str(buffer),
+            'call writefile([json_encode(%s(%s, %s))], %s)' % (
+                name, json.dumps(positions), json.dumps(pattern),
+                json.dumps(str(out))),
+            'qa!', '']))
+        subprocess.run(['vim', '-N', '-u', 'NONE', '-i', 'NONE', '-es',
+                        '-S', str(script)], timeout=30, check=False)
+        return json.loads(out.read_text())
+
+
+@pytest.mark.skipif(shutil.which('vim') is None, reason='needs vim')
+def test_names_in_strings_and_comments_are_skipped(tmp_path):
+    lines = ['x = foo()  # foo is called', 's = "foo"', "foo = 'bar'"]
+    vim = SyntaxVim(tmp_path, lines, 'py')
+    backend = ExtmarkBackend(vim, NOTIN)
+    tokens = BufferTokens(lines, 1, False)
+    calls = backend.calls(1, tokens, {b'foo': 'Group'})
+    assert [args[3:] for name, args in calls[1:]] == [[0, 4, 7], [2, 0, 3]]
+    # One question for the whole range.
+    assert len(vim.asked) == 1
+
+
+def test_nothing_is_asked_without_notin():
+    backend, tokens, words = setup()
+    assert backend.notin is None
+    assert not backend.set_notin([])
+    assert backend.set_notin(NOTIN)
+    assert not backend.set_notin(NOTIN)
+    assert backend.notin == r'^\%(.*String.*\|.*Comment.*\)$'
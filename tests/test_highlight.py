@@ -0,0 +1,108 @@
+import os
+import re
+import sys
+import time
+
+from bench.stages import Session
+from neotags import NeotagsHandlers
+
+GROUP = '_Neotags_c_f_cFunctionTag'
+
+
+def write_tags(path, names, source='buffer.c'):
+    with open(path, 'w') as fp:
+        fp.write('!_TAG_FILE_SORTED\t1\t//\n')
+        for name in sorted(names):
+            fp.write('%s\t%s\t/^int %s(void)$/;"\tf\tlanguage:C\n'
+                     % (name, source, name))
+
+
+def group_cmds(session):
+    return [cmd for cmd in session.nvim.commands if GROUP in cmd]
+
+
+def retag(session, path, names, force=False):
+    write_tags(path, names)
+    session.nvim.commands.clear()
+    session.neotags._Neotags__buffers.get(1).parsed = False
+    session.neotags.update(force)
+    return group_cmds(session)
+
+
+def start(tmp_path, names):
+    tags = str(tmp_path / 'tags')
+    write_tags(tags, names)
+    lines = [' '.join('fn%d' % i for i in range(20)) + ';']
+    session = Session(str(tmp_path), tags, 'c', lines)
+    assert group_cmds(session)[0].startswith('silent! syntax clear')
+    return session, tags
+
+
+def test_new_names_extend_the_group(tmp_path):
+    names = ['fn%d' % i for i in range(10)]
+    session, tags = start(tmp_path, names)
+    assert retag(session, tags, names + ['fn10', 'fn11']) == [
+        'syntax keyword %s fn10 fn11' % GROUP]
+    # Nothing changed, nothing is sent.
+    assert retag(session, tags, names + ['fn10', 'fn11']) == []
+
+
+def test_removed_names_rebuild_the_group(tmp_path):
+    names = ['fn%d' % i for i in range(10)]
+    session, tags = start(tmp_path, names)
+    cmds = retag(session, tags, names[1:])
+    assert len(cmds) == 1 and cmds[0].startswith('silent! syntax clear')
+    assert ' fn0 ' not in cmds[0]
+
+
+def test_many_new_names_or_force_rebuild_the_group(tmp_path):
+    names = ['fn%d' % i for i in range(4)]
+    session, tags = start(tmp_path, names)
+    names += ['fn%d' % i for i in range(4, 10)]
+    assert retag(session, tags, names)[0].startswith('silent! syntax clear')
+    assert retag(session, tags, names + ['fn10'],
+                 force=True)[0].startswith('silent! syntax clear')
+
+
+# Tags every fnN in the file it is given, as ctags -f - would.
+CTAGS = r"""
+import re, sys
+path = sys.argv[-1]
+with open(path) as fp:
+    names = sorted(set(re.findall(r'\bfn\d+\b', fp.read())))
+for name in names:
+    print('%s\t%s\t/^int %s(void)$/;"\tf\tlanguage:C' % (name, path, name))
+"""
+
+
+def test_saving_only_extends_the_groups(tmp_path):
+    project = tmp_path / 'project'
+    project.mkdir()
+    source = str(project / 'buffer.c')
+    script = tmp_path / 'ctags.py'
+    script.write_text(CTAGS)
+    names = ['fn%d' % i for i in range(10)]
+    with open(source, 'w') as fp:
+        fp.write(''.join('int %s(void);\n' % name for name in names))
+
+    tags = str(tmp_path / 'tags')
+    write_tags(tags, names, source)
+    lines = [' '.join('fn%d' % i for i in range(20)) + ';']
+    session = Session(str(tmp_path), tags, 'c', lines, settings={
+        'neotags_run_ctags': 1,
+        'neotags_ctags_bin': '"%s" "%s"' % (sys.executable, script),
+        'neotags_update_delay': 0,
+    })
+    handlers = NeotagsHandlers(session.nvim)
+    handlers._NeotagsHandlers__neotags = session.neotags
+
+    with open(source, 'a') as fp:
+        fp.write('int fn10(void);\n')
+    session.nvim.commands.clear()
+    handlers.update_file(['1'])
+
+    added = 'syntax keyword %s fn10' % GROUP
+    deadline = time.time() + 10
+    while added not in session.nvim.commands and time.time() < deadline:
+        time.sleep(0.01)
+    assert group_cmds(session) == [added]
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+from neotags.manifest import CHANGED, LAYOUT, SAME, Manifest, code_hash
+
+
+@pytest.mark.parametrize('ft, before, after', [
+    ('rust', b"fn f<'a>(x: &'a str) {}\nfn old_name() {}\nstruct Foo;\n",
+     b"fn f<'a>(x: &'a str) {}\nfn new_name() {}\nstruct Bar;\n"),
+    ('cpp', b"int n = 1'000;\nint old_name();\n",
+     b"int n = 1'000;\nint new_name();\n"),
+    ('cpp', b"char c = '\\'';\nint old_name();\n",
+     b"char c = '\\'';\nint new_name();\n"),
+    ('javascript', b"let s = `it's`;\nfunction oldName() {}\n",
+     b"let s = `it's`;\nfunction newName() {}\n"),
+    ('javascript', b"let r = /\\/*/;\nfunction oldName() {}\n",
+     b"let r = /\\/*/;\nfunction newName() {}\n"),
+    ('c', b'char *s = "/*";\nint old_name();\n',
+     b'char *s = "/*";\nint new_name();\n'),
+    ('go', b'var s = `//`; func old() {}\n',
+     b'var s = `//`; func new() {}\n'),
+])
+def test_renames_change_the_hash(ft, before, after):
+    assert code_hash(before, ft) != code_hash(after, ft)
+
+
+@pytest.mark.parametrize('ft, before, after', [
+    ('c', b'int f(); /* one */\n', b'int f(); // two\n'),
+    ('c', b'int f(int a,int b);\n', b'int f(int a, int b);\n'),
+    ('python', b'# one\ndef f(): pass\n', b'# two\ndef f():  pass\n'),
+])
+def test_comments_and_spacing_dont_change_the_hash(ft, before, after):
+    assert code_hash(before, ft) == code_hash(after, ft)
+
+
+def test_indentation_changes_the_hash():
+    assert (code_hash(b'if a:\n    f()\n', 'python') !=
+            code_hash(b'if a:\nf()\n', 'python'))
+
+
+def save(path, data, mtime):
+    with open(path, 'wb') as fp:
+        fp.write(data)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_compare(tmp_path):
+    manifest = Manifest(str(tmp_path / 'tags.manifest'))
+    name = str(tmp_path / 'a.rs')
+
+    save(name, b"fn f<'a>(x: &'a str) {}\nfn old_name() {}\n", 10 ** 9)
+    change, entry = manifest.compare(name, 'rust')
+    assert change == CHANGED
+    manifest.record(name, entry)
+    assert manifest.compare(name, 'rust')[0] == SAME
+
+    # Only the mtime changed.
+    save(name, b"fn f<'a>(x: &'a str) {}\nfn old_name() {}\n", 2 * 10 ** 9)
+    assert manifest.compare(name, 'rust')[0] == SAME
+
+    save(name, b"fn f<'a>(x: &'a str) {}\n\nfn old_name() {}\n", 3 * 10 ** 9)
+    change, entry = manifest.compare(name, 'rust')
+    assert change == LAYOUT
+    manifest.record(name, entry)
+
+    save(name, b"fn f<'a>(x: &'a str) {}\n\nfn new_name() {}\n", 4 * 10 ** 9)
+    assert manifest.compare(name, 'rust')[0] == CHANGED
+
+    # Read back from the file.
+    assert Manifest(manifest.path).compare(name, 'rust')[0] == CHANGED
+    manifest.clear()
+    assert manifest.compare(name, 'rust')[0] == CHANGED
@@ -0,0 +1,48 @@
+import json
+
+from neotags.projects import ProjectRegistry
+
+
+def test_find_returns_the_deepest_project(tmp_path):
+    registry = ProjectRegistry(str(tmp_path / 'projects.json'))
+    assert registry.find('/src/app/main.c') is None
+    registry.add('/src', {})
+    registry.add('/src/app', {})
+    assert registry.find('/src/app/main.c') == '/src/app'
+    assert registry.find('/src/app') == '/src/app'
+    assert registry.find('/src/lib/util.c') == '/src'
+    # Whole components, not string prefixes.
+    assert registry.find('/src/application/main.c') == '/src'
+    assert registry.find('/other/main.c') is None
+    registry.remove('/src/app')
+    assert registry.find('/src/app/main.c') == '/src'
+
+
+def test_saved_projects_are_read_back(tmp_path):
+    path = str(tmp_path / 'projects.json')
+    registry = ProjectRegistry(path)
+    registry.add('/src/app', {'path': '/src/app', 'type': 'c'})
+    registry.add('/src/lib', {'path': '/src/lib'})
+    registry.remove('/src/lib')
+
+    other = ProjectRegistry(path)
+    assert '/src/app' in other and '/src/lib' not in other
+    assert other['/src/app'] == {'path': '/src/app', 'type': 'c'}
+    assert not (tmp_path / 'projects.json.new').exists()
+
+
+def test_changes_to_the_file_are_picked_up(tmp_path):
+    path = tmp_path / 'projects.json'
+    registry = ProjectRegistry(str(path))
+    registry.add('/src', {})
+    path.write_text(json.dumps({'/src': {}, '/work/project': {}}))
+    assert registry.find('/work/project/a.c') == '/work/project'
+
+
+def test_a_corrupt_file_means_no_projects(tmp_path):
+    path = tmp_path / 'projects.json'
+    path.write_text('{"/src": ')
+    registry = ProjectRegistry(str(path))
+    assert registry.find('/src/a.c') is None
+    assert '/src' not in registry
+    assert path.read_text() == '{"/src": '
@@ -0,0 +1,75 @@
+import time
+
+from neotags.scheduler import Scheduler
+
+
+class Vim:
+    """Queues async_call()s to be run by run_all(), like the main loop."""
+
+    def __init__(self):
+        self.queue = []
+
+    def async_call(self, fn, *args):
+        self.queue.append((fn, args))
+
+    def run_all(self):
+        while self.queue:
+            fn, args = self.queue.pop(0)
+            fn(*args)
+
+
+def test_requests_for_a_buffer_are_merged():
+    vim = Vim()
+    ran = []
+    scheduler = Scheduler(vim, lambda bufnr, force: ran.append((bufnr, force)),
+                          0)
+    scheduler.request(1, True)
+    scheduler.request(2, False)
+    scheduler.request(1, False)
+    vim.run_all()
+    # Buffer 1 was requested last, and stays forced.
+    assert ran == [(2, False), (1, True)]
+
+
+def test_superseded_and_discard():
+    vim = Vim()
+    seen = []
+
+    def run(bufnr, force):
+        if not seen:
+            scheduler.request(bufnr, False)
+        seen.append(scheduler.superseded(bufnr))
+
+    scheduler = Scheduler(vim, run, 0)
+    scheduler.request(1, False)
+    scheduler.request(2, False)
+    scheduler.discard(2)
+    vim.run_all()
+    assert seen == [True, False]
+
+
+def test_one_request_runs_at_a_time():
+    vim = Vim()
+    ran = []
+
+    def run(bufnr, force):
+        ran.append(bufnr)
+        # A fire that comes in while running does nothing.
+        scheduler._fire()
+
+    scheduler = Scheduler(vim, run, 0)
+    scheduler.request(1, False)
+    scheduler.request(2, False)
+    vim.run_all()
+    assert ran == [1, 2]
+
+
+def test_delay():
+    vim = Vim()
+    ran = []
+    scheduler = Scheduler(vim, lambda bufnr, force: ran.append(bufnr), 0.01)
+    scheduler.request(1, False)
+    scheduler.request(1, False)
+    time.sleep(0.1)
+    vim.run_all()
+    assert ran == [1]
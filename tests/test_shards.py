@@ -0,0 +1,37 @@
+import os
+
+from neotags.shards import ShardedCtags
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+
+
+def walk(top, excludes):
+    shards = ShardedCtags('ctags', [str(top)], 2, excludes=excludes)
+    return sorted(os.path.relpath(name, str(top))
+                  for _, name in shards.files())
+
+
+def test_excludes(tmp_path):
+    for name in ('a.c', 'build/b.c', 'build/sub/c.c', 'src/gen/d.c',
+                 'src/e.c', 'src/e.o', '.git/config'):
+        touch(str(tmp_path / name))
+
+    assert walk(tmp_path, []) == ['a.c', 'build/b.c', 'build/sub/c.c',
+                                  'src/e.c', 'src/e.o', 'src/gen/d.c']
+    assert walk(tmp_path, ['build/*', 'src/gen', '*.o']) == ['a.c', 'src/e.c']
+    assert walk(tmp_path, ['build']) == ['a.c', 'src/e.c', 'src/e.o',
+                                         'src/gen/d.c']
+
+
+def test_symlinked_directories_are_followed(tmp_path):
+    touch(str(tmp_path / 'project' / 'a.c'))
+    touch(str(tmp_path / 'elsewhere' / 'b.c'))
+    os.symlink(str(tmp_path / 'elsewhere'), str(tmp_path / 'project' / 'lib'))
+    # Links back up are not followed round and round.
+    os.symlink(str(tmp_path / 'project'), str(tmp_path / 'elsewhere' / 'up'))
+    os.symlink('.', str(tmp_path / 'project' / 'here'))
+
+    assert walk(tmp_path / 'project', []) == ['a.c', 'lib/b.c']
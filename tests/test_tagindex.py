@@ -0,0 +1,103 @@
+import gzip
+
+from neotags.tagindex import TagIndex
+from neotags.utils import find_tags
+
+TAGS = b'''!_TAG_FILE_SORTED\t1\t/0=unsorted, 1=sorted, 2=foldcase/
+Point\ta.c\t/^struct Point {$/;"\ts\tlanguage:C
+add\ta.c\t/^int add(int a, int b)$/;"\tf\tlanguage:C
+helper\tb.cpp\t/^void helper()$/;"\tf\tlanguage:C++
+ignored\ta.c\t/^int ignored;$/;"\tv\tlanguage:C
+main\tmain.py\t/^def main():$/;"\tf\tlanguage:Python
+nokind\ta.c\t/^nokind$/;"\tlanguage:C
+sub\tb.cpp\t/^int sub(int a, int b)$/;"\tf\tlanguage:C++
+'''
+
+
+def build(tmp_path, data=TAGS):
+    tagfile = str(tmp_path / 'tags.gz')
+    with gzip.open(tagfile, 'wb') as fp:
+        fp.write(data)
+    index = TagIndex(tagfile)
+    with gzip.open(tagfile, 'rb') as fp:
+        index.build(fp)
+    return tagfile, index
+
+
+class Log:
+    def error(self, msg):
+        pass
+
+
+def names_kinds(tags):
+    return [(tag['name'], tag['kind']) for tag in tags]
+
+
+def test_query_matches_find_tags(tmp_path):
+    _, index = build(tmp_path)
+    for lang, order, equivalent, ignored in [
+            ('c', 'sfv', None, []),
+            ('c', 'fv', None, ['ignored']),
+            ('c', 'sf', {'v': 'f'}, []),
+            ('python', 'f', None, []),
+            ('go', 'f', None, [])]:
+        assert names_kinds(index.query(lang, order, equivalent, ignored)) == \
+            names_kinds(find_tags(Log(), TAGS, lang, order, ignored,
+                                  equivalent))
+
+
+def test_is_fresh(tmp_path):
+    tagfile, index = build(tmp_path)
+    assert index.is_fresh()
+    with gzip.open(tagfile, 'ab') as fp:
+        fp.write(b'more\ta.c\t/^more$/;"\tf\tlanguage:C\n')
+    assert not index.is_fresh()
+    assert not TagIndex(str(tmp_path / 'missing')).is_fresh()
+
+
+def test_replace_file(tmp_path):
+    _, index = build(tmp_path)
+    index.replace_file(b'a.c', [
+        b'Line\ta.c\t/^struct Line {$/;"\ts\tlanguage:C\n'])
+    names = [tag['name'] for tag in index.query('c', 'sfv', None, [])]
+    assert names == [b'Line', b'helper', b'sub']
+    assert index.is_fresh()
+
+
+def test_export(tmp_path):
+    _, index = build(tmp_path)
+    dest = str(tmp_path / 'c.tags')
+    index.export(dest, 'c')
+    with open(dest, 'rb') as fp:
+        names = [line.split(b'\t')[0] for line in fp]
+    assert names == [b'Point', b'add', b'helper', b'ignored', b'sub']
+
+
+def test_export_is_only_rewritten_when_its_language_changed(tmp_path):
+    _, index = build(tmp_path)
+    dest = str(tmp_path / 'c.tags')
+
+    def export():
+        # Marks the file, so that a rewrite shows.
+        index.export(dest, 'c')
+        with open(dest, 'rb') as fp:
+            data = fp.read()
+        with open(dest, 'ab') as fp:
+            fp.write(b'mark\n')
+        return data.endswith(b'mark\n')
+
+    assert not export()
+    assert export()
+    # Re-tagged, but the same tags.
+    index.replace_file(b'a.c', [line + b'\n' for line in TAGS.split(b'\n')
+                                if b'\ta.c\t' in line])
+    assert export()
+    index.replace_file(b'main.py', [
+        b'other\tmain.py\t/^def other():$/;"\tf\tlanguage:Python\n'])
+    assert export()
+    index.replace_file(b'b.cpp', [])
+    assert not export()
+    assert export()
+    # A rebuilt index starts over.
+    build(tmp_path)
+    assert not export()
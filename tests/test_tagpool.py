@@ -0,0 +1,88 @@
+import gzip
+import heapq
+import random
+
+from neotags import tagpool
+from neotags.tagpool import TagPool, _parse_range, find_candidates
+
+QUERY = ('c', 'fsv', [], None)
+
+
+def write_tags(path, count, rng):
+    lines = [b'!_TAG_FILE_SORTED\t1\t//\n']
+    for i in range(count):
+        name = 'name%d_%s' % (i, 'x' * rng.randrange(20))
+        kind = rng.choice('fsvm')
+        lang = rng.choice(['C', 'C', 'Python'])
+        lines.append(('%s\tfile.c\t/^%s$/;"\t%s\tlanguage:%s\n'
+                      % (name, name, kind, lang)).encode())
+    data = b''.join(lines)
+    with open(path, 'wb') as fp:
+        fp.write(data)
+    return data
+
+
+def merge(parts):
+    pieces = {}
+    errors = []
+    for found, logged in parts:
+        for kind, names in found.items():
+            pieces.setdefault(kind, []).append(names)
+        errors.extend(logged)
+    return ({kind: list(heapq.merge(*names))
+             for kind, names in pieces.items()}, errors)
+
+
+def test_ranges_cover_the_file_once(monkeypatch):
+    monkeypatch.setattr(tagpool, 'MIN_RANGE', 10)
+    for jobs in (1, 2, 3, 7):
+        pool = TagPool(jobs)
+        for size in (0, 1, 9, 10, 11, 69, 70, 71, 1000):
+            ranges = pool.ranges(size)
+            assert len(ranges) <= jobs
+            pos = 0
+            for start, end in ranges:
+                assert start == pos and end > start
+                pos = end
+            assert pos == size
+
+
+def test_parse_range_neither_loses_nor_repeats_lines(tmp_path):
+    rng = random.Random(1)
+    path = str(tmp_path / 'tags')
+    data = write_tags(path, 300, rng)
+    whole = find_candidates(data, QUERY)
+    assert whole[0]
+
+    for _ in range(100):
+        cuts = sorted(rng.sample(range(1, len(data)), rng.randrange(1, 10)))
+        # Cutting right after a newline, or just before one.
+        cuts.append(data.index(b'\n', cuts[0]) + 1)
+        cuts.append(data.index(b'\n', cuts[0]))
+        cuts = sorted(set(cuts))
+        bounds = [0, *cuts, len(data)]
+        parts = [_parse_range(path, start, end, QUERY)
+                 for start, end in zip(bounds, bounds[1:])]
+        assert merge(parts) == whole
+
+
+def test_parse_splits_plain_and_compressed_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(tagpool, 'MIN_RANGE', 1000)
+    rng = random.Random(2)
+    plain = str(tmp_path / 'tags')
+    data = write_tags(plain, 500, rng)
+    packed = str(tmp_path / 'tags.gz')
+    with gzip.open(packed, 'wb') as fp:
+        fp.write(data)
+
+    def opener(path, mode, comp_type):
+        assert comp_type == 'gzip'
+        return gzip.open(path, mode)
+
+    pool = TagPool(3)
+    try:
+        results = pool.parse([(plain, None), (packed, 'gzip')], QUERY, opener)
+    finally:
+        pool.shutdown()
+    whole = find_candidates(data, QUERY)
+    assert results == [whole, whole]
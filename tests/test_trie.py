@@ -0,0 +1,66 @@
+import random
+import re
+
+import pytest
+
+from neotags.utils import trie_patterns, vim_escape
+
+_VIM_TOKEN = re.compile(r'\\%\(|\\.|\[[^\]]*\]|.')
+
+
+def to_python(pattern):
+    """The Python regex of the magic vim pattern `pattern', as far as
+    trie_patterns() uses them.
+    """
+    parts = []
+    for token in _VIM_TOKEN.findall(pattern):
+        if token == r'\%(':
+            parts.append('(?:')
+        elif token == r'\)':
+            parts.append(')')
+        elif token == r'\|':
+            parts.append('|')
+        elif token == r'\=':
+            parts.append('?')
+        elif token.startswith('\\'):
+            parts.append(re.escape(token[1:]))
+        elif token.startswith('[') and len(token) > 1:
+            parts.append(token)
+        else:
+            parts.append(re.escape(token))
+    return ''.join(parts)
+
+
+def matches(chunks, word):
+    return any(re.fullmatch('(?:%s)' % to_python(chunk), word)
+               for chunk in chunks)
+
+
+@pytest.mark.parametrize('budget', [1, 8, 40, 1000])
+def test_patterns_match_exactly_the_names(budget):
+    rng = random.Random(budget)
+    alphabet = 'abAB_1.*~$[]\\/-+'
+    for _ in range(100):
+        names = {''.join(rng.choice(alphabet)
+                         for _ in range(rng.randrange(1, 7)))
+                 for _ in range(rng.randrange(1, 30))}
+        chunks = trie_patterns(sorted(names), budget)
+        for name in names:
+            assert matches(chunks, name), (name, chunks)
+            # Prefixes and extensions of a name aren't names themselves.
+            for other in (name[:-1], name + 'a', name + '.'):
+                assert matches(chunks, other) == (other in names)
+        for _ in range(50):
+            other = ''.join(rng.choice(alphabet)
+                            for _ in range(rng.randrange(1, 7)))
+            assert matches(chunks, other) == (other in names)
+
+        for chunk in chunks:
+            assert (len(chunk) <= budget
+                    or chunk in {vim_escape(name) for name in names})
+
+
+def test_common_prefixes_are_factored():
+    assert trie_patterns(['getName', 'getValue', 'get'], 100) == [
+        r'get\%(Name\|Value\)\=']
+    assert trie_patterns(['fa', 'fb', 'f'], 100) == [r'f[ab]\=']
@@ -0,0 +1,34 @@
+import random
+
+from neotags.utils import merge_tags
+
+
+def tag(name, filename):
+    return b'%s\t%s\t/^%s$/;"\tf\tlanguage:C\n' % (name, filename, name)
+
+
+def random_tags(rng, count, files):
+    return [tag(b''.join(rng.choice([b'a', b'B', b'_', b'c'])
+                         for _ in range(rng.randint(1, 5))),
+                rng.choice(files))
+            for _ in range(count)]
+
+
+def test_merge_tags_equals_sorted():
+    rng = random.Random(0)
+    for _ in range(200):
+        old = random_tags(rng, rng.randint(0, 50), [b'a.c', b'b.c', b'c.c'])
+        new = random_tags(rng, rng.randint(0, 10), [b'b.c'])
+        for foldcase in (False, True):
+            key = bytes.lower if foldcase else None
+            kept = [line for line in old if line.split(b'\t')[1] != b'b.c']
+            merged = list(merge_tags(sorted(old, key=key), new, b'b.c',
+                                     foldcase))
+            assert merged == sorted(kept + new, key=key)
+
+
+def test_merge_tags_keeps_pseudo_tags_and_terminates_lines():
+    old = [b'!_TAG_FILE_SORTED\t1\t/0=unsorted/\n', tag(b'a', b'a.c'),
+           tag(b'c', b'b.c').rstrip(b'\n')]
+    merged = list(merge_tags(old, [tag(b'b', b'b.c')], b'b.c'))
+    assert merged == [old[0], tag(b'a', b'a.c'), tag(b'b', b'b.c')]
@@ -0,0 +1,86 @@
+import threading
+
+from neotags.worker import Worker
+
+
+class Vim:
+    def async_call(self, fn, *args):
+        fn(*args)
+
+
+def blocked_worker():
+    """A Worker whose thread is stuck in a first job until `release' is
+    set, so that the jobs submitted meanwhile all wait.
+    """
+    worker = Worker(Vim())
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(log):
+        started.set()
+        release.wait(5)
+
+    worker.submit('tags', slow, lambda log, result: None)
+    started.wait(5)
+    return worker, release
+
+
+def run(worker, release, ran):
+    finished = threading.Event()
+    worker.submit('last', lambda log: None,
+                  lambda log, result: finished.set())
+    release.set()
+    assert finished.wait(5)
+    return ran
+
+
+def job(ran, name):
+    def run(log):
+        ran.append(name)
+    return run
+
+
+def ignore(log, result):
+    pass
+
+
+def test_file_jobs_are_not_dropped():
+    worker, release = blocked_worker()
+    ran = []
+    worker.submit('tags', job(ran, 'a'), ignore, part='a.c')
+    worker.submit('tags', job(ran, 'b'), ignore, part='b.c')
+    assert run(worker, release, ran) == ['a', 'b']
+
+
+def test_same_file_job_replaces_waiting_one():
+    worker, release = blocked_worker()
+    ran = []
+    worker.submit('tags', job(ran, 'first'), ignore, part='a.c')
+    worker.submit('tags', job(ran, 'second'), ignore, part='a.c')
+    assert run(worker, release, ran) == ['second']
+
+
+def test_file_job_does_not_replace_full_rescan():
+    worker, release = blocked_worker()
+    ran = []
+    worker.submit('tags', job(ran, 'full'), ignore)
+    worker.submit('tags', job(ran, 'a'), ignore, part='a.c')
+    assert run(worker, release, ran) == ['full']
+
+
+def test_full_rescan_drops_waiting_file_jobs():
+    worker, release = blocked_worker()
+    ran = []
+    worker.submit('tags', job(ran, 'a'), ignore, part='a.c')
+    worker.submit('other', job(ran, 'other'), ignore, part='x.c')
+    worker.submit('tags', job(ran, 'full'), ignore)
+    assert run(worker, release, ran) == ['other', 'full']
+
+
+def test_busy():
+    worker, release = blocked_worker()
+    assert worker.busy('tags')
+    worker.submit('more', lambda log: None, ignore, part='a.c')
+    assert worker.busy('more')
+    assert not worker.busy('other')
+    release.set()